@@ -1,38 +1,172 @@
-from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, BackgroundTasks
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from starlette.concurrency import iterate_in_threadpool
 import pandas as pd
+import asyncio
 import io
 import json
+import math
 import os
+import time
 import yaml
 import logging
-from datetime import datetime
 
 from services.auth import verify_api_key
-from services.analyzer import run_analysis_pipeline
-from social_api import fetch_instagram_comments, fetch_tiktok_comments
+from services.export_store import (
+    register_result, persist_source, export_urls, resolve_export, export_etag, is_export_filename,
+    EXPORT_FORMATS, EXPORT_TTL_SECONDS
+)
+from services.analyzer import run_analysis_pipeline, iter_analysis_pipeline, run_pipeline_from_pages, STREAM_CHUNK_SIZE
+from services.comment_sync import sync_posts
+from social_api import aiter_comment_pages, COMMENT_PAGE_ITERATORS
+from modules.embeddings.ann_index import index_entries, search_similar
+from services.analysis_store import (
+    record_run, start_run, append_entries, finish_run, abort_run, query_entries, aggregate, list_runs
+)
+from services.rollups import update_rollups, get_trend, detect_changes
+from services.serialization import FastJSONResponse, dumps, encode_response
+from services.cost_model import admit, admission_summary, estimate_cost, sample_entries, DEFAULT_TOKENS_PER_ENTRY
+from services.scheduler import scheduler, choose_lane, QueueFullError, LANES
+from services.http_client import RateLimitExceeded
+from services import metrics
+from services.profiler import profile_for, render_collapsed, ProfilerBusyError, PROFILE_INTERVAL, PROFILE_MAX_SECONDS
 
 # === Setup ===
 router = APIRouter()
-EXPORT_DIR = "output/exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
 
 API_KEYS_PATH = "config/api_keys.yaml"
 ADMIN_SECRET = "SUPERSECRETADMINKEY"  # Optional: aus .env laden
 
 logger = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _wants_stream(stream: bool, accept: str | None) -> bool:
+    return stream or (accept is not None and NDJSON_MEDIA_TYPE in accept)
+
+
+def _record_lines(record: dict) -> list[bytes]:
+    """
+    Wandelt einen Pipeline-Record in NDJSON-Zeilen um:
+    eine Zeile pro annotiertem Eintrag bzw. eine Summary-Zeile.
+    """
+    if record["type"] == "chunk":
+        return [dumps({"type": "entry", "data": entry}) + b"\n" for entry in record["data"]]
+    return [dumps(record) + b"\n"]
+
+
+async def _andjson_lines(records):
+    async for record in records:
+        for line in _record_lines(record):
+            yield line
+
+
+async def _scheduled_stored_records(records, client: str, topic: str, lane: str, cost: float):
+    """
+    Reicht Pipeline-Records erst nach Zuteilung eines Scheduler-Slots durch und
+    schreibt sie nebenbei in den Analysis Store (Chunks als Einträge, Summary als
+    Reports des Laufs). Der Lauf entsteht erst im Slot; endet der Stream vor der
+    Summary (Client-Abbruch, Fehler), wird er als 'aborted' geschlossen.
+    Die Queue-Metadaten hängen am Summary-Record.
+    """
+    async with scheduler.slot(client, lane, cost) as ticket:
+        run_id = await asyncio.to_thread(start_run, client, topic)
+        finished = False
+        try:
+            async for record in records:
+                if record["type"] == "chunk":
+                    await asyncio.to_thread(append_entries, run_id, client, topic, record["data"])
+                    await asyncio.to_thread(update_rollups, record["data"], topic, client)
+                else:
+                    await asyncio.to_thread(finish_run, run_id, record.get("module_report", {}), record.get("mirror_report", {}))
+                    finished = True
+                    record = {**record, "queue": ticket.metadata()}
+                yield record
+        finally:
+            if not finished:
+                await asyncio.shield(asyncio.to_thread(abort_run, run_id, "Stream vor der Summary beendet"))
+
+
+async def _collect_pages(pages) -> list[dict]:
+    """Puffert alle Kommentarseiten (nur Einträge mit Text) für eine Gesamtanalyse."""
+    entries = []
+    async for page in pages:
+        entries.extend(c for c in page if c.get("text"))
+    return entries
+
+
+def _read_upload(file: UploadFile, content: bytes) -> list[dict]:
+    """CSV/JSON-Upload → Einträge mit Text."""
+    if file.filename.endswith(".csv"):
+        entries = pd.read_csv(io.BytesIO(content)).to_dict(orient="records")
+    elif file.filename.endswith(".json"):
+        entries = json.loads(content)
+    else:
+        raise HTTPException(status_code=400, detail="Nur .csv oder .json erlaubt.")
+    return [e for e in entries if e.get("text")]
+
+
+def _check_admission(decision: dict) -> dict:
+    """413, wenn die Anfrage das Zeitbudget übersteigt; sonst die kompakten Admission-Metadaten."""
+    summary = admission_summary(decision)
+    if decision["decision"] == "reject":
+        raise HTTPException(status_code=413, detail={"message": "Analyse überschreitet das Zeitbudget.", **summary})
+    return summary
+
+
+def _admission_header(admission: dict) -> str:
+    """Admission-Metadaten als Header-Wert (HTTP-Header sind latin-1 → JSON nur ASCII)."""
+    return json.dumps(admission, ensure_ascii=True, separators=(",", ":"))
+
+
+# === Kostenschätzung (ohne Analyse) ===
+@router.post("/estimate")
+async def estimate(
+    file: UploadFile = File(None),
+    topic: str = Form("klima"),
+    entry_count: int = Form(None),
+    mean_tokens: float = Form(DEFAULT_TOKENS_PER_ENTRY),
+    user_api_key: str = Header(None)
+):
+    """
+    Geschätzte Wall-/CPU-Sekunden pro Modul für eine Datei oder entry_count × mean_tokens,
+    plus die Admission-Entscheidung, die /analyze treffen würde.
+    """
+    _client_for(user_api_key)
+    if file:
+        entries = _read_upload(file, await file.read())
+        texts = [e["text"] for e in entries]
+    elif entry_count:
+        texts = None
+    else:
+        raise HTTPException(status_code=400, detail="Datei oder entry_count erforderlich")
+
+    # Kalibrierung liest/schreibt SQLite → nicht auf dem Event-Loop
+    cost = await asyncio.to_thread(estimate_cost, topic, texts=texts, entry_count=entry_count, mean_tokens=mean_tokens)
+    decision = await asyncio.to_thread(admit, topic, texts=texts, entry_count=entry_count, mean_tokens=mean_tokens)
+    return {**cost, "admission": admission_summary(decision)}
+
 
 # === Analyse-Endpunkt ===
 @router.post("/analyze")
 async def analyze(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(None),
     topic: str = Form("klima"),
     user_api_key: str = Header(None),
     social_platform: str = Form(None),
     social_id: str = Form(None),
     comment_limit: int = Form(100),
-    mode: str = Form("auto")
+    mode: str = Form("auto"),
+    stream: bool = Form(False),
+    chunk_size: int = Form(STREAM_CHUNK_SIZE),
+    incremental: bool = Form(False),
+    preprocess: bool = Form(False),
+    allow_downgrade: bool = Form(True),
+    lane: str = Form("auto"),
+    accept: str = Header(None),
+    accept_encoding: str = Header(None)
 ):
     if not user_api_key:
         raise HTTPException(status_code=400, detail="API-Key erforderlich")
@@ -41,79 +175,290 @@ async def analyze(
 
     if not (file or (social_platform and social_id)):
         raise HTTPException(status_code=400, detail="Datei oder Social-Parameter erforderlich")
+    if lane not in ("auto", *LANES):
+        raise HTTPException(status_code=400, detail=f"Unbekannte Lane: {lane}")
 
     try:
-        # === Datenquelle wählen ===
+        # === Social-Quelle: Seiten nebenläufig laden (NDJSON: Fetch & Analyse überlappend) ===
         if social_platform and social_id:
-            if social_platform.lower() == "instagram":
-                entries = fetch_instagram_comments(social_id, user_api_key, limit=comment_limit)
-            elif social_platform.lower() == "tiktok":
-                entries = fetch_tiktok_comments(social_id, user_api_key, limit=comment_limit)
-            else:
+            if social_platform.lower() not in COMMENT_PAGE_ITERATORS:
                 raise HTTPException(status_code=400, detail="Unbekannte Social Plattform.")
-        else:
-            content = await file.read()
-            if file.filename.endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(content))
-                entries = df.to_dict(orient="records")
-            elif file.filename.endswith(".json"):
-                entries = json.loads(content)
+            # Mehrere Post-IDs (kommagetrennt) werden nebenläufig geladen
+            post_ids = [p.strip() for p in social_id.split(",") if p.strip()]
+
+            # Admission: Textlängen sind vorab unbekannt → Schätzung über comment_limit,
+            # Sampling wird hier zu einem kleineren comment_limit
+            decision = await asyncio.to_thread(
+                admit, topic, entry_count=comment_limit * len(post_ids), allow_downgrade=allow_downgrade
+            )
+            admission = _check_admission(decision)
+            # client: narrative_clusters (assign_existing) nutzt nur die Narrative dieses Clients
+            module_options = {**decision["module_options"], "client": client_name}
+            if decision["sample_size"]:
+                comment_limit = max(1, decision["sample_size"] // len(post_ids))
+            cost = decision["estimate"]["wall_seconds"]
+            lane = choose_lane(lane, comment_limit * len(post_ids), cost, decision["decision"])
+
+            # Inkrementell: nur neue Kommentare seit dem letzten Checkpoint analysieren
+            if incremental:
+                async with scheduler.slot(client_name, lane, cost) as ticket:
+                    result = await asyncio.to_thread(
+                        sync_posts, social_platform, post_ids, user_api_key, client_name, topic,
+                        topic=topic, mode=mode, limit=comment_limit, module_options=module_options
+                    )
             else:
-                raise HTTPException(status_code=400, detail="Nur .csv oder .json erlaubt.")
+                pages = aiter_comment_pages(social_platform, post_ids, user_api_key, limit=comment_limit)
 
-        entries = [e for e in entries if e.get("text")]
-        if not entries:
-            raise HTTPException(status_code=422, detail="Keine gültigen Texte gefunden.")
+                # NDJSON: Fetch & Analyse überlappend in Chunks
+                if _wants_stream(stream, accept):
+                    records = run_pipeline_from_pages(
+                        pages, industry=topic, topic=topic, mode=mode, chunk_size=chunk_size, module_options=module_options
+                    )
+                    scheduler.check_capacity(client_name)
+                    records = _scheduled_stored_records(records, client_name, topic, lane, cost)
+                    return StreamingResponse(
+                        _andjson_lines(records), media_type=NDJSON_MEDIA_TYPE,
+                        headers={"X-HTIF-Admission": _admission_header(admission)}
+                    )
 
-        # === Analyse durchführen ===
-        analyzed_entries, module_report = run_analysis_pipeline(entries, industry=topic, topic=topic, mode=mode)
+                # Sonst wie beim Upload: alle Seiten puffern, dann eine Gesamtanalyse
+                # (Narrative & Mirror über den ganzen Bestand, preprocess wirkt)
+                scheduler.check_capacity(client_name)
+                entries = await _collect_pages(pages)
+                if not entries:
+                    raise HTTPException(status_code=422, detail="Keine gültigen Texte gefunden.")
+                async with scheduler.slot(client_name, lane, cost) as ticket:
+                    result = await asyncio.to_thread(
+                        run_analysis_pipeline, entries, industry=topic, topic=topic, mode=mode,
+                        preprocess=preprocess, module_options=module_options
+                    )
 
-        # === Exportpfade vorbereiten ===
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        csv_filename = f"htif_result_{timestamp}.csv"
-        json_filename = f"htif_result_{timestamp}.json"
-        csv_path = os.path.join(EXPORT_DIR, csv_filename)
-        json_path = os.path.join(EXPORT_DIR, json_filename)
+            if not result["data"]:
+                raise HTTPException(status_code=422, detail="Keine gültigen Texte gefunden.")
 
-        # === Export speichern ===
-        pd.DataFrame(analyzed_entries).to_csv(csv_path, index=False)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(analyzed_entries, f, ensure_ascii=False, indent=2)
+        # === Datei-Upload ===
+        else:
+            entries = _read_upload(file, await file.read())
+            if not entries:
+                raise HTTPException(status_code=422, detail="Keine gültigen Texte gefunden.")
+
+            # === Admission Control: Budget prüfen, ggf. schnelle Optionen / Stichprobe ===
+            decision = await asyncio.to_thread(
+                admit, topic, texts=[e["text"] for e in entries], allow_downgrade=allow_downgrade
+            )
+            admission = _check_admission(decision)
+            # client: narrative_clusters (assign_existing) nutzt nur die Narrative dieses Clients
+            module_options = {**decision["module_options"], "client": client_name}
+            entries = sample_entries(entries, decision["sample_size"])
+            cost = decision["estimate"]["wall_seconds"]
+            lane = choose_lane(lane, len(entries), cost, decision["decision"])
+
+            # === Gestreamte Analyse (NDJSON, ohne Exportdateien) ===
+            if _wants_stream(stream, accept):
+                scheduler.check_capacity(client_name)
+                records = iter_analysis_pipeline(
+                    entries, industry=topic, topic=topic, mode=mode, chunk_size=chunk_size, preprocess=preprocess,
+                    module_options=module_options
+                )
+                records = _scheduled_stored_records(iterate_in_threadpool(records), client_name, topic, lane, cost)
+                return StreamingResponse(
+                    _andjson_lines(records), media_type=NDJSON_MEDIA_TYPE,
+                    headers={"X-HTIF-Admission": _admission_header(admission)}
+                )
+
+            # === Analyse durchführen (im Thread, sobald der Scheduler einen Slot zuteilt) ===
+            async with scheduler.slot(client_name, lane, cost) as ticket:
+                result = await asyncio.to_thread(
+                    run_analysis_pipeline, entries, industry=topic, topic=topic, mode=mode,
+                    preprocess=preprocess, module_options=module_options
+                )
+
+        analyzed_entries = result["data"]
+        module_report = result["module_report"]
+
+        # === Export registrieren (Dateien entstehen erst beim Download; Hash im Thread) ===
+        result_id = await asyncio.to_thread(register_result, analyzed_entries)
+        background_tasks.add_task(persist_source, result_id)
+
+        # === Lauf im Analysis Store ablegen (inkrementell: nur neue Einträge) ===
+        background_tasks.add_task(
+            record_run, result.get("new_data", analyzed_entries), module_report, result["mirror_report"],
+            topic=topic, client=client_name
+        )
+        background_tasks.add_task(update_rollups, result.get("new_data", analyzed_entries), topic, client_name)
+
+        # === Ähnlichkeitsindex des Topics fortschreiben ===
+        background_tasks.add_task(index_entries, analyzed_entries, topic, client_name)
 
         # === Insights extrahieren (falls vorhanden) ===
         insights = module_report.get("insights", {})
 
-        return {
+        response = {
             "message": "Analyse erfolgreich abgeschlossen.",
             "record_count": len(analyzed_entries),
-            "csv_url": f"/downloads/{csv_filename}",
-            "json_url": f"/downloads/{json_filename}",
+            **export_urls(result_id),
             "data": analyzed_entries,  # 👈 volle Daten zurückgeben
             "modules_run": module_report,
-            "insights": insights  # 👈 garantiert Dict
+            "insights": insights,  # 👈 garantiert Dict
+            "mirror_report": result["mirror_report"],
+            "admission": admission,
+            "queue": ticket.metadata()
         }
+        if "preprocessing" in result:
+            response["preprocessing"] = result["preprocessing"]
+        if "new_record_count" in result:
+            response["new_record_count"] = result["new_record_count"]
 
+        # JSON (orjson), MessagePack oder Arrow IPC je nach Accept, große Antworten komprimiert
+        # (Serialisierung & Kompression im Thread, der Event Loop bleibt frei)
+        return await asyncio.to_thread(encode_response, response, accept, accept_encoding)
 
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(math.ceil(e.retry_after)))})
     except Exception as e:
         logger.exception("Analysefehler")
         raise HTTPException(status_code=500, detail=f"Analysefehler: {str(e)}")
 
 
+# === Ähnliche Kommentare (ANN-Index pro Topic) ===
+@router.get("/similar")
+def similar_comments(text: str, topic: str = "klima", k: int = 20, user_api_key: str = Header(None)):
+    if not user_api_key:
+        raise HTTPException(status_code=400, detail="API-Key erforderlich")
+    client_name = verify_api_key(user_api_key)
+
+    if not text.strip():
+        raise HTTPException(status_code=422, detail="Text erforderlich")
+
+    started = time.perf_counter()
+    results = search_similar(text, topic, client_name, k=max(1, min(k, 200)))
+    return {
+        "topic": topic,
+        "query": text,
+        "count": len(results),
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": results,
+    }
+
+
+# === Analysis Store: Läufe, Einträge, Aggregationen (nur eigene Daten des Clients) ===
+def _client_for(user_api_key: str | None) -> str:
+    if not user_api_key:
+        raise HTTPException(status_code=400, detail="API-Key erforderlich")
+    return verify_api_key(user_api_key)
+
+
+@router.get("/runs")
+def get_runs(topic: str = None, limit: int = 50, offset: int = 0, user_api_key: str = Header(None)):
+    client_name = _client_for(user_api_key)
+    return {"runs": list_runs(client=client_name, topic=topic, limit=limit, offset=offset)}
+
+
+@router.get("/entries")
+def get_entries(
+    topic: str = None,
+    source: str = None,
+    run_id: str = None,
+    stance: str = None,
+    emotion: str = None,
+    since: str = None,
+    until: str = None,
+    fields: str = None,
+    limit: int = 100,
+    after_id: int = 0,
+    user_api_key: str = Header(None)
+):
+    client_name = _client_for(user_api_key)
+    try:
+        return FastJSONResponse(query_entries(
+            limit=limit, after_id=after_id,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            client=client_name, topic=topic, source=source, run_id=run_id,
+            stance=stance, emotion=emotion, since=since, until=until
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/aggregate")
+def get_aggregate(
+    metric: str = None,
+    agg: str = "avg",
+    group_by: str = "day",
+    topic: str = None,
+    source: str = None,
+    run_id: str = None,
+    since: str = None,
+    until: str = None,
+    user_api_key: str = Header(None)
+):
+    client_name = _client_for(user_api_key)
+    try:
+        rows = aggregate(
+            metric=metric, agg=agg, group_by=[g.strip() for g in group_by.split(",") if g.strip()],
+            client=client_name, topic=topic, source=source, run_id=run_id, since=since, until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"metric": metric, "agg": agg, "group_by": group_by, "rows": rows}
+
+
+# === Trends aus vorberechneten Rollups (O(Fenster)) ===
+@router.get("/trends")
+def get_trends(
+    topic: str = "klima",
+    metric: str = "ambivalence_score",
+    granularity: str = "hour",
+    since: str = None,
+    until: str = None,
+    detect: bool = True,
+    user_api_key: str = Header(None)
+):
+    client_name = _client_for(user_api_key)
+    try:
+        trend = get_trend(topic, metric=metric, granularity=granularity, client=client_name, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response = {"topic": topic, "metric": metric, "granularity": granularity, "windows": trend}
+    if detect:
+        response["changes"] = detect_changes(trend, metric)
+    return response
+
+
+# === Prometheus-Metriken (Pipeline, Modelle, Queue, Prozess) ===
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # === Download-Endpunkt ===
 @router.get("/downloads/{filename}")
-def download_file(filename: str):
-    file_path = os.path.join(EXPORT_DIR, filename)
-    if not os.path.exists(file_path):
+def download_file(filename: str, if_none_match: str = Header(None)):
+    if not is_export_filename(filename):
         raise HTTPException(status_code=404, detail="Datei nicht gefunden.")
 
-    if filename.endswith(".csv"):
-        content_type = "text/csv"
-    elif filename.endswith(".json"):
-        content_type = "application/json"
-    else:
-        content_type = "application/octet-stream"
+    # Dateinamen sind inhaltsadressiert → Inhalt ändert sich nie; der ETag-Vergleich
+    # kommt daher vor resolve_export und erzeugt keinen Export neu
+    etag = export_etag(filename)
+    cache_headers = {"ETag": etag, "Cache-Control": f"private, max-age={EXPORT_TTL_SECONDS}, immutable"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=cache_headers)
 
-    return FileResponse(file_path, media_type=content_type, filename=filename)
+    # Export wird beim ersten Abruf erzeugt und danach gecacht
+    file_path = resolve_export(filename)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="Datei nicht gefunden.")
+
+    extension = filename.rsplit(".", 1)[-1]
+    content_type = EXPORT_FORMATS.get(extension, "application/octet-stream")
+
+    # FileResponse beantwortet Range-Requests (206) selbst
+    return FileResponse(file_path, media_type=content_type, filename=filename, headers=cache_headers)
 
 
 # === Admin-API-Key-Check (nicht in OpenAPI-Schema anzeigen) ===
@@ -129,3 +474,24 @@ def list_api_keys(admin_key: str = Header(...)):
         keys = yaml.safe_load(f)
 
     return keys
+
+
+# === Sampling-Profil des laufenden Prozesses (nur Admin) ===
+@router.get("/admin/profile", include_in_schema=False)
+async def profile_process(seconds: float = 10, interval: float = PROFILE_INTERVAL, admin_key: str = Header(...)):
+    if admin_key != ADMIN_SECRET:
+        raise HTTPException(status_code=403, detail="Nicht autorisiert")
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds muss zwischen 0 und {PROFILE_MAX_SECONDS:g} liegen")
+
+    try:
+        counts = await asyncio.to_thread(profile_for, seconds, interval)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    # Bei mehreren Server-Workern wird nur der Prozess profiliert, der die Anfrage bedient
+    filename = f"htif_profile_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.collapsed"
+    return Response(
+        content=render_collapsed(counts), media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
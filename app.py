@@ -3,6 +3,8 @@ import requests
 import json
 import pandas as pd
 from datetime import datetime
+from services.result_views import top_k
+from services.serialization import client_accept_encoding, client_accept_header, decode_response
 
 # === PAGE CONFIG ===
 st.set_page_config(page_title="HTIF – How The Internet Feels", layout="wide")
@@ -21,9 +23,14 @@ No real-time data is collected or stored — all analyses are based on uploaded
 </div>
 """, unsafe_allow_html=True)
 
+def set_result(result: dict):
+    """Stores a result and builds its DataFrame once; all tabs read st.session_state["df"]."""
+    st.session_state["result"] = result
+    st.session_state["df"] = pd.DataFrame(result.get("data", [])) if result else None
+
 # === INIT SESSION STATE ===
 if "result" not in st.session_state:
-    st.session_state["result"] = None
+    set_result(None)
 
 # === MAIN TABS ===
 tabs = st.tabs(["Start Analysis", "Results", "Top Quotes", "Mirror Report"])
@@ -67,7 +74,11 @@ with tabs[0]:
             st.error("Please enter your API key.")
         else:
             try:
-                headers = {"user-api-key": user_api_key}
+                headers = {
+                    "user-api-key": user_api_key,
+                    "Accept": client_accept_header(),
+                    "Accept-Encoding": client_accept_encoding(),
+                }
                 data = {
                     "topic": domain.lower(),
                     "mode": "auto" if "Quick" in mode else "manual",
@@ -101,8 +112,8 @@ with tabs[0]:
 
                 # --- Handle Response ---
                 if response and response.status_code == 200:
-                    result = response.json()
-                    st.session_state["result"] = result
+                    result = decode_response(response)
+                    set_result(result)
                     st.success(f"✅ Full analysis completed successfully (including Mirror check).")
                 elif response:
                     st.error(f"API Error {response.status_code}")
@@ -123,7 +134,7 @@ with tabs[0]:
     def load_demo(path, label, note):
         try:
             with open(path, "r", encoding="utf-8") as f:
-                st.session_state["result"] = json.load(f)
+                set_result(json.load(f))
             st.success(f"{label} demo loaded successfully.")
             st.info(note)
         except Exception as e:
@@ -147,7 +158,7 @@ with tabs[1]:
     result = st.session_state.get("result")
 
     if result and "data" in result:
-        df = pd.DataFrame(result["data"])
+        df = st.session_state["df"]
         st.subheader("Comment Sample")
         st.dataframe(df.head(), use_container_width=True)
 
@@ -184,12 +195,10 @@ with tabs[2]:
     st.header("Top Quotes by Quote Density")
 
     if st.session_state.get("result") and "data" in st.session_state["result"]:
-        df = pd.DataFrame(st.session_state["result"]["data"])
+        df = st.session_state["df"]
         if "quote" in df.columns and "quote_density" in df.columns:
             min_density = st.slider("Minimum Quote Density", 0.0, 1.0, 0.3, 0.01)
-            filtered = df.dropna(subset=["quote", "quote_density"])
-            filtered = filtered[filtered["quote_density"] >= min_density]
-            top_quotes = filtered.sort_values(by="quote_density", ascending=False).head(20)
+            top_quotes = top_k(df, "quote_density", 20, min_value=min_density, subset=["quote", "quote_density"])
 
             st.dataframe(top_quotes, use_container_width=True)
 
@@ -2,12 +2,18 @@ import streamlit as st
 import pandas as pd
 import json
 
-from modules import add_quotes_to_entries
-from modules.emotion.emotion_analysis import add_emotions_to_entries
-from kpi_calculate import add_kpis_to_entries
-from modules.narrative.narrative_roles import add_narrative_roles
-from modules.framing.framing_detect import add_framing_to_entries
-from modules.irony.irony_detect import add_irony_labels
+from services.analyzer import STREAM_CHUNK_SIZE, iter_analysis_pipeline
+
+# Module der Upload-Analyse (Registry-Namen, Reihenfolge wie bisher);
+# kpi_calculate kommt aus modules.kpi.kpi_calculate (über modules.registry)
+UPLOAD_MODULES = [
+    "quote_extraction",
+    "emotion_analysis",
+    "kpi_calculate",
+    "narrative_roles",
+    "framing_detect",
+    "irony_detect",
+]
 
 st.set_page_config(page_title="HTIF Upload", layout="centered")
 st.title("HTIF – Eigene Textdaten analysieren")
@@ -51,20 +57,24 @@ if uploaded_file:
 
         if st.button("Analyse starten"):
             entries = df.to_dict(orient="records")
-            total = len(entries)
             progress = st.progress(0, text="Starte Analyse...")
 
-            # Pipeline mit Fortschrittsbalken
-            for i, entry in enumerate(entries):
-                entry = add_quotes_to_entries([entry])[0]
-                entry = add_emotions_to_entries([entry])[0]
-                entry = add_kpis_to_entries([entry])[0]
-                entry = add_narrative_roles([entry])[0]
-                entry = add_framing_to_entries([entry])[0]
-                entry = add_irony_labels([entry])[0]
-
-                entries[i] = entry
-                progress.progress((i + 1) / total, text=f"Verarbeite Beitrag {i + 1} von {total}...")
+            # Pipeline in Chunks über den gemeinsamen Analyzer (Batching pro Modul),
+            # Fortschritt pro Chunk & Modul
+            def on_progress(fraction: float, message: str):
+                progress.progress(min(1.0, fraction), text=message)
+
+            results = []
+            for record in iter_analysis_pipeline(
+                entries,
+                industry="default",
+                modules=UPLOAD_MODULES,
+                chunk_size=STREAM_CHUNK_SIZE,
+                progress_callback=on_progress
+            ):
+                if record["type"] == "chunk":
+                    results.extend(record["data"])
+            entries = results
 
             progress.empty()
             st.success("Analyse abgeschlossen.")
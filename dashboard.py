@@ -3,6 +3,8 @@ import requests
 import json
 import pandas as pd
 from datetime import datetime
+from services.result_views import top_k
+from services.serialization import client_accept_encoding, client_accept_header, decode_response
 
 st.set_page_config(page_title="HTIF Analyse", layout="wide")
 
@@ -17,9 +19,15 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+def set_result(result: dict):
+    """Speichert das Ergebnis und baut den DataFrame einmal; alle Tabs lesen st.session_state["df"]."""
+    st.session_state["result"] = result
+    st.session_state["df"] = pd.DataFrame(result.get("data", [])) if result else None
+    st.session_state["json_bytes"] = None
+
 # === Session State initialisieren ===
 if "result" not in st.session_state:
-    st.session_state["result"] = None
+    set_result(None)
 
 
 # === Tabs definieren ===
@@ -54,15 +62,19 @@ with tabs[0]:
                     "comment_limit": str(comment_limit),
                     "mode": "auto" if "Schnell" in mode else "manual"
                 }
-                headers = {"user-api-key": user_api_key}
+                headers = {
+                    "user-api-key": user_api_key,
+                    "Accept": client_accept_header(),
+                    "Accept-Encoding": client_accept_encoding(),
+                }
                 files = {"file": (uploaded_file.name, uploaded_file.getvalue())} if uploaded_file else {}
 
                 with st.spinner("Analysiere Kommentare..."):
                     response = requests.post(api_url, data=data, files=files, headers=headers)
 
                 if response.status_code == 200:
-                    result = response.json()
-                    st.session_state["result"] = result
+                    result = decode_response(response)
+                    set_result(result)
                     st.success(f"{result['record_count']} Kommentare verarbeitet.")
                 else:
                     st.error(f"Fehler {response.status_code}")
@@ -78,7 +90,7 @@ with tabs[0]:
             if st.button("Trump-Diskurs laden"):
                 try:
                     with open("htif_demo_trump_20250624_070205.json", "r", encoding="utf-8") as f:
-                        st.session_state["result"] = json.load(f)
+                        set_result(json.load(f))
                     st.success("Trump-Demodaten erfolgreich geladen.")
                 except Exception:
                     st.error("Trump-Demo-Datei nicht gefunden.")
@@ -87,7 +99,7 @@ with tabs[0]:
             if st.button("Tesla-Diskurs laden"):
                 try:
                     with open("htif_demo_tesla_20250624_072309.json", "r", encoding="utf-8") as f:
-                        st.session_state["result"] = json.load(f)
+                        set_result(json.load(f))
                     st.success("Tesla-Demodaten erfolgreich geladen.")
                 except Exception:
                     st.error("Tesla-Demo-Datei nicht gefunden.")
@@ -96,7 +108,7 @@ with tabs[0]:
             if st.button("Bankendiskurs laden"):
                 try:
                     with open("final_banking_demo_2024.json", "r", encoding="utf-8") as f:
-                        st.session_state["result"] = json.load(f)
+                        set_result(json.load(f))
                     st.success("Bankendiskurs-Demodaten erfolgreich geladen.")
                     st.info("Analyse basiert auf synthetischen Kommentaren zu Inflation & Banken.")
                 except Exception:
@@ -108,7 +120,7 @@ with tabs[1]:
     st.title("Analyseergebnisse")
 
     if result:
-        df = pd.DataFrame(result["data"])
+        df = st.session_state["df"]
         st.subheader("Kommentare (Auszug)")
         st.dataframe(df.head(), use_container_width=True)
 
@@ -125,9 +137,10 @@ with tabs[1]:
             st.markdown(f"📄 [Kommentare als CSV exportieren]({result['csv_url']})")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        json_bytes = json.dumps(result, indent=2).encode("utf-8")
+        if st.session_state.get("json_bytes") is None:
+            st.session_state["json_bytes"] = json.dumps(result, indent=2).encode("utf-8")
         st.download_button("📥 Download JSON mit Zeitstempel",
-                           data=json_bytes,
+                           data=st.session_state["json_bytes"],
                            file_name=f"htif_result_{timestamp}.json",
                            mime="application/json")
 
@@ -164,15 +177,13 @@ with tabs[2]:
     st.title("Top-Zitate (nach Quote Density)")
 
     if st.session_state.get("result"):
-        df = pd.DataFrame(st.session_state["result"]["data"])
+        df = st.session_state["df"]
 
         if "quote" in df.columns and "quote_density" in df.columns:
             st.subheader("Top-Zitate filtern")
             min_density = st.slider("Minimaler Quote Density", 0.0, 1.0, 0.3, 0.01)
 
-            filtered = df[["quote", "quote_density"]].dropna()
-            filtered = filtered[filtered["quote_density"] >= min_density]
-            top_quotes = filtered.sort_values(by="quote_density", ascending=False).head(20)
+            top_quotes = top_k(df[["quote", "quote_density"]], "quote_density", 20, min_value=min_density)
 
             st.dataframe(top_quotes, use_container_width=True)
 
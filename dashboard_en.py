@@ -1,8 +1,13 @@
 import streamlit as st
+import hashlib
+import io
 import json
 import pandas as pd
 from datetime import datetime
 from services.analyzer import run_analysis_pipeline
+from services.result_views import (
+    MAP_BINS, PAGE_SIZE, bin_codes, bin_meaning_map, bin_members, page_count, paginate, top_k
+)
 from services.data_fetcher import (
     fetch_from_api,
     fetch_social_media,
@@ -139,11 +144,66 @@ def render_glossary():
 </div>
 """, unsafe_allow_html=True)
 
+# ===============================
+# ANALYSIS CACHE
+# ===============================
+# Streamlit re-executes the whole script on every widget interaction.
+# Uploads are analyzed once per (content hash, profile, limit); reruns only
+# hash the upload bytes and reuse the stored result and DataFrame.
+@st.cache_data(show_spinner=False, max_entries=8)
+def analyze_upload(content_hash: str, file_name: str, industry: str, limit: int, _file_bytes: bytes) -> dict:
+    if file_name.endswith(".json"):
+        content = json.loads(_file_bytes.decode("utf-8"))
+        entries = content.get("data", content)[:limit] if isinstance(content, dict) else content[:limit]
+    else:
+        entries = pd.read_csv(io.BytesIO(_file_bytes)).head(limit).to_dict(orient="records")
+    return run_analysis_pipeline(entries, industry=industry, topic=industry.lower())
+
+def set_result(result: dict, key=None):
+    """Stores a result and builds its DataFrame once; all tabs read st.session_state["df"]."""
+    st.session_state["result"] = result
+    st.session_state["result_key"] = key
+    st.session_state["df"] = pd.DataFrame(result.get("data", [])) if result else None
+    st.session_state["map_df"] = None
+    st.session_state["map_grids"] = {}
+
+def meaning_map_frame():
+    """Meaning Map columns (zero-filled, with fallbacks), derived once per result."""
+    df = st.session_state.get("df")
+    if df is None:
+        return None
+    if st.session_state.get("map_df") is None:
+        map_df = df.fillna(0)
+        map_df["emotion_score"] = map_df.get("emotion_score", map_df.get("resonance_score", 0))
+        map_df["moral_intensity"] = map_df.get("moral_intensity", map_df.get("ambivalence_score", 0))
+        st.session_state["map_df"] = map_df
+    return st.session_state["map_df"]
+
+def meaning_map_grid(bins: int):
+    """(bin codes, aggregated grid) for the current result, computed once per bin count."""
+    grids = st.session_state.setdefault("map_grids", {})
+    if bins not in grids:
+        df = meaning_map_frame()
+        codes = bin_codes(df, bins=bins)
+        grids[bins] = (codes, bin_meaning_map(df, bins=bins, codes=codes))
+    return grids[bins]
+
+def render_paginated(df: pd.DataFrame, key: str, page_size: int = PAGE_SIZE):
+    """Renders one page of df; only that page is sent to the browser."""
+    pages = page_count(len(df), page_size)
+    page = st.number_input(f"Page (1–{pages})", min_value=1, max_value=pages, value=1, step=1, key=key)
+    st.dataframe(paginate(df, page, page_size), use_container_width=True)
+    st.caption(f"{len(df):,} rows · page {page} of {pages}")
+
 # ===============================
 # SESSION STATE
 # ===============================
 if "result" not in st.session_state:
     st.session_state["result"] = None
+    st.session_state["result_key"] = None
+    st.session_state["df"] = None
+    st.session_state["map_df"] = None
+    st.session_state["map_grids"] = {}
 
 # ===============================
 # TABS
@@ -168,18 +228,17 @@ with tabs[0]:
         uploaded = st.file_uploader("Upload CSV or JSON File", type=["csv", "json"])
         limit = st.slider("Max Comments to Analyze", 10, 500, 100)
         if uploaded:
-            with st.spinner("Running HTIF pipeline..."):
-                try:
-                    if uploaded.name.endswith(".json"):
-                        content = json.load(uploaded)
-                        entries = content.get("data", content)[:limit]
-                    else:
-                        df = pd.read_csv(uploaded).head(limit)
-                        entries = df.to_dict(orient="records")
-                    st.session_state["result"] = run_analysis_pipeline(entries, industry=industry, topic=industry.lower())
-                    render_success_box("Full analysis completed successfully (including Mirror check).")
-                except Exception as e:
-                    st.error(f"Error: {e}")
+            file_bytes = uploaded.getvalue()
+            content_hash = hashlib.sha256(file_bytes).hexdigest()
+            key = (content_hash, industry, limit)
+            if st.session_state.get("result_key") != key:
+                with st.spinner("Running HTIF pipeline..."):
+                    try:
+                        set_result(analyze_upload(content_hash, uploaded.name, industry, limit, file_bytes), key)
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+            if st.session_state.get("result_key") == key:
+                render_success_box("Full analysis completed successfully (including Mirror check).")
 
     # === API ===
     elif input_mode == "API Request":
@@ -193,7 +252,7 @@ with tabs[0]:
                 with st.spinner("Fetching via API..."):
                     try:
                         entries = fetch_from_api(api_url, api_key=api_key, limit=limit)
-                        st.session_state["result"] = run_analysis_pipeline(entries, industry=industry, topic=industry.lower())
+                        set_result(run_analysis_pipeline(entries, industry=industry, topic=industry.lower()))
                         render_success_box("Full analysis completed successfully (including Mirror check).")
                     except Exception as e:
                         st.error(f"API error: {e}")
@@ -207,7 +266,7 @@ with tabs[0]:
             with st.spinner(f"Fetching {limit} comments from {platform}..."):
                 try:
                     entries = fetch_social_media(platform, post_id, limit=limit)
-                    st.session_state["result"] = run_analysis_pipeline(entries, industry=industry, topic=industry.lower())
+                    set_result(run_analysis_pipeline(entries, industry=industry, topic=industry.lower()))
                     render_success_box(f"Analysis completed for {platform} post {post_id}.")
                 except Exception as e:
                     st.error(f"Error fetching comments: {e}")
@@ -219,7 +278,7 @@ with tabs[0]:
             with st.spinner("Generating synthetic discourse..."):
                 try:
                     entries = generate_synthetic_discourse(industry, limit)
-                    st.session_state["result"] = run_analysis_pipeline(entries, industry=industry, topic=industry.lower())
+                    set_result(run_analysis_pipeline(entries, industry=industry, topic=industry.lower()))
                     render_success_box("Synthetic dataset analyzed successfully (including Mirror check).")
                 except Exception as e:
                     st.error(f"Synthetic generation failed: {e}")
@@ -229,12 +288,11 @@ with tabs[0]:
 # -------------------------------------------------------------
 with tabs[1]:
     st.header("Analysis Results")
-    result = st.session_state.get("result")
+    df = st.session_state.get("df")
 
-    if result and "data" in result:
-        df = pd.DataFrame(result["data"])
-        st.subheader("Comment Sample")
-        st.dataframe(df.head(), use_container_width=True)
+    if df is not None:
+        st.subheader("Comments")
+        render_paginated(df, key="results_page")
 
         st.subheader("Key Metrics")
         c1, c2, c3 = st.columns(3)
@@ -253,14 +311,13 @@ with tabs[1]:
 # -------------------------------------------------------------
 with tabs[2]:
     st.header("Top Quotes by Quote Density")
-    if st.session_state.get("result") and "data" in st.session_state["result"]:
-        df = pd.DataFrame(st.session_state["result"]["data"])
+    df = st.session_state.get("df")
+    if df is not None:
         if {"quote", "quote_density"} <= set(df.columns):
             min_d = st.slider("Minimum Quote Density", 0.0, 1.0, 0.3, 0.01)
-            filt = df.dropna(subset=["quote", "quote_density"])
-            filt = filt[filt["quote_density"] >= min_d]
-            top_q = filt.sort_values(by="quote_density", ascending=False).head(20)
-            st.dataframe(top_q, use_container_width=True)
+            k = st.select_slider("Number of Quotes", options=[20, 50, 100, 500, 1000], value=20)
+            top_q = top_k(df, "quote_density", k, min_value=min_d, subset=["quote", "quote_density"])
+            render_paginated(top_q, key="quotes_page", page_size=20)
         else:
             render_info_box("No quote data available.")
     else:
@@ -288,13 +345,9 @@ with tabs[3]:
 # -------------------------------------------------------------
 with tabs[4]:
     st.header("Meaning Map — Interactive Story Dashboard")
-    result = st.session_state.get("result")
-
-    if result and "data" in result:
-        df = pd.DataFrame(result["data"]).fillna(0)
-        df["emotion_score"] = df.get("emotion_score", df.get("resonance_score", 0))
-        df["moral_intensity"] = df.get("moral_intensity", df.get("ambivalence_score", 0))
+    df = meaning_map_frame()
 
+    if df is not None:
         mean_emotion = df["emotion_score"].mean()
         mean_moral = df["moral_intensity"].mean()
         mean_amb = df["ambivalence_score"].mean()
@@ -310,20 +363,46 @@ with tabs[4]:
 
         st.markdown(f"<div class='highlight-panel'>{mood_text}</div>", unsafe_allow_html=True)
 
+        # Server-side 2D binning: the chart receives at most bins² rectangles,
+        # independent of the number of comments.
+        bins = st.select_slider("Map Resolution (bins per axis)", options=[10, 20, 40], value=MAP_BINS)
+        codes, grid = meaning_map_grid(bins)
+
         chart = (
-            alt.Chart(df)
-            .mark_circle(size=150, opacity=0.8)
+            alt.Chart(grid)
+            .mark_rect(stroke="#fff", strokeWidth=0.5)
             .encode(
-                x=alt.X('moral_intensity:Q', title='Moral Intensity (0–1)'),
-                y=alt.Y('emotion_score:Q', title='Emotional Charge (0–1)'),
-                color=alt.Color('ambivalence_score:Q', scale=alt.Scale(scheme='blues'), title='Ambivalence (0–1)'),
-                size=alt.Size('resonance_score:Q', title='Resonance (0–1)'),
-                tooltip=['text', 'emotion', 'stance', 'resonance_score', 'ambivalence_score']
+                x=alt.X('x0:Q', title='Moral Intensity (0–1)', scale=alt.Scale(domain=[0, 1])),
+                x2='x1:Q',
+                y=alt.Y('y0:Q', title='Emotional Charge (0–1)', scale=alt.Scale(domain=[0, 1])),
+                y2='y1:Q',
+                color=alt.Color('mean_ambivalence_score:Q', scale=alt.Scale(scheme='blues'), title='Avg. Ambivalence (0–1)'),
+                opacity=alt.Opacity('count:Q', scale=alt.Scale(type='log', range=[0.35, 1]), title='Comments'),
+                tooltip=[
+                    alt.Tooltip('count:Q', title='Comments'),
+                    alt.Tooltip('mean_ambivalence_score:Q', title='Avg. Ambivalence'),
+                    alt.Tooltip('mean_resonance_score:Q', title='Avg. Resonance'),
+                    alt.Tooltip('x0:Q', title='Moral from'),
+                    alt.Tooltip('y0:Q', title='Emotion from'),
+                ]
             )
             .properties(height=450)
-            .interactive()
         )
         st.altair_chart(chart, use_container_width=True)
+
+        # === Drill-down: raw comments only for the selected bin ===
+        st.subheader("Drill-down")
+        cells = grid.sort_values("count", ascending=False)
+        labels = {
+            f"Moral {row.x0:.2f}–{row.x1:.2f} × Emotion {row.y0:.2f}–{row.y1:.2f} ({row.count} comments)": (row.bin_x, row.bin_y)
+            for row in cells.itertuples()
+        }
+        choice = st.selectbox("Select a cell", list(labels))
+        if choice:
+            bin_x, bin_y = labels[choice]
+            members = bin_members(df, bin_x, bin_y, bins=bins, codes=codes)
+            columns = [c for c in ["text", "emotion", "stance", "moral_intensity", "emotion_score", "resonance_score", "ambivalence_score"] if c in members.columns]
+            render_paginated(members[columns], key="map_page")
     else:
         st.info("Run a full analysis first to generate the Meaning Map.")
     render_glossary()
@@ -4,8 +4,23 @@ import ftfy
 import os
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 REQUIRED_FIELDS = {"text", "topic_tag", "timestamp", "source", "user_type"}
+OUTPUT_FIELDS = ["text", "topic_tag", "timestamp", "source", "user_type"]
+
+# Unicode-freundliche Zeichenbereinigung
+CLEAN_PATTERN = re.compile(r"[^\w\s.,!?ßäöüÄÖÜ-]")
+
+# ASCII-Zeichen, bei denen ftfy trotzdem etwas ändert: HTML-Entities (&),
+# Steuerzeichen inkl. Terminal-Escapes & CR (alle C0 außer \t, \n, \f) und DEL
+FTFY_ASCII_TRIGGERS = re.compile(r"[&\x00-\x08\x0b\x0d-\x1f\x7f]")
+
+# Zeichenbereiche, in denen Emojis liegen können – sonst entfällt replace_emoji
+EMOJI_CANDIDATES = re.compile(r"[\u00a9\u00ae\u2000-\u3300\ufe0f\U0001f000-\U0010ffff]")
+
+# Ab dieser Zeilenzahl wird die Bereinigung auf einen Prozess-Pool verteilt
+PARALLEL_MIN_ROWS = 200_000
 
 def remove_emojis(text):
     return emoji.replace_emoji(text, replace='')
@@ -14,25 +29,48 @@ def clean_text(text):
     text = ftfy.fix_text(text)
     text = remove_emojis(text)
     # Unicode-freundliche Zeichenbereinigung
-    text = re.sub(r"[^\w\s.,!?ßäöüÄÖÜ-]", "", text)
+    text = CLEAN_PATTERN.sub("", text)
     return text.strip()
 
-def transform_row(row):
-    return {
-        "text": clean_text(row["text"]),
-        "topic_tag": row["topic_tag"],
-        "timestamp": row["timestamp"],
-        "source": row["source"],
-        "user_type": row["user_type"]
-    }
+def _fix_unicode(text):
+    text = ftfy.fix_text(text)
+    return remove_emojis(text) if EMOJI_CANDIDATES.search(text) else text
+
+def clean_text_series(texts: pd.Series) -> pd.Series:
+    """
+    Batch-Variante von clean_text.
+    ftfy & Emoji-Entfernung laufen nur auf Zeilen, die sie brauchen
+    (Nicht-ASCII oder ASCII-Trigger); der Regex-Schritt ist vektorisiert.
+    """
+    texts = texts.fillna("").astype(str)
+    needs_fix = ~texts.map(str.isascii) | texts.str.contains(FTFY_ASCII_TRIGGERS, regex=True)
+    if needs_fix.any():
+        texts = texts.copy()
+        texts[needs_fix] = texts[needs_fix].map(_fix_unicode)
+    return texts.str.replace(CLEAN_PATTERN, "", regex=True).str.strip()
+
+def clean_text_parallel(texts: pd.Series, processes: int | None = None) -> pd.Series:
+    """
+    Verteilt clean_text_series für große Serien auf einen Prozess-Pool.
+    """
+    if processes == 1 or len(texts) < PARALLEL_MIN_ROWS:
+        return clean_text_series(texts)
+
+    workers = processes or os.cpu_count() or 1
+    size = -(-len(texts) // workers)
+    chunks = [texts.iloc[i:i + size] for i in range(0, len(texts), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return pd.concat(list(pool.map(clean_text_series, chunks)))
 
-def preprocess_dataframe(df: pd.DataFrame) -> list[dict]:
+def preprocess_dataframe(df: pd.DataFrame, processes: int | None = None) -> list[dict]:
     if not REQUIRED_FIELDS.issubset(df.columns):
         missing = REQUIRED_FIELDS - set(df.columns)
         raise ValueError(f"Fehlende Spalten in DataFrame: {missing}")
 
-    # Pandas-optimierte Iteration
-    cleaned_rows = df.apply(transform_row, axis=1).tolist()
+    # Vektorisierte Bereinigung statt zeilenweisem apply
+    out = df[OUTPUT_FIELDS].copy()
+    out["text"] = clean_text_parallel(out["text"], processes=processes)
+    cleaned_rows = out.to_dict(orient="records")
 
     if not cleaned_rows:
         raise ValueError("Keine gültigen Zeilen – leeres Ergebnis.")
@@ -1,5 +1,7 @@
+import argparse
 import pandas as pd
 import json
+from functools import partial
 from pathlib import Path
 from services.analyzer import run_analysis_pipeline
 
@@ -27,5 +29,161 @@ def main():
     print(f"- {OUTPUT_CSV}")
     print("Done!")
 
+def stream(args):
+    from services import stream_worker
+
+    if args.source == "ndjson":
+        if not args.path:
+            raise SystemExit("--path erforderlich für --source ndjson")
+        start_source = partial(stream_worker.tail_ndjson, args.path, from_start=args.from_start)
+    elif args.source == "socket":
+        start_source = partial(stream_worker.serve_socket, args.host, args.port)
+    else:
+        if not (args.platform and args.post_ids and args.api_key):
+            raise SystemExit("--platform, --post-ids und --api-key erforderlich für --source poll")
+        post_ids = [p.strip() for p in args.post_ids.split(",") if p.strip()]
+        start_source = partial(
+            stream_worker.poll_comments, args.platform, post_ids, args.api_key, interval=args.interval,
+            scope=(args.client, args.industry or args.topic, args.topic)
+        )
+
+    stream_worker.run_stream(
+        start_source,
+        industry=args.industry or args.topic,
+        topic=args.topic,
+        batch_size=args.batch_size,
+        max_wait=args.max_wait,
+        window_seconds=args.window,
+        client=args.client,
+        store=not args.no_store,
+        alerts_path=args.alerts,
+    )
+
+def batch(args):
+    from services import batch_runner
+
+    result = batch_runner.run_batch(
+        args.inputs,
+        profile=args.profile,
+        topic=args.topic,
+        shard_size=args.shard_size,
+        workers=args.workers,
+        run_id=args.run_id,
+        output_dir=args.output,
+    )
+    if result["status"] != "done":
+        raise SystemExit(1)
+
+    print("\nResults saved:")
+    for path in result["exports"].values():
+        print(f"- {path}")
+    print(f"- {result['run_dir']}/{batch_runner.REPORT_NAME}")
+
+def coordinate(args):
+    from services import task_queue
+
+    status = task_queue.create_queue(args.inputs, args.queue_dir, profile=args.profile, topic=args.topic, shard_size=args.shard_size)
+    print(f"Queue {args.queue_dir}: {status['total']} Tasks ({status['pending']} offen, {status['done']} fertig)")
+
+def work(args):
+    from services import task_queue
+
+    task_queue.run_workers(
+        args.queue_dir,
+        processes=args.processes,
+        lease_seconds=args.lease,
+        exit_when_empty=not args.forever,
+    )
+
+def finalize(args):
+    from services import task_queue
+
+    if args.retry_failed:
+        print(f"{task_queue.retry_failed(args.queue_dir)} fehlgeschlagene Tasks zurückgesetzt.")
+        return
+    result = task_queue.finalize(args.queue_dir)
+    if result["status"] != "done":
+        print(f"Noch nicht fertig: {result['done']}/{result['total']} Tasks erledigt, "
+              f"{result['leased']} in Arbeit, {result['failed']} fehlgeschlagen {result['errors'] or ''}")
+        raise SystemExit(1)
+
+    print("\nResults saved:")
+    for path in result["exports"].values():
+        print(f"- {path}")
+
+def build_parser() -> argparse.ArgumentParser:
+    from services import batch_runner, profiler, stream_worker, task_queue
+
+    parser = argparse.ArgumentParser(description="HTIF Analyse-CLI (ohne Unterbefehl: Demo-Lauf auf INPUT_PATH)")
+    parser.add_argument("--profile-out", dest="profile_output", metavar="PATH",
+                        help="Sampling-Profil des Laufs (inkl. Worker-Prozesse) als Collapsed Stacks nach PATH schreiben")
+    parser.add_argument("--profile-interval", type=float, default=profiler.PROFILE_INTERVAL, help="Sampling-Intervall für --profile-out in Sekunden")
+    commands = parser.add_subparsers(dest="command")
+
+    p_stream = commands.add_parser("stream", help="Kontinuierliche Analyse in Micro-Batches mit Sliding-Window-Alerts")
+    p_stream.add_argument("--source", choices=["ndjson", "socket", "poll"], default="ndjson")
+    p_stream.add_argument("--path", help="NDJSON-Datei, die verfolgt wird (--source ndjson)")
+    p_stream.add_argument("--from-start", action="store_true", help="Datei von Anfang an lesen statt nur neue Zeilen")
+    p_stream.add_argument("--host", default="127.0.0.1")
+    p_stream.add_argument("--port", type=int, default=8765)
+    p_stream.add_argument("--platform", help="instagram | tiktok (--source poll)")
+    p_stream.add_argument("--post-ids", help="Kommagetrennte Post-IDs (--source poll)")
+    p_stream.add_argument("--api-key", help="Access Token der Plattform (--source poll)")
+    p_stream.add_argument("--interval", type=float, default=stream_worker.STREAM_POLL_INTERVAL)
+    p_stream.add_argument("--topic", default=TOPIC)
+    p_stream.add_argument("--industry", help="Branchenprofil (Standard: --topic)")
+    p_stream.add_argument("--client", default="stream", help="Client für Analysis Store, Rollups & Checkpoints")
+    p_stream.add_argument("--batch-size", type=int, default=stream_worker.STREAM_BATCH_SIZE)
+    p_stream.add_argument("--max-wait", type=float, default=stream_worker.STREAM_BATCH_MAX_WAIT)
+    p_stream.add_argument("--window", type=float, default=stream_worker.STREAM_WINDOW_SECONDS, help="Sliding Window in Sekunden")
+    p_stream.add_argument("--alerts", default=stream_worker.ALERTS_PATH)
+    p_stream.add_argument("--no-store", action="store_true", help="Nicht in Analysis Store & Rollups schreiben")
+    p_stream.set_defaults(func=stream)
+
+    p_batch = commands.add_parser("batch", help="Fortsetzbare Batch-Analyse großer Dateien über einen Prozess-Pool")
+    p_batch.add_argument("inputs", nargs="+", help="CSV/JSON/NDJSON-Dateien oder Globs (z. B. 'data/*.csv')")
+    p_batch.add_argument("--profile", default=TOPIC, help="Branchenprofil aus config/industry_profiles.yaml")
+    p_batch.add_argument("--topic", help="Topic für topic-aware Module (Standard: --profile)")
+    p_batch.add_argument("--shard-size", type=int, default=batch_runner.SHARD_SIZE)
+    p_batch.add_argument("--workers", type=int, default=batch_runner.BATCH_WORKERS)
+    p_batch.add_argument("--run-id", help="Eigene Run-ID (Standard: Hash aus Eingaben & Parametern)")
+    p_batch.add_argument("--output", default=batch_runner.BATCH_DIR)
+    p_batch.set_defaults(func=batch)
+
+    p_coord = commands.add_parser("coordinate", help="Verteilte Analyse: Eingaben als Tasks in ein gemeinsames Verzeichnis legen")
+    p_coord.add_argument("queue_dir", help="Gemeinsames Verzeichnis (für alle Worker erreichbar)")
+    p_coord.add_argument("inputs", nargs="+", help="CSV/JSON/NDJSON-Dateien oder Globs")
+    p_coord.add_argument("--profile", default=TOPIC)
+    p_coord.add_argument("--topic")
+    p_coord.add_argument("--shard-size", type=int, default=batch_runner.SHARD_SIZE)
+    p_coord.set_defaults(func=coordinate)
+
+    p_work = commands.add_parser("work", help="Verteilte Analyse: Tasks aus dem gemeinsamen Verzeichnis abarbeiten")
+    p_work.add_argument("queue_dir")
+    p_work.add_argument("--processes", type=int, default=1, help="Worker-Prozesse auf diesem Rechner")
+    p_work.add_argument("--lease", type=int, default=task_queue.TASK_LEASE_SECONDS, help="Lease-Dauer in Sekunden")
+    p_work.add_argument("--forever", action="store_true", help="Bei leerer Queue weiter auf neue Tasks warten")
+    p_work.set_defaults(func=work)
+
+    p_final = commands.add_parser("finalize", help="Verteilte Analyse: Teilergebnisse zusammenführen")
+    p_final.add_argument("queue_dir")
+    p_final.add_argument("--retry-failed", action="store_true", help="Fehlgeschlagene Tasks zurück in die Queue legen")
+    p_final.set_defaults(func=finalize)
+
+    return parser
+
+def run(args):
+    if args.command:
+        args.func(args)
+    else:
+        main()
+
 if __name__ == "__main__":
-    main()
+    args = build_parser().parse_args()
+    if args.profile_output:
+        from services.profiler import profile_to
+
+        with profile_to(args.profile_output, args.profile_interval):
+            run(args)
+    else:
+        run(args)
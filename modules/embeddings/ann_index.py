@@ -0,0 +1,410 @@
+"""
+ANN Index (IVF) pro Topic
+-------------------------
+Approximate-Nearest-Neighbor-Suche über alle bisher analysierten Kommentare:
+- Vektoren kommen zero-copy aus dem Embedding Store (nur Zeilennummern im Index)
+- IVF: k-means-Zentroiden (numpy), jede Zeile gehört zu einer Liste;
+  gesucht wird nur in den NPROBE nächstgelegenen Listen
+- inkrementell: neue Einträge werden angehängt und der nächsten Liste
+  zugeordnet; das Training wird wiederholt, wenn der Index stark gewachsen ist
+- persistiert unter ANN_DIR/<topic>/ (append-only Dateien + meta.json)
+- jeder Eintrag gehört einem Client; /similar sucht nur in dessen Einträgen
+- Bulk-API für narrative_clusters: Zuordnung zum nächsten Narrativ-Zentroiden
+  (ebenfalls nur über die Einträge des Clients)
+- Neu-Training läuft außerhalb des Locks; /similar sucht solange auf dem alten Stand
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from modules.embeddings.embedding_store import get_embedding_store
+
+ANN_DIR = os.getenv("HTIF_ANN_DIR", "output/ann")
+
+# Unterhalb dieser Größe wird exakt (brute force) gesucht
+TRAIN_MIN_ITEMS = 1024
+
+# Neu-Training der Zentroiden, wenn der Index um diesen Faktor gewachsen ist
+RETRAIN_GROWTH = 4
+
+MAX_LISTS = 1024
+NPROBE = 8
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE = 20_000
+
+# Mindest-Kosinusähnlichkeit für die Zuordnung zu einem bestehenden Narrativ
+NARRATIVE_MIN_SIMILARITY = 0.5
+
+# Felder, die pro Eintrag gespeichert und bei /similar zurückgegeben werden
+ITEM_FIELDS = (
+    "text", "quote", "stance", "emotion", "narrative_topic", "narrative_label",
+    "source", "timestamp", "post_id",
+)
+
+_indexes: Dict[str, "TopicIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _index_text(entry: dict) -> str:
+    """Quote (wie in narrative_clusters) bzw. Volltext als Grundlage des Vektors."""
+    quote = entry.get("quote")
+    if isinstance(quote, str) and len(quote.strip()) > 10:
+        return quote
+    text = entry.get("text")
+    return text if isinstance(text, str) and text.strip() else ""
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Sphärisches k-means (Kosinus) auf normalisierten Vektoren."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        empty = np.bincount(labels, minlength=k) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class TopicIndex:
+    """
+    IVF-Index über die Kommentare eines Topics.
+    Dateien: rows.i64 (Store-Zeile), lists.i32 (IVF-Liste), narratives.i32
+    (Label-Index), clients.i32 (Client-Index), items.jsonl (Metadaten),
+    centroids.npy, meta.json.
+    """
+
+    def __init__(self, topic: str, directory: str = ANN_DIR):
+        self.topic = topic
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]", "_", topic))
+        os.makedirs(self.directory, exist_ok=True)
+        self.store = get_embedding_store()
+        self.lock = threading.RLock()
+        self.training = False
+
+        self.meta = self._read_json("meta.json", {"trained_on": 0, "labels": []})
+        self.meta.setdefault("clients", [])
+        self.rows = self._read_array("rows.i64", np.int64)
+        self.lists = self._read_array("lists.i32", np.int32)
+        self.narratives = self._read_array("narratives.i32", np.int32)
+        self.clients = self._read_clients()
+        centroids_path = self._path("centroids.npy")
+        self.centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        self._repair()
+        self.row_set = set(zip(self.rows.tolist(), self.clients.tolist()))
+        self.label_ids = {label: i for i, label in enumerate(self.meta["labels"])}
+        self.client_ids = {client: i for i, client in enumerate(self.meta["clients"])}
+        self.item_offsets, self.items_end = self._scan_items()
+
+    # ------------------------------------------------------------
+    # Persistenz
+    # ------------------------------------------------------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_json(self, name: str, default: dict) -> dict:
+        if not os.path.exists(self._path(name)):
+            return default
+        with open(self._path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, name: str, data: dict) -> None:
+        tmp_path = self._path(name) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(name))
+
+    def _read_array(self, name: str, dtype) -> np.ndarray:
+        path = self._path(name)
+        return np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.empty(0, dtype=dtype)
+
+    def _append_array(self, name: str, values: np.ndarray) -> None:
+        with open(self._path(name), "ab") as f:
+            values.tofile(f)
+
+    def _read_clients(self) -> np.ndarray:
+        """Indizes ohne clients.i32 (vor der Client-Trennung): Einträge ohne Client (-1)."""
+        if not os.path.exists(self._path("clients.i32")) and len(self.rows):
+            np.full(len(self.rows), -1, dtype=np.int32).tofile(self._path("clients.i32"))
+        return self._read_array("clients.i32", np.int32)
+
+    def _repair(self) -> None:
+        """
+        rows.i64 wird als letzte Datei geschrieben und bestimmt die gültige Länge;
+        Reste eines abgebrochenen Schreibvorgangs in den übrigen Arrays werden abgeschnitten.
+        """
+        arrays = (
+            ("rows.i64", self.rows), ("lists.i32", self.lists),
+            ("narratives.i32", self.narratives), ("clients.i32", self.clients),
+        )
+        n = min(len(array) for _, array in arrays)
+        for name, array in arrays:
+            if len(array) > n:
+                with open(self._path(name), "r+b") as f:
+                    f.truncate(n * array.itemsize)
+        self.rows, self.lists, self.narratives, self.clients = (array[:n] for _, array in arrays)
+
+    def _scan_items(self) -> tuple[List[int], int]:
+        """Byte-Offsets der gültigen Zeilen in items.jsonl und deren Ende."""
+        offsets, position = [], 0
+        if os.path.exists(self._path("items.jsonl")):
+            with open(self._path("items.jsonl"), "rb") as f:
+                for line in f:
+                    if len(offsets) == len(self.rows):
+                        break
+                    offsets.append(position)
+                    position += len(line)
+        return offsets, position
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # ------------------------------------------------------------
+    # Aufbau
+    # ------------------------------------------------------------
+    def _vectors(self, positions: Optional[np.ndarray] = None, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        rows = self.rows if rows is None else rows
+        return _normalize(self.store.vectors[rows if positions is None else rows[positions]])
+
+    def _assign_lists(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        if centroids is None:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def _label_id(self, label) -> int:
+        if not label:
+            return -1
+        if label not in self.label_ids:
+            self.label_ids[label] = len(self.meta["labels"])
+            self.meta["labels"].append(label)
+        return self.label_ids[label]
+
+    def _client_id(self, client: str) -> int:
+        if client not in self.client_ids:
+            self.client_ids[client] = len(self.meta["clients"])
+            self.meta["clients"].append(client)
+        return self.client_ids[client]
+
+    def add(self, entries: List[dict], client: str) -> int:
+        """Hängt neue Einträge des Clients an (gleiche Texte je Client nur einmal)."""
+        candidates = [(entry, _index_text(entry)) for entry in entries]
+        candidates = [(entry, text) for entry, text in candidates if text]
+        if not candidates:
+            return 0
+
+        rows = self.store.rows_for([text for _, text in candidates])
+        with self.lock:
+            client_id = self._client_id(client)
+            fresh, seen = [], set()
+            for (entry, _), row in zip(candidates, rows.tolist()):
+                if (row, client_id) not in self.row_set and row not in seen:
+                    seen.add(row)
+                    fresh.append((entry, row))
+            if not fresh:
+                return 0
+
+            new_rows = np.array([row for _, row in fresh], dtype=np.int64)
+            new_lists = self._assign_lists(_normalize(self.store.vectors[new_rows]))
+            new_narratives = np.array([self._label_id(entry.get("narrative_label")) for entry, _ in fresh], dtype=np.int32)
+            new_clients = np.full(len(fresh), client_id, dtype=np.int32)
+
+            # Metadaten zuerst, Zeilen zuletzt: len(rows) markiert vollständige Einträge
+            lines = [
+                (json.dumps({k: entry.get(k) for k in ITEM_FIELDS}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                for entry, _ in fresh
+            ]
+            with open(self._path("items.jsonl"), "ab") as f:
+                f.truncate(self.items_end)
+                f.write(b"".join(lines))
+            for line in lines:
+                self.item_offsets.append(self.items_end)
+                self.items_end += len(line)
+
+            self._write_json("meta.json", self.meta)
+            self._append_array("lists.i32", new_lists)
+            self._append_array("narratives.i32", new_narratives)
+            self._append_array("clients.i32", new_clients)
+            self._append_array("rows.i64", new_rows)
+
+            self.rows = np.concatenate([self.rows, new_rows])
+            self.lists = np.concatenate([self.lists, new_lists])
+            self.narratives = np.concatenate([self.narratives, new_narratives])
+            self.clients = np.concatenate([self.clients, new_clients])
+            self.row_set.update((row, client_id) for row in new_rows.tolist())
+
+            trained_on = self.meta["trained_on"]
+            retrain = len(self) >= TRAIN_MIN_ITEMS and (trained_on == 0 or len(self) >= trained_on * RETRAIN_GROWTH)
+            added = len(fresh)
+
+        if retrain:
+            self.train()
+        return added
+
+    def _assign_all(self, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        lists = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), KMEANS_SAMPLE):
+            positions = np.arange(start, min(len(rows), start + KMEANS_SAMPLE))
+            lists[positions] = self._assign_lists(self._vectors(positions, rows), centroids)
+        return lists
+
+    def train(self) -> None:
+        """
+        (Neu-)Training der IVF-Zentroiden und Zuordnung aller Einträge.
+        k-means und Zuordnung laufen auf einem Schnappschuss ohne Lock; unter dem
+        Lock werden nur die inzwischen angehängten Einträge nachgezogen und der
+        neue Zustand eingesetzt. Läuft bereits ein Training, passiert nichts.
+        """
+        with self.lock:
+            if self.training:
+                return
+            self.training = True
+            rows = self.rows.copy()
+
+        try:
+            n = len(rows)
+            k = min(MAX_LISTS, max(1, int(4 * np.sqrt(n))))
+            sample = np.random.default_rng(0).choice(n, size=min(n, KMEANS_SAMPLE), replace=False)
+            centroids = _kmeans(self._vectors(np.sort(sample), rows), k)
+            lists = self._assign_all(rows, centroids)
+
+            with self.lock:
+                if len(self) > n:
+                    lists = np.concatenate([lists, self._assign_all(self.rows[n:], centroids)])
+                self.centroids, self.lists = centroids, lists
+
+                np.save(self._path("centroids.npy"), centroids)
+                tmp_path = self._path("lists.i32.tmp")
+                lists.tofile(tmp_path)
+                os.replace(tmp_path, self._path("lists.i32"))
+                self.meta["trained_on"] = len(lists)
+                self._write_json("meta.json", self.meta)
+        finally:
+            with self.lock:
+                self.training = False
+
+    # ------------------------------------------------------------
+    # Abfragen
+    # ------------------------------------------------------------
+    def search(self, vectors: np.ndarray, client: str, k: int = 20, nprobe: int = NPROBE) -> List[List[tuple]]:
+        """
+        Top-k (Position, Kosinusähnlichkeit) pro Anfrage-Vektor, nur über die
+        Einträge des Clients. Ohne trainierte Zentroiden wird exakt gesucht.
+        """
+        queries = _normalize(np.atleast_2d(vectors))
+        with self.lock:
+            n = len(self)
+            if client not in self.client_ids:
+                return [[] for _ in queries]
+            own = self.clients[:n] == self.client_ids[client]
+            lists, centroids = self.lists[:n], self.centroids
+            results = []
+            for query in queries:
+                if centroids is None or n < TRAIN_MIN_ITEMS:
+                    positions = np.flatnonzero(own)
+                else:
+                    probes = np.argsort(-(centroids @ query))[:nprobe]
+                    positions = np.flatnonzero(own & np.isin(lists, probes))
+                if not len(positions):
+                    results.append([])
+                    continue
+                sims = self._vectors(positions) @ query
+                top = np.argpartition(-sims, min(k, len(sims)) - 1)[:k]
+                top = top[np.argsort(-sims[top])]
+                results.append([(int(positions[i]), float(sims[i])) for i in top])
+            return results
+
+    def items(self, positions: List[int]) -> List[dict]:
+        items = []
+        with open(self._path("items.jsonl"), "rb") as f:
+            for position in positions:
+                f.seek(self.item_offsets[position])
+                items.append(json.loads(f.readline()))
+        return items
+
+    def narrative_centroids(self, client: str) -> tuple[List[str], np.ndarray]:
+        """Mittelwert-Zentroiden (normalisiert) je Narrativ-Label, nur über die Einträge des Clients."""
+        with self.lock:
+            n = len(self)
+            if client not in self.client_ids:
+                return [], np.empty((0, 0), dtype=np.float32)
+            own = self.clients[:n] == self.client_ids[client]
+            labelled = np.flatnonzero(own & (self.narratives[:n] >= 0))
+            if not len(labelled):
+                return [], np.empty((0, 0), dtype=np.float32)
+            label_ids = self.narratives[labelled]
+            used = np.unique(label_ids)
+            sums = np.zeros((len(self.meta["labels"]), self.store.dim), dtype=np.float32)
+            np.add.at(sums, label_ids, self._vectors(labelled))
+            return [self.meta["labels"][i] for i in used], _normalize(sums[used])
+
+
+# ------------------------------------------------------------
+# Modul-API
+# ------------------------------------------------------------
+def get_topic_index(topic: str) -> TopicIndex:
+    with _indexes_lock:
+        if topic not in _indexes:
+            _indexes[topic] = TopicIndex(topic)
+        return _indexes[topic]
+
+
+def index_entries(entries: List[dict], topic: str, client: str) -> int:
+    """
+    Nimmt analysierte Einträge des Clients in den Index des Topics auf
+    (z. B. als BackgroundTask nach /analyze). Gibt die Anzahl neuer Einträge zurück.
+    """
+    try:
+        return get_topic_index(topic).add(entries, client)
+    except Exception as e:
+        print(f"ANN-Index Fehler ({topic}): {e}")
+        return 0
+
+
+def search_similar(text: str, topic: str, client: str, k: int = 20) -> List[dict]:
+    """
+    Nächste historische Kommentare des Clients zu text inkl. Stance-/Emotion-/
+    Narrativ-Labels. Die Anfrage selbst wird nicht im Embedding Store abgelegt.
+    """
+    index = get_topic_index(topic)
+    if not len(index):
+        return []
+    query = index.store.encode([text])
+    hits = index.search(query, client, k=k)[0]
+    items = index.items([position for position, _ in hits])
+    return [{**item, "similarity": round(similarity, 4)} for item, (_, similarity) in zip(items, hits)]
+
+
+def assign_nearest_narratives(
+    texts: List[str],
+    topic: str,
+    client: str,
+    min_similarity: float = NARRATIVE_MIN_SIMILARITY
+) -> Optional[List[Optional[tuple]]]:
+    """
+    Bulk-Zuordnung neuer Quotes zum nächsten bestehenden Narrativ-Zentroiden des Clients.
+    Gibt pro Text (label, similarity) oder None (zu weit entfernt) zurück;
+    None insgesamt, wenn für Topic & Client noch keine Narrative existieren.
+    """
+    labels, centroids = get_topic_index(topic).narrative_centroids(client)
+    if not labels:
+        return None
+    sims = _normalize(get_embedding_store().get(texts)) @ centroids.T
+    best = np.argmax(sims, axis=1)
+    return [
+        (labels[b], float(sims[i, b])) if sims[i, b] >= min_similarity else None
+        for i, b in enumerate(best)
+    ]
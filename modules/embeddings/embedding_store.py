@@ -0,0 +1,218 @@
+"""
+Embedding Store
+---------------
+Gemeinsamer Vorrat an Satz-Embeddings für alle Module (narrative_clusters,
+Ähnlichkeitssuche, ...):
+- jedes distinkte Textstück wird genau einmal (gebatcht) eingebettet
+- Vektoren liegen als float16 in einem memory-mapped Array auf der Platte
+- Schlüssel ist ein Hash des Textes → Zeile im Array (keys.txt, append-only)
+- Lesen über get_embedding_store().vectors ist zero-copy (memmap-View)
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import List
+
+import numpy as np
+
+try:
+    import fcntl  # Prozessübergreifendes Schreib-Lock (POSIX)
+except ImportError:
+    fcntl = None
+
+EMBEDDING_DIR = os.getenv("HTIF_EMBEDDING_DIR", "output/embeddings")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = 64
+
+# Startkapazität (Zeilen); das Array wächst bei Bedarf auf das Doppelte
+INITIAL_CAPACITY = 4096
+
+_models: dict = {}
+_stores: dict = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL):
+    """Lädt das SentenceTransformer-Modell einmal pro Prozess."""
+    with _registry_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name)
+        return _models[model_name]
+
+
+def text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistenter Embedding-Vorrat für ein Modell.
+    Vektoren werden zuerst geschrieben und geflusht, erst danach werden die
+    Schlüssel angehängt – ein abgebrochener Lauf hinterlässt also nie Schlüssel
+    ohne Vektor.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, directory: str = EMBEDDING_DIR):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, model_name.replace("/", "__"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        self.meta_path = os.path.join(self.directory, "dim.txt")
+        self._lock = threading.RLock()
+        self._rows: dict[str, int] = {}
+        self._keys_offset = 0
+        self._count = 0
+        self._memmap = None
+        self.dim = None
+        self.hits = 0     # Texte, die bereits eingebettet waren (für /metrics)
+        self.misses = 0
+        self._sync_keys()
+
+    # ------------------------------------------------------------
+    # Interne Helfer
+    # ------------------------------------------------------------
+    def __len__(self) -> int:
+        return self._count
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _sync_keys(self) -> None:
+        """Liest Schlüssel nach, die (auch von anderen Prozessen) angehängt wurden."""
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = int(f.read().strip())
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode("utf-8").splitlines():
+            self._rows.setdefault(line, self._count)
+            self._count += 1
+        self._keys_offset += len(complete)
+
+    def _capacity(self) -> int:
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * 2)
+
+    def _open(self, min_rows: int = 0) -> None:
+        """Öffnet (bzw. vergrößert) das memmap, sodass mind. min_rows Zeilen passen."""
+        capacity = self._capacity()
+        if min_rows > capacity:
+            new_capacity = max(INITIAL_CAPACITY, capacity)
+            while new_capacity < min_rows:
+                new_capacity *= 2
+            self._memmap = None
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(new_capacity * self.dim * 2)
+            capacity = new_capacity
+        if capacity and (self._memmap is None or len(self._memmap) != capacity):
+            self._memmap = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+
+    # ------------------------------------------------------------
+    # Öffentliche API
+    # ------------------------------------------------------------
+    @property
+    def vectors(self) -> np.ndarray:
+        """Zero-copy-View auf alle gespeicherten Vektoren (float16, Zeile = rows_for)."""
+        with self._lock:
+            self._sync_keys()
+            self._open()
+            if self._memmap is None:
+                return np.empty((0, self.dim or 0), dtype=np.float16)
+            return self._memmap[:self._count]
+
+    def rows_for(self, texts: List[str]) -> np.ndarray:
+        """
+        Liefert die Zeilennummern der Texte im Store und bettet fehlende
+        Texte vorher gebatcht ein (jeder distinkte Text nur einmal).
+        """
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            missing = {key: text for key, text in zip(keys, texts) if key not in self._rows}
+            if missing:
+                with self._file_lock():
+                    self._sync_keys()
+                    missing = {key: text for key, text in missing.items() if key not in self._rows}
+                    if missing:
+                        self._append(list(missing.keys()), list(missing.values()))
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            return np.fromiter((self._rows[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def _append(self, keys: List[str], texts: List[str]) -> None:
+        model = get_embedding_model(self.model_name)
+        embeddings = model.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False)
+
+        if self.dim is None:
+            self.dim = int(embeddings.shape[1])
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                f.write(str(self.dim))
+
+        start = self._count
+        self._open(min_rows=start + len(keys))
+        self._memmap[start:start + len(keys)] = embeddings.astype(np.float16)
+        self._memmap.flush()
+
+        with open(self.keys_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        self._sync_keys()
+
+    def get(self, texts: List[str], dtype=np.float32) -> np.ndarray:
+        """Embeddings der Texte in Eingabereihenfolge (fehlende werden berechnet)."""
+        rows = self.rows_for(texts)
+        if not len(rows):
+            return np.empty((0, self.dim or 0), dtype=dtype)
+        return self.vectors[rows].astype(dtype, copy=False)
+
+    def encode(self, texts: List[str], dtype=np.float32) -> np.ndarray:
+        """
+        Embeddings ohne Persistenz (z. B. Suchanfragen): vorhandene Texte kommen
+        aus dem Store, fehlende werden nur berechnet und nicht angehängt.
+        """
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            self._sync_keys()
+            rows = [self._rows.get(key) for key in keys]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+            stored = self.vectors[[row for row in rows if row is not None]] if len(missing) < len(keys) else None
+        if missing:
+            model = get_embedding_model(self.model_name)
+            fresh = model.encode([texts[i] for i in missing], batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False)
+        result = np.empty((len(texts), self.dim or (fresh.shape[1] if missing else 0)), dtype=dtype)
+        if stored is not None:
+            result[[i for i, row in enumerate(rows) if row is not None]] = stored
+        if missing:
+            result[missing] = fresh
+        return result
+
+
+def get_embedding_store(model_name: str = EMBEDDING_MODEL) -> EmbeddingStore:
+    """Prozessweiter Store pro Modell."""
+    with _registry_lock:
+        if model_name not in _stores:
+            _stores[model_name] = EmbeddingStore(model_name)
+        return _stores[model_name]
+
+
+def embed_texts(texts: List[str], model_name: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Kurzform: float32-Embeddings für texts aus dem gemeinsamen Store."""
+    return get_embedding_store(model_name).get(texts)
@@ -33,7 +33,7 @@ def detect_framing(text: str) -> List[str]:
 
     return [frame for frame, count in frame_hits.items() if count >= FRAME_THRESHOLD]
 
-def add_framing_to_entries(entries: List[dict]) -> List[dict]:
+def add_framing_to_entries(entries: List[dict], **kwargs) -> List[dict]:
     for entry in entries:
         try:
             entry["framing"] = detect_framing(entry.get("text", ""))
@@ -37,7 +37,7 @@ def detect_enemy_pattern(text: str) -> bool:
         return False
     return any(pattern.search(text) for pattern in ENEMY_REGEX)
 
-def add_identity_features(entries: List[Dict]) -> List[Dict]:
+def add_identity_features(entries: List[Dict], **kwargs) -> List[Dict]:
     for entry in entries:
         try:
             text = entry.get("text", "")
@@ -1,58 +1,140 @@
 # modules/insights/insight_generator.py
-from typing import List
-import statistics
+from typing import List, Dict, Iterable
 
+# === Schwellenwerte für Empfehlungen & Alerts ===
+HEAT_THRESHOLD = 0.7          # Ø strategic_heat darüber → strategisch relevant
+AMBIVALENCE_THRESHOLD = 0.5   # Ø ambivalence_score darüber → Ambivalenz hoch
 
-def add_insights(entries: List[dict], **kwargs) -> List[dict]:
+
+def compute_insight_stats(entries: List[dict]) -> Dict[str, float]:
     """
-    Generiert Executive Summary & Empfehlungen auf Basis der KPIs
-    und hängt sie in den module_report ein.
+    Aggregiert die KPI-Summen, aus denen die Insights entstehen.
+    Die Summen sind addierbar und lassen sich über Chunks hinweg zusammenführen.
     """
-    module_report = kwargs.get("module_report", {})
+    stats = {
+        "count": 0,
+        "heat_sum": 0.0, "heat_count": 0,
+        "amb_sum": 0.0, "amb_count": 0,
+        "pos_sum": 0.0, "neg_sum": 0.0,
+    }
+    for e in entries:
+        stats["count"] += 1
+        if "strategic_heat" in e:
+            stats["heat_sum"] += e.get("strategic_heat", 0) or 0
+            stats["heat_count"] += 1
+        if "ambivalence_score" in e:
+            stats["amb_sum"] += e.get("ambivalence_score", 0) or 0
+            stats["amb_count"] += 1
+        valence = e.get("valence_balance", {}) or {}
+        stats["pos_sum"] += valence.get("pos", 0) or 0
+        stats["neg_sum"] += valence.get("neg", 0) or 0
+    return stats
 
-    if not entries:
-        module_report["insights"] = {
+
+def merge_insight_stats(stats_list: Iterable[Dict[str, float]]) -> Dict[str, float]:
+    """
+    Führt mehrere Ergebnisse von compute_insight_stats zusammen.
+    """
+    merged = compute_insight_stats([])
+    for stats in stats_list:
+        for key in merged:
+            merged[key] += stats.get(key, 0)
+    return merged
+
+
+def insight_averages(stats: Dict[str, float]) -> Dict[str, float]:
+    """
+    Durchschnittswerte (gerundet) aus aggregierten KPI-Summen.
+    """
+    count = stats.get("count") or 0
+    return {
+        "avg_heat": round(stats["heat_sum"] / stats["heat_count"], 2) if stats.get("heat_count") else 0,
+        "avg_amb": round(stats["amb_sum"] / stats["amb_count"], 2) if stats.get("amb_count") else 0,
+        "avg_pos": round(stats["pos_sum"] / count, 2) if count else 0,
+        "avg_neg": round(stats["neg_sum"] / count, 2) if count else 0,
+    }
+
+
+def evaluate_signals(stats: Dict[str, float]) -> List[Dict[str, object]]:
+    """
+    Prüft die Insight-Schwellenwerte und gibt alle aktiven Signale zurück:
+    [{"signal", "value", "threshold", "action"}]. Grundlage für die Empfehlungen
+    in build_insights und für Alerts im Streaming-Modus.
+    """
+    if not stats.get("count"):
+        return []
+
+    averages = insight_averages(stats)
+    signals = []
+    if averages["avg_heat"] > HEAT_THRESHOLD:
+        signals.append({
+            "signal": "high_heat",
+            "value": averages["avg_heat"],
+            "threshold": HEAT_THRESHOLD,
+            "action": "Thema ist strategisch relevant → sofort ins Krisenboard.",
+        })
+    if averages["avg_amb"] > AMBIVALENCE_THRESHOLD:
+        signals.append({
+            "signal": "high_ambivalence",
+            "value": averages["avg_amb"],
+            "threshold": AMBIVALENCE_THRESHOLD,
+            "action": "Ambivalenz hoch → Kommunikationsstrategie differenzieren.",
+        })
+    if averages["avg_neg"] > averages["avg_pos"]:
+        signals.append({
+            "signal": "negativity_dominant",
+            "value": averages["avg_neg"],
+            "threshold": averages["avg_pos"],
+            "action": "Negativität überwiegt → proaktiv positives Narrativ setzen.",
+        })
+    return signals
+
+
+def build_insights(stats: Dict[str, float]) -> Dict[str, list]:
+    """
+    Erzeugt Executive Summary & Empfehlungen aus aggregierten KPI-Summen.
+    """
+    if not stats.get("count"):
+        return {
             "executive_summary": ["Keine Daten vorhanden."],
             "recommended_actions": []
         }
-        print(">>> INSIGHTS: Keine Daten vorhanden.")
-        return entries
-
-    # === KPIs aggregieren ===
-    heats = [e.get("strategic_heat", 0) for e in entries if "strategic_heat" in e]
-    ambs = [e.get("ambivalence_score", 0) for e in entries if "ambivalence_score" in e]
-    pos_shares = [e.get("valence_balance", {}).get("pos", 0) for e in entries]
-    neg_shares = [e.get("valence_balance", {}).get("neg", 0) for e in entries]
 
-    avg_heat = round(statistics.mean(heats), 2) if heats else 0
-    avg_amb = round(statistics.mean(ambs), 2) if ambs else 0
-    avg_pos = round(statistics.mean(pos_shares), 2) if pos_shares else 0
-    avg_neg = round(statistics.mean(neg_shares), 2) if neg_shares else 0
+    averages = insight_averages(stats)
 
     # === Executive Summary ===
     executive_summary = [
-        f"Strategic Heat liegt bei {avg_heat}.",
-        f"Durchschnittliche Ambivalenz: {avg_amb}.",
-        f"Valence Balance: {avg_pos*100:.0f}% positiv, {avg_neg*100:.0f}% negativ."
+        f"Strategic Heat liegt bei {averages['avg_heat']}.",
+        f"Durchschnittliche Ambivalenz: {averages['avg_amb']}.",
+        f"Valence Balance: {averages['avg_pos']*100:.0f}% positiv, {averages['avg_neg']*100:.0f}% negativ."
     ]
 
     # === Empfehlungen ===
-    recommended_actions = []
-    if avg_heat > 0.7:
-        recommended_actions.append("Thema ist strategisch relevant → sofort ins Krisenboard.")
-    if avg_amb > 0.5:
-        recommended_actions.append("Ambivalenz hoch → Kommunikationsstrategie differenzieren.")
-    if avg_neg > avg_pos:
-        recommended_actions.append("Negativität überwiegt → proaktiv positives Narrativ setzen.")
+    recommended_actions = [signal["action"] for signal in evaluate_signals(stats)]
     if not recommended_actions:
         recommended_actions.append("Keine kritischen Signale – Monitoring fortsetzen.")
 
-    # === Insights ins module_report schreiben ===
-    module_report["insights"] = {
+    return {
         "executive_summary": executive_summary,
         "recommended_actions": recommended_actions
     }
 
+
+def add_insights(entries: List[dict], **kwargs) -> List[dict]:
+    """
+    Generiert Executive Summary & Empfehlungen auf Basis der KPIs
+    und hängt sie in den module_report ein.
+    """
+    module_report = kwargs.get("module_report", {})
+
+    if not entries:
+        module_report["insights"] = build_insights(compute_insight_stats([]))
+        print(">>> INSIGHTS: Keine Daten vorhanden.")
+        return entries
+
+    # === Insights ins module_report schreiben ===
+    module_report["insights"] = build_insights(compute_insight_stats(entries))
+
     # 👉 Debug-Ausgabe ins Terminal
     print(">>> INSIGHTS BERECHNET:", module_report["insights"])
 
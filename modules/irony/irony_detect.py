@@ -2,53 +2,64 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from typing import List, Dict
 
+from modules.text_windows import score_texts, window_fields, window_options
+
 # Modell laden
 MODEL_NAME = "cardiffnlp/twitter-roberta-base-irony"
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
 
+
+def _irony_forward(inputs: dict) -> list:
+    probs = torch.softmax(model(**inputs).logits, dim=1)
+    return probs[:, 1].tolist()
+
+
+def score_irony(texts: List[str], threshold: float = 0.5, **options) -> List[Dict[str, object]]:
+    """
+    Batch-Ironieerkennung mit token-basierter Fensterung (modules.text_windows).
+    Lange Texte werden in überlappende Fenster zerlegt; der Score ist das Maximum
+    der Fenster (aggregation='mean' möglich).
+    """
+    options.setdefault("aggregation", "max")
+    results = []
+    for result in score_texts(texts, tokenizer, _irony_forward, model_name=MODEL_NAME, **options):
+        if result is None:
+            results.append({"is_ironic": False, "irony_score": None})
+            continue
+        results.append({
+            "is_ironic": result["score"] > threshold,
+            "irony_score": round(result["score"], 3),
+            **window_fields("irony", result),
+        })
+    return results
+
+
 def detect_irony(text: str, threshold: float = 0.5) -> Dict[str, object]:
     """
     Gibt zurück:
     - is_ironic (bool)
     - irony_score (float)
     """
-    if not isinstance(text, str) or not text.strip():
-        return {"is_ironic": False, "irony_score": None}
-
-    text = text[:1000]  # Sicherheit bei langen Texten
-
-    inputs = tokenizer(
-        text,
-        return_tensors="pt",
-        truncation=True,
-        max_length=512,
-        padding="max_length"
-    )
+    return score_irony([text], threshold=threshold)[0]
 
-    with torch.no_grad():
-        outputs = model(**inputs)
-        logits = outputs.logits
-        probs = torch.softmax(logits, dim=1)
-        irony_score = probs[0][1].item()
 
-    return {
-        "is_ironic": irony_score > threshold,
-        "irony_score": round(irony_score, 3)
-    }
-
-
-def add_irony_labels(data: List[Dict]) -> List[Dict]:
+def add_irony_labels(data: List[Dict], **kwargs) -> List[Dict]:
     """
     Fügt jedem Eintrag is_ironic (bool) & irony_score (float) hinzu.
+    Bei langen Texten zusätzlich irony_window_scores / irony_truncated.
+    Akzeptiert **kwargs (module_report, Fenster-Optionen) aus der Pipeline.
     """
-    for entry in data:
-        try:
-            result = detect_irony(entry.get("text", ""))
-            entry.update(result)
-        except Exception as e:
+    try:
+        results = score_irony([entry.get("text", "") for entry in data], **window_options(kwargs))
+    except Exception as e:
+        for entry in data:
             entry["is_ironic"] = False
             entry["irony_score"] = None
             entry["irony_error"] = str(e)
+        return data
+
+    for entry, result in zip(data, results):
+        entry.update(result)
 
     return data
@@ -160,6 +160,34 @@ def run_mirror(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
             row["mirror_flags"] = ["ok"]
 
     checked = len(entries)
+    shear_index = round(scissor_total / max(checked, 1), 3)
+
+    # --- Daten-Anreicherung für Dashboard ---
+    for e in entries:
+        e["shear_index_local"] = shear_index
+
+    # --- Report aus Rohzählungen ---
+    return _build_report(
+        checked=checked,
+        field_reports=field_reports,
+        anomalies=anomalies,
+        total_values=total_values,
+        total_flag_count=total_flag_count,
+        scissor_total=scissor_total,
+        flagged_rows=len([e for e in entries if e.get("mirror_flags") and e["mirror_flags"] != ["ok"]]),
+    )
+
+
+def _build_report(
+    checked: int,
+    field_reports: Dict[str, Dict[str, Any]],
+    anomalies: List[Dict[str, Any]],
+    total_values: int,
+    total_flag_count: int,
+    scissor_total: int,
+    flagged_rows: int,
+) -> Dict[str, Any]:
+    """Berechnet Indizes, Status & Reflexionen aus den Rohzählungen"""
 
     # --- Aggregierte Indizes ---
     shear_index = round(scissor_total / max(checked, 1), 3)
@@ -198,10 +226,6 @@ def run_mirror(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
     else:
         reflections.append("Minor inconsistencies observed, overall coherence maintained.")
 
-    # --- Daten-Anreicherung für Dashboard ---
-    for e in entries:
-        e["shear_index_local"] = shear_index
-
     # --- Finaler Report ---
     report: Dict[str, Any] = {
         "status": status,
@@ -212,10 +236,80 @@ def run_mirror(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
         "confidence_level": round(confidence_level, 3),
         "confidence_breakdown": confidence_breakdown,
         "shear_index": shear_index,
+        "flag_count": total_flag_count,
+        "scissor_count": scissor_total,
         "timestamp": datetime.utcnow().isoformat(),
     }
 
     # Dashboard-kompatibel: Anzahl markierter Zeilen
-    report["flagged_rows"] = len([e for e in entries if e.get("mirror_flags") and e["mirror_flags"] != ["ok"]])
+    report["flagged_rows"] = flagged_rows
 
     return report
+
+
+# ------------------------------------------------------------
+# Zusammenführen von Teil-Reports (Chunks / Shards)
+# ------------------------------------------------------------
+def _merge_field_stats(parts: List[Dict[str, Any]], fmin: float, fmax: float) -> Dict[str, Any]:
+    """
+    Kombiniert Feldstatistiken mehrerer Teil-Reports.
+    count/mean/std/min/max sind exakt (gepoolte Varianz),
+    p10/p90 werden als count-gewichtetes Mittel der Teil-Perzentile angenähert.
+    """
+    parts = [p for p in parts if p.get("count")]
+    merged: Dict[str, Any] = {"count": 0, "mean": 0.0, "std": 0.0, "min": 0.0, "max": 0.0, "p10": 0.0, "p90": 0.0}
+    if parts:
+        n = sum(p["count"] for p in parts)
+        mean = sum(p["mean"] * p["count"] for p in parts) / n
+        sq_mean = sum((p["std"] ** 2 + p["mean"] ** 2) * p["count"] for p in parts) / n
+        merged = {
+            "count": n,
+            "mean": float(mean),
+            "std": float(max(0.0, sq_mean - mean ** 2) ** 0.5) if n > 1 else 0.0,
+            "min": float(min(p["min"] for p in parts)),
+            "max": float(max(p["max"] for p in parts)),
+            "p10": float(sum(p["p10"] * p["count"] for p in parts) / n),
+            "p90": float(sum(p["p90"] * p["count"] for p in parts) / n),
+        }
+    for key in ("out_of_range", "z_score_gt_3", "above_p90x1_25"):
+        merged[key] = sum(p.get(key, 0) for p in parts)
+    merged["range_min"] = fmin
+    merged["range_max"] = fmax
+    return merged
+
+
+def merge_mirror_reports(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Führt Mirror-Reports einzelner Chunks zu einem Gesamtreport zusammen.
+    Die Entry-Level-Flags bleiben chunk-lokal; Indizes, Status und
+    Reflexionen werden aus den summierten Rohzählungen neu berechnet.
+    """
+    reports = [r for r in reports if r.get("checked")]
+    if not reports:
+        return run_mirror([])
+    if len(reports) == 1:
+        return reports[0]
+
+    field_reports = {
+        field: _merge_field_stats([r.get("fields", {}).get(field, {}) for r in reports], fmin, fmax)
+        for field, (fmin, fmax) in FIELDS_TO_CHECK.items()
+    }
+
+    anomalies: List[Dict[str, Any]] = []
+    offset = 0
+    for r in reports:
+        for a in r.get("anomalies", []):
+            if len(anomalies) >= MAX_ANOMALY_EXAMPLES:
+                break
+            anomalies.append({**a, "index": a.get("index", 0) + offset})
+        offset += r["checked"]
+
+    return _build_report(
+        checked=sum(r["checked"] for r in reports),
+        field_reports=field_reports,
+        anomalies=anomalies,
+        total_values=sum(f["count"] for f in field_reports.values()),
+        total_flag_count=sum(r.get("flag_count", 0) for r in reports),
+        scissor_total=sum(r.get("scissor_count", 0) for r in reports),
+        flagged_rows=sum(r.get("flagged_rows", 0) for r in reports),
+    )
@@ -1,18 +1,23 @@
 from bertopic import BERTopic
-from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import CountVectorizer
 from typing import List, Dict
 
+from modules.embeddings.embedding_store import embed_texts
+from modules.embeddings.ann_index import assign_nearest_narratives
+
 _topic_model = None
 
 
 def get_topic_model(nr_topics=5) -> BERTopic:
+    """
+    BERTopic ohne eigenes Embedding-Modell: die Embeddings kommen
+    vorberechnet aus dem gemeinsamen Embedding Store.
+    """
     global _topic_model
     if _topic_model is None:
-        embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
         vectorizer_model = CountVectorizer(ngram_range=(1, 3), stop_words="english")
         _topic_model = BERTopic(
-            embedding_model=embedding_model,
+            embedding_model=None,
             vectorizer_model=vectorizer_model,
             language="multilingual",
             nr_topics=nr_topics
@@ -20,10 +25,37 @@ def get_topic_model(nr_topics=5) -> BERTopic:
     return _topic_model
 
 
-def add_narrative_clusters(entries: List[Dict], nr_topics: int = 5, **kwargs) -> List[Dict]:
+def _assign_existing(entries: List[Dict], valid_indices: List[int], valid_texts: List[str], topic: str, client: str) -> bool:
+    """
+    Ordnet Quotes den bestehenden Narrativen des Clients im Topic zu (nächster Zentroid
+    im ANN-Index), ohne BERTopic neu zu fitten. Zu weit entfernte Quotes werden Ausreißer (-1).
+    Gibt False zurück, wenn kein Client bekannt ist oder noch keine Narrative vorliegen.
+    """
+    if not client:
+        return False
+    assignments = assign_nearest_narratives(valid_texts, topic, client)
+    if assignments is None:
+        return False
+
+    for data_idx, assignment in zip(valid_indices, assignments):
+        if assignment is None:
+            entries[data_idx]["narrative_topic"] = -1
+            entries[data_idx]["narrative_label"] = "-1_outlier"
+            continue
+        label, similarity = assignment
+        entries[data_idx]["narrative_topic"] = int(label.split("_", 1)[0])
+        entries[data_idx]["narrative_label"] = label
+        entries[data_idx]["narrative_similarity"] = round(similarity, 3)
+    return True
+
+
+def add_narrative_clusters(entries: List[Dict], nr_topics: int = 5, assign_existing: bool = False, **kwargs) -> List[Dict]:
     """
     Fügt den Einträgen narrative Cluster-Labels hinzu.
     Akzeptiert **kwargs, damit module_report und topic übergeben werden können.
+    Mit assign_existing=True werden neue Quotes per Bulk-Zuordnung den bereits
+    indexierten Narrativen des Clients (kwargs["client"]) im Topic zugeordnet
+    (Fallback: BERTopic-Fit).
     """
     module_report = kwargs.get("module_report", {})
 
@@ -36,8 +68,15 @@ def add_narrative_clusters(entries: List[Dict], nr_topics: int = 5, **kwargs) ->
         return entries
 
     try:
+        if assign_existing and _assign_existing(
+            entries, valid_indices, valid_texts, kwargs.get("topic", "klima"), kwargs.get("client")
+        ):
+            module_report["narrative_clusters"] = "Erfolgreich (bestehende Narrative)"
+            return entries
+
         topic_model = get_topic_model(nr_topics=nr_topics)
-        topics, _ = topic_model.fit_transform(valid_texts)
+        embeddings = embed_texts(valid_texts)
+        topics, _ = topic_model.fit_transform(valid_texts, embeddings=embeddings)
 
         topic_info = topic_model.get_topic_info()
         topic_dict = dict(zip(topic_info.Topic, topic_info.Name))
@@ -0,0 +1,418 @@
+"""
+Online Narrative Clusters
+-------------------------
+Inkrementelle Variante von narrative_clusters für laufend eintreffende Kommentare:
+- pro Topic werden Cluster-Zentroiden (Summe normalisierter Embeddings),
+  c-TF-IDF-Termstatistiken und ein Reservoir-Sample der Quotes gehalten
+- jeder neue Batch wird nur gegen die Zentroiden gerechnet (Kosten ~ Batchgröße,
+  nicht ~ Historie); Cluster-IDs bleiben über die Zeit stabil
+- Quotes, die zu weit von allen Zentroiden liegen, sammeln sich in einem
+  Puffer und eröffnen einen neuen Cluster, sobald genug ähnliche vorliegen
+- Merge & Split laufen periodisch im Hintergrund (maintain_clusters)
+- mehrere Prozesse teilen sich den Zustand: jede Änderung läuft unter einem
+  Datei-Lock und beginnt mit dem Nachladen eines neueren Stands
+"""
+
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
+
+from modules.embeddings.embedding_store import embed_texts
+
+try:
+    import fcntl  # Prozessübergreifendes Schreib-Lock (POSIX)
+except ImportError:
+    fcntl = None
+
+ONLINE_CLUSTER_DIR = os.getenv("HTIF_ONLINE_CLUSTER_DIR", "output/narratives")
+
+# Kosinusähnlichkeit, ab der ein Quote einem bestehenden Cluster zugeordnet wird
+ASSIGN_SIMILARITY = 0.55
+
+# Mindestgröße einer Gruppe aus dem Ausreißer-Puffer für einen neuen Cluster
+MIN_NEW_CLUSTER_SIZE = 3
+PENDING_LIMIT = 500
+
+# Merge: Zentroiden ähnlicher als MERGE_SIMILARITY werden zusammengelegt.
+# Split: Cluster mit mittlerer Reservoir-Ähnlichkeit unter SPLIT_COHESION
+# (und mind. SPLIT_MIN_SIZE Einträgen) werden in zwei geteilt.
+MERGE_SIMILARITY = 0.85
+SPLIT_COHESION = 0.45
+SPLIT_MIN_SIZE = 50
+
+RESERVOIR_SIZE = 200
+MAX_TERMS = 300
+LABEL_TERMS = 4
+
+# Alle N Batches wird Merge & Split im Hintergrund angestoßen
+MAINTENANCE_EVERY = 20
+
+GERMAN_STOP_WORDS = {
+    "der", "die", "das", "und", "ist", "nicht", "ein", "eine", "einer", "es", "ich", "du", "wir", "ihr", "sie",
+    "zu", "mit", "auf", "für", "von", "den", "dem", "des", "im", "in", "an", "auch", "so", "wie", "was",
+    "aber", "oder", "noch", "nur", "mal", "schon", "sich", "bei", "aus", "hat", "haben", "sind", "wird",
+    "werden", "dass", "man", "kein", "keine", "mehr", "sehr", "dann", "ja", "nein", "doch", "um", "als",
+}
+
+_analyzer = CountVectorizer(
+    ngram_range=(1, 2), stop_words=list(ENGLISH_STOP_WORDS | GERMAN_STOP_WORDS)
+).build_analyzer()
+
+_states: Dict[str, "OnlineClusterState"] = {}
+_states_lock = threading.Lock()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class OnlineClusterState:
+    """
+    Persistenter Clusterzustand eines Topics (JSON unter ONLINE_CLUSTER_DIR).
+    Jeder Cluster: id, count, sum (Vektorsumme), terms, reservoir, label.
+    Änderungen nur innerhalb von _locked(): Datei-Lock, Nachladen, Speichern –
+    so vergeben zwei Prozesse nie dieselbe Cluster-ID.
+    """
+
+    def __init__(self, topic: str, directory: str = ONLINE_CLUSTER_DIR):
+        self.topic = topic
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, re.sub(r"[^\w.-]", "_", topic) + ".json")
+        self.lock = threading.RLock()
+        self.maintaining = threading.Lock()
+        self._loaded_stat = None
+        self._load()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _load(self) -> None:
+        state = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        self._loaded_stat = self._stat()
+        self.next_id = state.get("next_id", 0)
+        self.batches = state.get("batches", 0)
+        self.pending: List[str] = state.get("pending", [])
+        self.clusters: Dict[int, dict] = {}
+        for cluster in state.get("clusters", []):
+            cluster["sum"] = np.asarray(cluster["sum"], dtype=np.float32)
+            cluster["terms"] = Counter(cluster["terms"])
+            self.clusters[cluster["id"]] = cluster
+
+    @contextmanager
+    def _locked(self):
+        """Exklusiver Zugriff (Threads & Prozesse); lädt vorher einen fremden, neueren Stand."""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "w") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    if self._stat() != self._loaded_stat:
+                        self._load()
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        with self.lock:
+            state = {
+                "topic": self.topic,
+                "next_id": self.next_id,
+                "batches": self.batches,
+                "pending": self.pending,
+                "clusters": [
+                    {**c, "sum": c["sum"].tolist(), "terms": dict(c["terms"])}
+                    for c in self.clusters.values()
+                ],
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._loaded_stat = self._stat()
+
+    # ------------------------------------------------------------
+    # Cluster-Pflege
+    # ------------------------------------------------------------
+    def _centroids(self) -> tuple[List[int], np.ndarray]:
+        ids = list(self.clusters)
+        if not ids:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return ids, _normalize(np.stack([self.clusters[i]["sum"] for i in ids]))
+
+    def _new_cluster(self, texts: List[str], vectors: np.ndarray) -> dict:
+        cluster = {
+            "id": self.next_id,
+            "count": 0,
+            "sum": np.zeros(vectors.shape[1], dtype=np.float32),
+            "terms": Counter(),
+            "reservoir": [],
+            "label": "",
+        }
+        self.next_id += 1
+        self.clusters[cluster["id"]] = cluster
+        self._add_to_cluster(cluster, texts, vectors)
+        cluster["label"] = self._label(cluster)
+        return cluster
+
+    def _add_to_cluster(self, cluster: dict, texts: List[str], vectors: np.ndarray) -> None:
+        cluster["sum"] = cluster["sum"] + vectors.sum(axis=0)
+        for text in texts:
+            cluster["terms"].update(_analyzer(text))
+            cluster["count"] += 1
+            # Reservoir-Sampling (Algorithmus R)
+            if len(cluster["reservoir"]) < RESERVOIR_SIZE:
+                cluster["reservoir"].append(text)
+            else:
+                slot = random.randrange(cluster["count"])
+                if slot < RESERVOIR_SIZE:
+                    cluster["reservoir"][slot] = text
+        if len(cluster["terms"]) > MAX_TERMS * 2:
+            cluster["terms"] = Counter(dict(cluster["terms"].most_common(MAX_TERMS)))
+
+    def _label(self, cluster: dict) -> str:
+        """c-TF-IDF: tf(t, c) / |c| · log(1 + Ø Terme pro Cluster / Gesamthäufigkeit(t))."""
+        totals = Counter()
+        for other in self.clusters.values():
+            totals.update(other["terms"])
+        avg_terms = sum(totals.values()) / max(1, len(self.clusters))
+        size = sum(cluster["terms"].values()) or 1
+        scores = {
+            term: (count / size) * math.log(1 + avg_terms / totals[term])
+            for term, count in cluster["terms"].items()
+        }
+        top = sorted(scores, key=scores.get, reverse=True)[:LABEL_TERMS]
+        name = "_".join(term.replace(" ", "_") for term in top) or "cluster"
+        return f"{cluster['id']}_{name}"[:50]
+
+    # ------------------------------------------------------------
+    # Zuordnung
+    # ------------------------------------------------------------
+    def assign(self, texts: List[str]) -> List[dict]:
+        """
+        Ordnet einen Batch Quotes zu. Gibt pro Quote
+        {"narrative_topic", "narrative_label", "narrative_similarity"} zurück
+        (-1 = Ausreißer, liegt im Puffer bis ein neuer Cluster entsteht).
+        """
+        vectors = _normalize(embed_texts(texts))
+        results = [None] * len(texts)
+
+        with self._locked():
+            ids, centroids = self._centroids()
+            outliers = []
+            if ids:
+                sims = vectors @ centroids.T
+                best = np.argmax(sims, axis=1)
+                by_cluster: Dict[int, List[int]] = {}
+                for i, b in enumerate(best):
+                    if sims[i, b] >= ASSIGN_SIMILARITY:
+                        by_cluster.setdefault(ids[b], []).append(i)
+                        results[i] = (ids[b], float(sims[i, b]))
+                    else:
+                        outliers.append(i)
+                for cluster_id, members in by_cluster.items():
+                    self._add_to_cluster(self.clusters[cluster_id], [texts[i] for i in members], vectors[members])
+            else:
+                outliers = list(range(len(texts)))
+
+            for i, cluster_id in self._open_clusters([texts[i] for i in outliers]).items():
+                results[outliers[i]] = (cluster_id, None)
+
+            self.batches += 1
+            output = []
+            for result in results:
+                if result is None:
+                    output.append({"narrative_topic": -1, "narrative_label": "-1_outlier"})
+                    continue
+                cluster_id, similarity = result
+                entry = {"narrative_topic": cluster_id, "narrative_label": self.clusters[cluster_id]["label"]}
+                if similarity is not None:
+                    entry["narrative_similarity"] = round(similarity, 3)
+                output.append(entry)
+            self.save()
+
+        return output
+
+    def _open_clusters(self, texts: List[str]) -> Dict[int, int]:
+        """
+        Leader-Clustering der Ausreißer zusammen mit dem Puffer früherer Ausreißer.
+        Gruppen ab MIN_NEW_CLUSTER_SIZE werden neue Cluster; gibt
+        {Index in texts: neue Cluster-ID} zurück. Der Rest bleibt im Puffer.
+        """
+        all_texts = self.pending + texts
+        if not texts or not all_texts:
+            return {}
+        # Embeddings kommen aus dem Store – bereits bekannte Texte kosten nur einen Lookup
+        all_vectors = _normalize(embed_texts(all_texts))
+
+        leaders: List[np.ndarray] = []
+        groups: List[List[int]] = []
+        for i, vector in enumerate(all_vectors):
+            if leaders:
+                sims = np.stack(leaders) @ vector
+                b = int(np.argmax(sims))
+                if sims[b] >= ASSIGN_SIMILARITY:
+                    groups[b].append(i)
+                    continue
+            leaders.append(vector)
+            groups.append([i])
+
+        offset = len(self.pending)
+        assigned, pending = {}, []
+        for group in groups:
+            if len(group) < MIN_NEW_CLUSTER_SIZE:
+                pending.extend(all_texts[i] for i in group)
+                continue
+            cluster = self._new_cluster([all_texts[i] for i in group], all_vectors[group])
+            for i in group:
+                if i >= offset:
+                    assigned[i - offset] = cluster["id"]
+        self.pending = pending[-PENDING_LIMIT:]
+        return assigned
+
+    # ------------------------------------------------------------
+    # Merge & Split
+    # ------------------------------------------------------------
+    def maintain(self) -> dict:
+        """
+        Legt sehr ähnliche Cluster zusammen (ältere ID bleibt) und teilt
+        inhomogene Cluster per 2-means auf ihrem Reservoir. Labels werden nur
+        für veränderte Cluster neu berechnet.
+        """
+        merged, split = [], []
+        with self._locked():
+            ids, centroids = self._centroids()
+            if len(ids) > 1:
+                sims = centroids @ centroids.T
+                np.fill_diagonal(sims, -1)
+                absorbed = set()
+                for a in range(len(ids)):
+                    for b in range(a + 1, len(ids)):
+                        if ids[a] in absorbed or ids[b] in absorbed or sims[a, b] < MERGE_SIMILARITY:
+                            continue
+                        keep, drop = self.clusters[ids[a]], self.clusters[ids[b]]
+                        keep["sum"] = keep["sum"] + drop["sum"]
+                        keep["terms"].update(drop["terms"])
+                        pool = keep["reservoir"] + drop["reservoir"]
+                        keep["reservoir"] = random.sample(pool, min(RESERVOIR_SIZE, len(pool)))
+                        keep["count"] += drop["count"]
+                        absorbed.add(ids[b])
+                        merged.append((ids[b], ids[a]))
+                for cluster_id in absorbed:
+                    del self.clusters[cluster_id]
+
+            for cluster in list(self.clusters.values()):
+                if cluster["count"] < SPLIT_MIN_SIZE or len(cluster["reservoir"]) < 2 * MIN_NEW_CLUSTER_SIZE:
+                    continue
+                vectors = _normalize(embed_texts(cluster["reservoir"]))
+                cohesion = float((vectors @ _normalize(cluster["sum"])[0]).mean())
+                if cohesion >= SPLIT_COHESION:
+                    continue
+                new_id = self._split(cluster, vectors)
+                if new_id is not None:
+                    split.append((cluster["id"], new_id))
+
+            changed = {keep for _, keep in merged} | {i for pair in split for i in pair}
+            for cluster_id in changed:
+                if cluster_id in self.clusters:
+                    self.clusters[cluster_id]["label"] = self._label(self.clusters[cluster_id])
+            self.save()
+
+        return {"merged": merged, "split": split}
+
+    def _split(self, cluster: dict, vectors: np.ndarray):
+        # 2-means mit den beiden am weitesten voneinander entfernten Reservoir-Punkten als Start
+        sims = vectors @ vectors.T
+        a, b = np.unravel_index(np.argmin(sims), sims.shape)
+        seeds = vectors[[a, b]]
+        for _ in range(10):
+            halves = np.argmax(vectors @ seeds.T, axis=1)
+            if halves.min() == halves.max():
+                return None
+            seeds = _normalize(np.stack([vectors[halves == h].sum(axis=0) for h in (0, 1)]))
+
+        # Größere Hälfte behält die ID (stabile Labels), kleinere wird neuer Cluster
+        major = int(np.bincount(halves).argmax())
+        minor_idx = np.flatnonzero(halves != major)
+        major_idx = np.flatnonzero(halves == major)
+        share = len(minor_idx) / len(halves)
+        minor_texts = [cluster["reservoir"][i] for i in minor_idx]
+
+        new = self._new_cluster(minor_texts, vectors[minor_idx])
+        new["count"] = int(round(cluster["count"] * share))
+        new["sum"] = vectors[minor_idx].mean(axis=0) * new["count"]
+
+        cluster["count"] -= new["count"]
+        cluster["sum"] = vectors[major_idx].mean(axis=0) * cluster["count"]
+        cluster["reservoir"] = [cluster["reservoir"][i] for i in major_idx]
+        cluster["terms"] = Counter(t for text in cluster["reservoir"] for t in _analyzer(text))
+        return new["id"]
+
+
+# ------------------------------------------------------------
+# Modul-API
+# ------------------------------------------------------------
+def get_cluster_state(topic: str) -> OnlineClusterState:
+    with _states_lock:
+        if topic not in _states:
+            _states[topic] = OnlineClusterState(topic)
+        return _states[topic]
+
+
+def maintain_clusters(topic: str) -> dict:
+    """Merge & Split für ein Topic (nicht parallel zu sich selbst)."""
+    state = get_cluster_state(topic)
+    if not state.maintaining.acquire(blocking=False):
+        return {"merged": [], "split": [], "skipped": True}
+    try:
+        return state.maintain()
+    finally:
+        state.maintaining.release()
+
+
+def add_online_narrative_clusters(entries: List[Dict], topic: str = "klima", **kwargs) -> List[Dict]:
+    """
+    Online-Modus von narrative_clusters: ordnet die Quotes eines Batches
+    bestehenden Clustern zu, eröffnet bei Bedarf neue und stößt periodisch
+    Merge & Split im Hintergrund an.
+    """
+    module_report = kwargs.get("module_report", {})
+
+    texts = [item.get("quote", "") or "" for item in entries]
+    valid_indices = [i for i, t in enumerate(texts) if len(t.strip()) > 10]
+    if not valid_indices:
+        module_report["narrative_clusters_online"] = "Keine gültigen Quotes gefunden"
+        return entries
+
+    try:
+        state = get_cluster_state(topic)
+        results = state.assign([texts[i] for i in valid_indices])
+        for data_idx, result in zip(valid_indices, results):
+            entries[data_idx].update(result)
+
+        if state.batches % MAINTENANCE_EVERY == 0:
+            threading.Thread(target=maintain_clusters, args=(topic,), daemon=True).start()
+
+        module_report["narrative_clusters_online"] = "Erfolgreich"
+    except Exception as e:
+        module_report["narrative_clusters_online"] = f"Fehler: {str(e)}"
+
+    return entries
@@ -1,46 +1,214 @@
-import nltk
+import os
 import re
-from nltk.tokenize import sent_tokenize
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-# Sicherstellen, dass der Punkt-Tokenizer geladen ist
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# Satzsegmentierung: "nltk" (Punkt-Modell) oder "rules" (regelbasiert, DE/EN).
+# Standard bleibt nltk, bis tools/compare_quote_backends.py Parität zeigt.
+QUOTE_BACKEND = os.getenv("HTIF_QUOTE_BACKEND", "nltk")
 
+# Sätze müssen länger sein als diese Zeichenzahl, um als Zitat zu gelten
+MIN_SENTENCE_LENGTH = 10
+FALLBACK_LENGTH = 120
 
-def extract_quote(text: str) -> str:
+# Ab dieser Textanzahl wird die Extraktion auf einen Prozess-Pool verteilt
+PARALLEL_MIN_TEXTS = 50_000
+
+# Abkürzungen (klein, ohne Schlusspunkt), nach denen kein Satz endet
+ABBREVIATIONS = {
+    # Deutsch
+    "z.b", "bzw", "usw", "etc", "ca", "ggf", "evtl", "inkl", "exkl", "u.a", "d.h", "o.ä", "u.ä", "s.o", "s.u",
+    "v.a", "z.t", "i.d.r", "u.u", "vgl", "bspw", "sog", "mind", "max", "min", "nr", "str", "abs", "art",
+    "dr", "prof", "hr", "fr", "dipl", "ing", "mio", "mrd", "tsd", "jh", "jhd", "allg", "insb", "zzgl",
+    # Englisch
+    "e.g", "i.e", "vs", "mr", "mrs", "ms", "jr", "sr", "st", "no", "approx", "dept", "est", "inc", "ltd",
+    "co", "corp", "u.s", "u.k", "a.m", "p.m",
+    # Monate
+    "jan", "feb", "mär", "apr", "jun", "jul", "aug", "sep", "sept", "okt", "oct", "nov", "dez", "dec",
+}
+
+# Wörter, vor denen "3." als Ordinalzahl gilt (z. B. "am 3. Mai")
+MONTHS = {
+    "januar", "februar", "märz", "april", "mai", "juni", "juli", "august", "september", "oktober",
+    "november", "dezember", "jänner",
+}
+
+EMOJI_CHARS = "\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D"
+
+# Kandidaten für Satzgrenzen: Satzzeichen/Emoji-Folge (+ schließende Zeichen) vor Leerraum,
+# oder ein Zeilenumbruch. word ist das Token vor dem Satzzeichen (für Abkürzungen).
+BOUNDARY_PATTERN = re.compile(
+    rf"""
+    (?P<word>\S*?)
+    (?P<term>[.!?…]+[{EMOJI_CHARS}]*|[{EMOJI_CHARS}]+)
+    ["'”’»“)\]]*
+    (?P<space>[ \t\u00a0]+)
+    (?=(?P<next>\S))
+    |
+    (?P<newline>[ \t]*\n\s*)
+    """,
+    re.VERBOSE,
+)
+WORD_PATTERN = re.compile(r"\w")
+FALLBACK_PATTERN = re.compile(r"[^\w\s.,!?ßäöüÄÖÜ-]")
+EMOJI_TAIL = re.compile(rf"[{EMOJI_CHARS}]+$")
+
+
+# ------------------------------------------------------------
+# Satzsegmentierung
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_nltk_tokenizer(language: str = "english"):
     """
-    Extrahiert den prägnantesten Satz aus dem Text.
-    Falls keine sinnvollen Sätze gefunden werden, wird ein bereinigter Ausschnitt zurückgegeben.
+    Lädt den NLTK-Punkt-Tokenizer explizit (einmal pro Prozess, gecacht).
+    Das Modell wird nur hier – beim ersten Gebrauch – bei Bedarf heruntergeladen.
+    """
+    import nltk
+    from nltk.tokenize import PunktTokenizer
+
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+    except LookupError:
+        nltk.download("punkt_tab", quiet=True)
+    return PunktTokenizer(language)
+
+
+def _is_boundary(match: re.Match) -> bool:
+    """
+    Entscheidet, ob ein Kandidat aus BOUNDARY_PATTERN wirklich ein Satzende ist.
+    """
+    if match.group("newline") is not None:
+        return True
+
+    punct = EMOJI_TAIL.sub("", match.group("term"))
+    next_char = match.group("next")
+    next_upper = next_char.isupper()
+
+    # Nur Emoji: Satzende, wenn danach ein neuer Satz (Großbuchstabe) beginnt
+    if not punct:
+        return next_upper
+
+    # Ellipse: wie Punkt nur vor Großbuchstaben trennen
+    if punct in ("...", "…") or punct.startswith(".."):
+        return next_upper
+
+    if punct != ".":
+        return True  # ! ? !! ?! ...
+
+    word = match.group("word").lower().lstrip("([\"'„“‚‘»«")
+    if word in ABBREVIATIONS:
+        return False
+    if len(word) == 1 and word.isalpha():
+        return False  # Initiale ("J. Smith")
+    if word.isdigit():
+        # Ordinalzahl ("am 3. Mai", "zum 2. mal") statt Satzende
+        following = match.string[match.end():match.end() + 12].split(maxsplit=1)
+        return next_upper and not (following and following[0].lower().strip(".,") in MONTHS)
+    return True
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Regelbasierte Satzsegmentierung für deutsche & englische Social-Media-Texte.
+    Trennt an . ! ? (auch gehäuft), Ellipsen & Emoji vor Großbuchstaben und
+    an Zeilenumbrüchen; Abkürzungen, Initialen und Ordinalzahlen werden nicht getrennt.
+    """
+    sentences = []
+    start = 0
+    for match in BOUNDARY_PATTERN.finditer(text):
+        if not _is_boundary(match):
+            continue
+        end = match.start("newline") if match.group("newline") is not None else match.start("space")
+        sentences.append(text[start:end])
+        start = match.end()
+    sentences.append(text[start:])
+    return sentences
+
+
+def _longest_sentence(text: str, split) -> str:
+    """
+    Längster Satz mit mehr als MIN_SENTENCE_LENGTH Zeichen und mind. einem Wortzeichen;
+    sonst ein bereinigter Ausschnitt. Bei Gleichstand gewinnt der erste Satz.
     """
     if not isinstance(text, str) or not text.strip():
         return ""
 
-    # Satzsegmentierung
-    sentences = sent_tokenize(text)
-    sentences = [s.strip() for s in sentences if len(s.strip()) > 10]
-    sentences = [s for s in sentences if re.search(r"\w", s)]  # Filtere reine Emojis o. Sonderzeichen
+    best = ""
+    for sentence in split(text):
+        sentence = sentence.strip()
+        if len(sentence) > max(MIN_SENTENCE_LENGTH, len(best)) and WORD_PATTERN.search(sentence):
+            best = sentence
+
+    if not best:
+        return FALLBACK_PATTERN.sub("", text.strip())[:FALLBACK_LENGTH]
+    return best
+
+
+def _splitter(backend: str):
+    if backend == "nltk":
+        return get_nltk_tokenizer().tokenize
+    if backend == "rules":
+        return split_sentences
+    raise ValueError(f"Unbekanntes Quote-Backend: {backend}")
+
+
+# ------------------------------------------------------------
+# Extraktion
+# ------------------------------------------------------------
+def extract_quote(text: str, backend: str = QUOTE_BACKEND) -> str:
+    """
+    Extrahiert den prägnantesten Satz aus dem Text.
+    Falls keine sinnvollen Sätze gefunden werden, wird ein bereinigter Ausschnitt zurückgegeben.
+    """
+    return _longest_sentence(text, _splitter(backend))
+
 
-    if not sentences:
-        fallback = re.sub(r"[^\w\s.,!?ßäöüÄÖÜ-]", "", text.strip())
-        return fallback[:120]
+def _extract_chunk(args: tuple) -> list[str]:
+    texts, backend = args
+    split = _splitter(backend)
+    return [_longest_sentence(text, split) for text in texts]
 
-    return max(sentences, key=len)
+
+def extract_quotes(texts: list, backend: str = QUOTE_BACKEND, processes: int | None = None) -> list[str]:
+    """
+    Batch-Variante von extract_quote.
+    Große Listen (ab PARALLEL_MIN_TEXTS) werden in Chunks auf einen Prozess-Pool verteilt;
+    processes=1 erzwingt die Verarbeitung im aktuellen Prozess.
+    """
+    texts = list(texts)
+    if processes == 1 or len(texts) < PARALLEL_MIN_TEXTS:
+        return _extract_chunk((texts, backend))
+
+    workers = processes or os.cpu_count() or 1
+    size = -(-len(texts) // workers)
+    chunks = [(texts[i:i + size], backend) for i in range(0, len(texts), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [quote for part in pool.map(_extract_chunk, chunks) for quote in part]
 
 
 def add_quotes_to_entries(entries: list[dict], **kwargs) -> list[dict]:
     """
     Fügt jedem Entry ein 'quote'-Feld hinzu.
     Fehler werden im 'quote_error'-Feld dokumentiert.
-    Akzeptiert zusätzlich **kwargs, damit es in der Pipeline funktioniert.
+    Akzeptiert zusätzlich **kwargs, damit es in der Pipeline funktioniert
+    (optional: backend='nltk'|'rules', processes=...).
     """
     module_report = kwargs.get("module_report", {})
+    backend = kwargs.get("backend", QUOTE_BACKEND)
+
+    texts = [entry.get("text", "") for entry in entries]
+    try:
+        quotes = extract_quotes(texts, backend=backend, processes=kwargs.get("processes"))
+    except Exception:
+        # Batch fehlgeschlagen → einzeln, damit Fehler pro Entry dokumentiert werden
+        quotes = None
 
-    for entry in entries:
+    for index, entry in enumerate(entries):
+        if quotes is not None:
+            entry["quote"] = quotes[index]
+            continue
         try:
-            text = entry.get("text", "")
-            entry["quote"] = extract_quote(text)
+            entry["quote"] = extract_quote(entry.get("text", ""), backend=backend)
         except Exception as e:
             entry["quote"] = ""
             entry["quote_error"] = str(e)
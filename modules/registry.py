@@ -10,6 +10,7 @@ from modules.identity.identity_analysis import add_identity_features
 from modules.toxicity.toxicity_detect import add_toxicity_labels
 from modules.narrative.narrative_roles import add_narrative_roles
 from modules.narrative.narrative_clusters import add_narrative_clusters
+from modules.narrative.online_clusters import add_online_narrative_clusters
 from modules.kpi.kpi_calculate import add_kpis_to_entries
 from modules.quotes.quote_extraction import add_quotes_to_entries
 from modules.insights.insight_generator import add_insights
@@ -36,6 +37,7 @@ ANALYSIS_MODULES = {
     "verbal_aggression_detect": add_toxicity_labels,
     "narrative_roles": add_narrative_roles,
     "narrative_clusters": add_narrative_clusters,
+    "narrative_clusters_online": add_online_narrative_clusters,
     "kpi_calculate": add_kpis_to_entries,
     "quote_extraction": add_quotes_to_entries,
     "insights": add_insights,
@@ -55,4 +57,5 @@ ANALYSIS_MODULES = {
 TOPIC_AWARE_MODULES = {
     "stance_detection",
     "narrative_clusters",
+    "narrative_clusters_online",
 }
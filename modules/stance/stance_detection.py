@@ -1,5 +1,8 @@
 from transformers import pipeline
 from typing import List, Dict
+import time
+
+from modules.text_windows import AGGREGATIONS, MAX_TOKENS, report_inference, split_text_windows, window_fields, window_options
 
 DEFAULT_HYPOTHESES = {
     "klima": ["Der Text unterstützt Klimaschutz.", "Der Text lehnt Klimaschutz ab."],
@@ -7,6 +10,9 @@ DEFAULT_HYPOTHESES = {
     "politik": ["Der Text unterstützt die Regierung.", "Der Text lehnt die Regierung ab."]
 }
 
+# Tokens, die im Fenster für die Hypothese (Text-Paar im NLI-Modell) frei bleiben
+HYPOTHESIS_TOKEN_RESERVE = 32
+
 _stance_pipeline = None
 
 
@@ -20,49 +26,86 @@ def get_stance_pipeline():
     return _stance_pipeline
 
 
-def detect_stance(text: str, topic: str = "klima", threshold: float = 0.6) -> Dict[str, str]:
-    if not isinstance(text, str) or not text.strip():
-        return {"stance": "neutral", "stance_topic": topic}
+def _stance_result(window_scores: List[List[float]], topic: str, threshold: float, truncated: bool, aggregation: str) -> Dict:
+    aggregate = AGGREGATIONS[aggregation]
+    score_for = aggregate([s[0] for s in window_scores])
+    score_against = aggregate([s[1] for s in window_scores])
+
+    if score_for > threshold:
+        stance = "for"
+    elif score_against > threshold:
+        stance = "against"
+    else:
+        stance = "neutral"
 
+    return {
+        "stance": stance,
+        "stance_topic": topic,
+        "stance_score_for": round(score_for, 2),
+        "stance_score_against": round(score_against, 2),
+        **window_fields("stance", {"window_scores": window_scores, "truncated": truncated}, digits=2)
+    }
+
+
+def detect_stances(texts: List[str], topic: str = "klima", threshold: float = 0.6, **options) -> List[Dict]:
+    """
+    Batch-Haltungserkennung. Texte werden token-basiert in Fenster zerlegt
+    (Budget abzüglich Hypothese), alle Fenster laufen in einem Pipeline-Aufruf;
+    die Fenster-Scores werden pro Text gemittelt (aggregation='max' möglich).
+    """
     hypotheses = DEFAULT_HYPOTHESES.get(topic)
+    results = [{"stance": "neutral", "stance_topic": topic} for _ in texts]
     if not hypotheses:
-        return {"stance": "neutral", "stance_topic": topic}
+        return results
+
+    aggregation = options.pop("aggregation", "mean")
+    batch_size = options.pop("batch_size", None)
+    max_tokens = options.pop("max_tokens", MAX_TOKENS) - HYPOTHESIS_TOKEN_RESERVE
 
     try:
         classifier = get_stance_pipeline()
-        result = classifier(text[:500], candidate_labels=hypotheses, multi_label=False)
-        scores = dict(zip(result["labels"], result["scores"]))
-
-        if scores[hypotheses[0]] > threshold:
-            stance = "for"
-        elif scores[hypotheses[1]] > threshold:
-            stance = "against"
-        else:
-            stance = "neutral"
-
-        return {
-            "stance": stance,
-            "stance_topic": topic,
-            "stance_score_for": round(scores[hypotheses[0]], 2),
-            "stance_score_against": round(scores[hypotheses[1]], 2)
-        }
+        pieces, truncated = split_text_windows(classifier.tokenizer, texts, max_tokens=max_tokens, **options)
+        flat = [piece for text_pieces in pieces for piece in text_pieces]
+        if not flat:
+            return results
+
+        call_kwargs = {"batch_size": batch_size} if batch_size else {}
+        started = time.perf_counter()
+        outputs = classifier(flat, candidate_labels=hypotheses, multi_label=False, **call_kwargs)
+        # Ein NLI-Durchlauf pro Fenster & Hypothese; Tokens ohne erneute Tokenisierung unbekannt
+        report_inference(classifier.model.name_or_path, len(flat) * len(hypotheses), None, time.perf_counter() - started)
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+
+        position = 0
+        for index, text_pieces in enumerate(pieces):
+            if not text_pieces:
+                continue
+            window_scores = []
+            for output in outputs[position:position + len(text_pieces)]:
+                scores = dict(zip(output["labels"], output["scores"]))
+                window_scores.append([scores[hypotheses[0]], scores[hypotheses[1]]])
+            position += len(text_pieces)
+            results[index] = _stance_result(window_scores, topic, threshold, truncated[index], aggregation)
+
+        return results
     except Exception as e:
-        return {
-            "stance": "neutral",
-            "stance_topic": topic,
-            "stance_error": str(e)
-        }
+        return [{**result, "stance_error": str(e)} for result in results]
+
+
+def detect_stance(text: str, topic: str = "klima", threshold: float = 0.6) -> Dict[str, str]:
+    return detect_stances([text], topic=topic, threshold=threshold)[0]
 
 
 def add_stance_to_entries(entries: List[Dict], topic: str = "klima", **kwargs) -> List[Dict]:
     """
     Fügt jedem Entry eine Haltungs-Annotation hinzu.
-    Akzeptiert **kwargs, damit module_report aus der Pipeline genutzt werden kann.
+    Akzeptiert **kwargs, damit module_report (und Fenster-Optionen) aus der Pipeline genutzt werden können.
     """
     module_report = kwargs.get("module_report", {})
 
-    for entry in entries:
-        result = detect_stance(entry.get("text", ""), topic=topic)
+    results = detect_stances([entry.get("text", "") for entry in entries], topic=topic, **window_options(kwargs))
+    for entry, result in zip(entries, results):
         entry.update(result)
 
     # Erfolg im Report markieren
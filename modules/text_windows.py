@@ -0,0 +1,233 @@
+"""
+Text Windowing für Modellmodule
+-------------------------------
+Gemeinsame token-basierte Kürzung & Fensterung für irony_detect,
+toxicity_detect und stance_detection:
+- Kürzung nach Token-Budget statt nach Zeichen
+- lange Texte optional in überlappende Fenster (Stride) zerlegen
+- Fenster nach Länge sortiert in Batches mit dynamischem Padding inferieren
+- Fenster-Scores pro Text aggregieren (max / mean), Einzel-Scores bleiben abrufbar
+"""
+
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+# Token-Budget pro Fenster (inkl. Spezial-Tokens)
+MAX_TOKENS = int(os.getenv("HTIF_MAX_TOKENS", "512"))
+
+# Überlappung zwischen aufeinanderfolgenden Fenstern (Tokens)
+WINDOW_STRIDE = int(os.getenv("HTIF_WINDOW_STRIDE", "64"))
+
+# Obergrenze an Fenstern pro Text (begrenzt Rechenzeit bei sehr langen Posts)
+MAX_WINDOWS = int(os.getenv("HTIF_MAX_WINDOWS", "8"))
+
+# False → lange Texte nur auf das erste Fenster kürzen
+LONG_TEXT_WINDOWS = os.getenv("HTIF_LONG_TEXT_WINDOWS", "true").lower() in ("1", "true", "yes")
+
+INFERENCE_BATCH_SIZE = int(os.getenv("HTIF_INFERENCE_BATCH_SIZE", "16"))
+
+AGGREGATIONS = {
+    "max": max,
+    "mean": lambda scores: sum(scores) / len(scores),
+}
+
+# kwargs, die add_*-Funktionen an score_texts / split_text_windows durchreichen
+WINDOW_OPTIONS = ("aggregation", "max_tokens", "stride", "windowed", "max_windows", "batch_size")
+
+# observer(model_name, batch_size, tokens, seconds) wird nach jedem Inferenz-Batch
+# aufgerufen (z. B. von services.metrics registriert)
+INFERENCE_OBSERVERS: List[Callable] = []
+
+
+def report_inference(model_name: Optional[str], batch_size: int, tokens: Optional[int], seconds: float) -> None:
+    for observer in INFERENCE_OBSERVERS:
+        observer(model_name, batch_size, tokens, seconds)
+
+
+def window_options(kwargs: dict) -> dict:
+    """Filtert die Fenster-Optionen aus den Pipeline-kwargs."""
+    return {key: kwargs[key] for key in WINDOW_OPTIONS if key in kwargs}
+
+
+def _budget(tokenizer, max_tokens: int) -> int:
+    model_max = getattr(tokenizer, "model_max_length", None) or max_tokens
+    return min(max_tokens, model_max)
+
+
+def encode_windows(
+    tokenizer,
+    texts: List[str],
+    max_tokens: int = MAX_TOKENS,
+    stride: int = WINDOW_STRIDE,
+    windowed: bool = LONG_TEXT_WINDOWS,
+    max_windows: int = MAX_WINDOWS,
+    return_offsets: bool = False
+) -> tuple[List[Dict], List[int]]:
+    """
+    Tokenisiert alle Texte in einem Aufruf ohne Padding und zerlegt lange Texte
+    in überlappende Fenster (benötigt einen Fast-Tokenizer).
+
+    Gibt (windows, window_counts) zurück:
+    - windows: [{"owner": text_index, "input_ids": [...], "attention_mask": [...], ("offsets")}]
+    - window_counts: Anzahl Fenster, die der volle Text bräuchte (für truncated-Flags)
+    """
+    encoding = tokenizer(
+        list(texts),
+        truncation=True,
+        max_length=_budget(tokenizer, max_tokens),
+        stride=stride,
+        return_overflowing_tokens=True,
+        return_offsets_mapping=return_offsets,
+        padding=False,
+    )
+
+    limit = max_windows if windowed else 1
+    counts = [0] * len(texts)
+    windows = []
+    for i, owner in enumerate(encoding["overflow_to_sample_mapping"]):
+        counts[owner] += 1
+        if counts[owner] > limit:
+            continue
+        window = {
+            "owner": owner,
+            "input_ids": encoding["input_ids"][i],
+            "attention_mask": encoding["attention_mask"][i],
+        }
+        if return_offsets:
+            window["offsets"] = encoding["offset_mapping"][i]
+        windows.append(window)
+    return windows, counts
+
+
+def infer_windows(
+    windows: List[Dict],
+    tokenizer,
+    forward: Callable[[dict], list],
+    batch_size: int = INFERENCE_BATCH_SIZE,
+    device: Optional[torch.device] = None,
+    model_name: Optional[str] = None
+) -> list:
+    """
+    Inferiert alle Fenster in Batches. Die Fenster werden nach Länge sortiert,
+    damit pro Batch nur auf die längste Sequenz gepaddet wird.
+    forward(inputs) liefert einen Score pro Fenster; Ergebnis in Reihenfolge von windows.
+    Jeder Batch wird an die INFERENCE_OBSERVERS gemeldet (model_name als Label).
+    """
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]["input_ids"]))
+    scores = [None] * len(windows)
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        inputs = tokenizer.pad(
+            [{"input_ids": windows[i]["input_ids"], "attention_mask": windows[i]["attention_mask"]} for i in batch],
+            return_tensors="pt",
+        )
+        inputs = {k: v.to(device) for k, v in inputs.items()} if device is not None else dict(inputs)
+        started = time.perf_counter()
+        with torch.no_grad():
+            batch_scores = forward(inputs)
+        report_inference(model_name, len(batch), int(inputs["input_ids"].numel()), time.perf_counter() - started)
+        for i, score in zip(batch, batch_scores):
+            scores[i] = score
+
+    return scores
+
+
+def score_texts(
+    texts: List[str],
+    tokenizer,
+    forward: Callable[[dict], list],
+    aggregation: str = "max",
+    max_tokens: int = MAX_TOKENS,
+    stride: int = WINDOW_STRIDE,
+    windowed: bool = LONG_TEXT_WINDOWS,
+    max_windows: int = MAX_WINDOWS,
+    batch_size: int = INFERENCE_BATCH_SIZE,
+    device: Optional[torch.device] = None,
+    model_name: Optional[str] = None
+) -> List[Optional[Dict]]:
+    """
+    Batch-Scoring mit Fensterung. Pro Text:
+        {"score", "window_scores", "window_count", "truncated"}
+    bzw. None für leere / ungültige Texte.
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unbekannte Aggregation: {aggregation}")
+
+    results: List[Optional[Dict]] = [None] * len(texts)
+    valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    if not valid:
+        return results
+
+    windows, counts = encode_windows(
+        tokenizer, [texts[i] for i in valid],
+        max_tokens=max_tokens, stride=stride, windowed=windowed, max_windows=max_windows
+    )
+    scores = infer_windows(windows, tokenizer, forward, batch_size=batch_size, device=device, model_name=model_name)
+
+    per_text = [[] for _ in valid]
+    for window, score in zip(windows, scores):
+        per_text[window["owner"]].append(score)
+
+    for pos, index in enumerate(valid):
+        window_scores = per_text[pos]
+        results[index] = {
+            "score": AGGREGATIONS[aggregation](window_scores),
+            "window_scores": window_scores,
+            "window_count": counts[pos],
+            "truncated": counts[pos] > len(window_scores),
+        }
+    return results
+
+
+def split_text_windows(
+    tokenizer,
+    texts: List[str],
+    max_tokens: int = MAX_TOKENS,
+    stride: int = WINDOW_STRIDE,
+    windowed: bool = LONG_TEXT_WINDOWS,
+    max_windows: int = MAX_WINDOWS
+) -> tuple[List[List[str]], List[bool]]:
+    """
+    Zerlegt Texte token-genau in Text-Fenster (für Pipelines wie Zero-Shot,
+    die selbst tokenisieren). Gibt (Fenster-Texte pro Text, truncated-Flags) zurück.
+    """
+    pieces: List[List[str]] = [[] for _ in texts]
+    truncated = [False] * len(texts)
+    valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text.strip()]
+    if not valid:
+        return pieces, truncated
+
+    windows, counts = encode_windows(
+        tokenizer, [texts[i] for i in valid],
+        max_tokens=max_tokens, stride=stride, windowed=windowed, max_windows=max_windows,
+        return_offsets=True
+    )
+    for window in windows:
+        index = valid[window["owner"]]
+        spans = [(s, e) for s, e in window["offsets"] if e > s]
+        if spans:
+            pieces[index].append(texts[index][spans[0][0]:spans[-1][1]])
+
+    for pos, index in enumerate(valid):
+        truncated[index] = counts[pos] > len(pieces[index])
+    return pieces, truncated
+
+
+def window_fields(prefix: str, result: Dict, digits: int = 3) -> Dict:
+    """
+    Zusätzliche Entry-Felder für lange Texte: Einzel-Scores der Fenster
+    (nur bei mehr als einem Fenster) und ein Flag, falls Text abgeschnitten wurde.
+    """
+    fields = {}
+    if len(result["window_scores"]) > 1:
+        fields[f"{prefix}_window_scores"] = [
+            [round(s, digits) for s in score] if isinstance(score, (list, tuple)) else round(score, digits)
+            for score in result["window_scores"]
+        ]
+    if result["truncated"]:
+        fields[f"{prefix}_truncated"] = True
+    return fields
@@ -2,6 +2,8 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from typing import List, Dict
 
+from modules.text_windows import score_texts, window_fields, window_options
+
 MODEL_NAME = "unitary/toxic-bert"
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -16,25 +18,32 @@ def get_toxicity_model():
         _model.to(device)
     return _model, _tokenizer
 
-def detect_toxicity(text: str, threshold: float = 0.5) -> Dict[str, object]:
-    if not isinstance(text, str) or not text.strip():
-        return {"toxicity_score": None, "is_toxic": False}
-
-    text = text[:512]
+def score_toxicity(texts: List[str], threshold: float = 0.5, **options) -> List[Dict[str, object]]:
+    """
+    Batch-Toxizität mit token-basierter Fensterung (modules.text_windows).
+    Der Score eines langen Textes ist standardmäßig das Maximum seiner Fenster.
+    """
+    model, tokenizer = get_toxicity_model()
+
+    def forward(inputs):
+        return torch.sigmoid(model(**inputs).logits)[:, 0].tolist()
+
+    options.setdefault("aggregation", "max")
+    results = []
+    for result in score_texts(texts, tokenizer, forward, device=device, model_name=MODEL_NAME, **options):
+        if result is None:
+            results.append({"toxicity_score": None, "is_toxic": False})
+            continue
+        results.append({
+            "toxicity_score": round(result["score"], 3),
+            "is_toxic": result["score"] > threshold,
+            **window_fields("toxicity", result),
+        })
+    return results
 
+def detect_toxicity(text: str, threshold: float = 0.5) -> Dict[str, object]:
     try:
-        model, tokenizer = get_toxicity_model()
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding="max_length", max_length=512)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-
-        with torch.no_grad():
-            outputs = model(**inputs)
-            score = torch.sigmoid(outputs.logits)[0][0].item()
-
-        return {
-            "toxicity_score": round(score, 3),
-            "is_toxic": score > threshold
-        }
+        return score_toxicity([text], threshold=threshold)[0]
 
     except Exception as e:
         return {
@@ -43,8 +52,12 @@ def detect_toxicity(text: str, threshold: float = 0.5) -> Dict[str, object]:
             "toxicity_error": str(e)
         }
 
-def add_toxicity_labels(data: List[Dict]) -> List[Dict]:
-    for entry in data:
-        result = detect_toxicity(entry.get("text", ""))
+def add_toxicity_labels(data: List[Dict], **kwargs) -> List[Dict]:
+    try:
+        results = score_toxicity([entry.get("text", "") for entry in data], **window_options(kwargs))
+    except Exception as e:
+        results = [{"toxicity_score": None, "is_toxic": False, "toxicity_error": str(e)} for _ in data]
+
+    for entry, result in zip(data, results):
         entry.update(result)
     return data
@@ -1,6 +1,30 @@
 import re
 from html import unescape
 
+import pandas as pd
+
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def clean_texts(texts: list) -> list:
+    """
+    Batch-Bereinigung: HTML-Entities auflösen, Tags entfernen, trimmen.
+    unescape läuft nur auf Texten mit '&', Regex & strip sind vektorisiert.
+    Nicht-String-Werte bleiben unverändert.
+    """
+    series = pd.Series(texts, dtype=object)
+    is_str = series.map(lambda t: isinstance(t, str))
+    if not is_str.any():
+        return list(texts)
+
+    strings = series[is_str].astype(str)
+    has_entity = strings.str.contains("&", regex=False)
+    if has_entity.any():
+        strings[has_entity] = strings[has_entity].map(unescape)
+    series[is_str] = strings.str.replace(HTML_TAG_PATTERN, "", regex=True).str.strip()
+    return series.tolist()
+
+
 def preprocess_entries(entries: list[dict], mode: str = "auto") -> tuple[list[dict], dict]:
     """
     Bereinigt oder markiert Texte je nach Modus ('auto' oder 'manual').
@@ -10,16 +34,9 @@ def preprocess_entries(entries: list[dict], mode: str = "auto") -> tuple[list[di
     removed_count = 0
     warnings = 0
 
-    for entry in entries:
-        text = entry.get("text", "")
-        original = text
-
-        if isinstance(text, str):
-            # HTML-Tags entfernen & unescape
-            text = unescape(text)
-            text = re.sub(r"<[^>]+>", "", text)
-            text = text.strip()
+    texts = clean_texts([entry.get("text", "") for entry in entries])
 
+    for entry, text in zip(entries, texts):
         # Entscheidung nach Modus
         if not text:
             if mode == "auto":
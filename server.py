@@ -1,5 +1,7 @@
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
 
 # Lokales Projektverzeichnis zum Importpfad hinzufügen (für 'modules', 'services' etc.)
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
@@ -7,12 +9,24 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
+from services.export_store import run_export_janitor
+from services.metrics import metrics_middleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hintergrund-Task: TTL- & Quota-Eviction für output/exports
+    janitor = asyncio.create_task(run_export_janitor())
+    yield
+    janitor.cancel()
+
 
 app = FastAPI(
     title="HTIF API",
     version="1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS freigeben (für Streamlit oder externe Frontends)
@@ -23,5 +37,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latenz & Status pro Route für /metrics
+app.middleware("http")(metrics_middleware)
+
 # API-Endpunkte aus api/routes.py einbinden
 app.include_router(router)
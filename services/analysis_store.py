@@ -0,0 +1,333 @@
+# services/analysis_store.py
+# ============================================================
+# HTIF Analysis Store
+# ------------------------------------------------------------
+# Eingebetteter, persistenter Speicher für alle Pipeline-Läufe (SQLite):
+# - runs:    ein Datensatz pro Lauf (Client, Topic, module_report, mirror_report)
+# - entries: annotierte Einträge, indexiert nach Topic, Quelle, Zeitstempel, Client
+# - Kennzahlen & Labels liegen als eigene Spalten vor, alle übrigen Felder
+#   im JSON-Feld data (abfragbar über json_extract)
+# - Filter, Aggregation & Pagination laufen als SQL im Store,
+#   statt JSON-Dateien in pandas zu laden
+# ============================================================
+
+import json
+import numbers
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+ANALYSIS_DB_PATH = os.getenv("HTIF_ANALYSIS_DB", "output/htif_analysis.db")
+
+# Als Spalten abgelegte Kennzahlen (REAL) und Labels (TEXT)
+NUMERIC_FIELDS = (
+    "strategic_heat", "ambivalence_score", "resonance_score", "conflict_index", "toxicity_score",
+    "irony_score", "quote_density", "emotion_dominance", "valence_shift", "shear_index_local",
+)
+LABEL_FIELDS = ("stance", "emotion", "narrative_label", "narrative_role", "user_type")
+
+# Zeit-Buckets über das normalisierte ISO-Format (YYYY-MM-DDTHH:MM:SS)
+TIME_BUCKETS = {
+    "minute": "substr(timestamp, 1, 16)",
+    "hour": "substr(timestamp, 1, 13)",
+    "day": "substr(timestamp, 1, 10)",
+    "month": "substr(timestamp, 1, 7)",
+}
+GROUP_COLUMNS = ("topic", "source", "client", "run_id") + LABEL_FIELDS
+AGGREGATES = {"count": "COUNT", "avg": "AVG", "sum": "SUM", "min": "MIN", "max": "MAX"}
+
+MAX_PAGE_SIZE = 1000
+FIELD_NAME = re.compile(r"^\w+$")
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    client TEXT,
+    topic TEXT,
+    industry TEXT,
+    created_at TEXT,
+    finished_at TEXT,
+    status TEXT,
+    record_count INTEGER DEFAULT 0,
+    module_report TEXT,
+    mirror_report TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_client_topic ON runs (client, topic, created_at);
+
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    client TEXT,
+    topic TEXT,
+    source TEXT,
+    timestamp TEXT,
+    text TEXT,
+    {", ".join(f"{f} REAL" for f in NUMERIC_FIELDS)},
+    {", ".join(f"{f} TEXT" for f in LABEL_FIELDS)},
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_topic_ts ON entries (topic, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_client_topic_ts ON entries (client, topic, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_source_ts ON entries (source, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_run ON entries (run_id);
+"""
+
+
+# ------------------------------------------------------------
+# Verbindung
+# ------------------------------------------------------------
+@contextmanager
+def _connect(db_path: str = None):
+    db_path = db_path or ANALYSIS_DB_PATH
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                conn = sqlite3.connect(db_path)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                # Ältere Datenbanken: Spalte status nachrüsten
+                if "status" not in {row[1] for row in conn.execute("PRAGMA table_info(runs)")}:
+                    conn.execute("ALTER TABLE runs ADD COLUMN status TEXT")
+                conn.commit()
+                conn.close()
+                _initialized.add(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def normalize_timestamp(value) -> str | None:
+    """
+    ISO-String oder Epoch (s/ms) → 'YYYY-MM-DDTHH:MM:SS' (UTC bei Epoch).
+    Leere Werte, NaN/NaT (leere CSV-Zellen) und ungültige Epochs → None.
+    """
+    if value is None or value == "" or value != value:  # NaN & NaT sind ungleich sich selbst
+        return None
+    if (isinstance(value, numbers.Real) and not isinstance(value, bool)) or (isinstance(value, str) and value.isdigit()):
+        seconds = float(value)
+        if seconds > 1e11:
+            seconds /= 1000
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        except (OverflowError, OSError, ValueError):
+            return None
+    text = str(value).strip().replace(" ", "T", 1)
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed.strftime("%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return text[:19]
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry_row(run_id: str, client: str, topic: str, entry: dict) -> tuple:
+    return (
+        run_id,
+        client,
+        entry.get("topic_tag") or topic,
+        entry.get("source"),
+        normalize_timestamp(entry.get("timestamp")),
+        entry.get("text"),
+        *(_number(entry.get(f)) for f in NUMERIC_FIELDS),
+        *(None if entry.get(f) is None else str(entry.get(f)) for f in LABEL_FIELDS),
+        json.dumps(entry, ensure_ascii=False, default=str),
+    )
+
+
+# ------------------------------------------------------------
+# Schreiben
+# ------------------------------------------------------------
+def start_run(client: str, topic: str, industry: str = None, run_id: str = None) -> str:
+    """Legt einen Lauf an (für gestreamte Läufe, die chunkweise anhängen); status 'running'."""
+    run_id = run_id or f"run_{uuid.uuid4().hex}"
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, client, topic, industry, created_at, status) VALUES (?, ?, ?, ?, ?, 'running')",
+            (run_id, client, topic, industry or topic, datetime.utcnow().isoformat()),
+        )
+    return run_id
+
+
+def append_entries(run_id: str, client: str, topic: str, entries: list[dict]) -> int:
+    columns = ["run_id", "client", "topic", "source", "timestamp", "text", *NUMERIC_FIELDS, *LABEL_FIELDS, "data"]
+    with _connect() as conn:
+        conn.executemany(
+            f"INSERT INTO entries ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [_entry_row(run_id, client, topic, entry) for entry in entries],
+        )
+        conn.execute("UPDATE runs SET record_count = record_count + ? WHERE run_id = ?", (len(entries), run_id))
+    return len(entries)
+
+
+def finish_run(run_id: str, module_report: dict, mirror_report: dict) -> None:
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE runs SET module_report = ?, mirror_report = ?, finished_at = ?, status = 'finished' WHERE run_id = ?",
+            (
+                json.dumps(module_report, ensure_ascii=False, default=str),
+                json.dumps(mirror_report, ensure_ascii=False, default=str),
+                datetime.utcnow().isoformat(),
+                run_id,
+            ),
+        )
+
+
+def abort_run(run_id: str, reason: str) -> None:
+    """Schließt einen nicht vollendeten Lauf (Abbruch, Fehler); bereits angehängte Einträge bleiben."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE runs SET module_report = ?, finished_at = ?, status = 'aborted' WHERE run_id = ? AND finished_at IS NULL",
+            (json.dumps({"aborted": reason}, ensure_ascii=False), datetime.utcnow().isoformat(), run_id),
+        )
+
+
+def record_run(
+    entries: list[dict],
+    module_report: dict,
+    mirror_report: dict,
+    topic: str,
+    client: str,
+    industry: str = None,
+    run_id: str = None
+) -> str:
+    """
+    Speichert einen vollständigen Pipeline-Lauf in einem Schritt
+    (z. B. als BackgroundTask nach /analyze). Gibt die run_id zurück.
+    """
+    run_id = start_run(client, topic, industry=industry, run_id=run_id)
+    append_entries(run_id, client, topic, entries)
+    finish_run(run_id, module_report, mirror_report)
+    return run_id
+
+
+# ------------------------------------------------------------
+# Lesen
+# ------------------------------------------------------------
+def _field_sql(field: str) -> str:
+    """Spalte oder JSON-Feld (json_extract) – nur \\w-Namen erlaubt."""
+    if field in NUMERIC_FIELDS or field in LABEL_FIELDS or field in ("topic", "source", "client", "run_id", "timestamp"):
+        return field
+    if not FIELD_NAME.match(field or ""):
+        raise ValueError(f"Ungültiges Feld: {field}")
+    return f"json_extract(data, '$.{field}')"
+
+
+def _where(filters: dict) -> tuple[str, list]:
+    clauses, params = [], []
+    for column in ("client", "topic", "source", "run_id", *LABEL_FIELDS):
+        value = filters.get(column)
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if filters.get("since"):
+        clauses.append("timestamp >= ?")
+        params.append(normalize_timestamp(filters["since"]))
+    if filters.get("until"):
+        clauses.append("timestamp < ?")
+        params.append(normalize_timestamp(filters["until"]))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_entries(limit: int = 100, after_id: int = 0, fields: list[str] = None, **filters) -> dict:
+    """
+    Gefilterte, paginierte Einträge (Keyset-Pagination über id).
+    Gibt {"items", "next_after_id"} zurück; next_after_id ist None auf der letzten Seite.
+    fields schränkt die Rückgabe auf Spalten / JSON-Felder ein.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    where, params = _where(filters)
+    where = f"{where} AND id > ?" if where else "WHERE id > ?"
+    params.append(int(after_id))
+
+    select = "id, data" if not fields else "id, " + ", ".join(f"{_field_sql(f)} AS \"{f}\"" for f in fields)
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT {select} FROM entries {where} ORDER BY id LIMIT ?", (*params, limit + 1)).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if fields:
+        items = [{key: row[key] for key in row.keys()} for row in rows]
+    else:
+        items = [{"id": row["id"], **json.loads(row["data"])} for row in rows]
+    return {"items": items, "next_after_id": rows[-1]["id"] if has_more else None}
+
+
+def aggregate(
+    metric: str = None,
+    agg: str = "avg",
+    group_by: str | list[str] = "day",
+    limit: int = 1000,
+    **filters
+) -> list[dict]:
+    """
+    Aggregation im Store, z. B. Ø strategic_heat pro Tag für Topic klima:
+        aggregate("strategic_heat", "avg", "day", topic="klima")
+    group_by: minute/hour/day/month, topic, source, client, run_id, Labels
+    (stance, emotion, ...) oder eine Liste davon.
+    """
+    if agg not in AGGREGATES:
+        raise ValueError(f"Unbekannte Aggregation: {agg}")
+    groups = [group_by] if isinstance(group_by, str) else list(group_by or [])
+
+    group_sql = []
+    for group in groups:
+        if group in TIME_BUCKETS:
+            group_sql.append((group, TIME_BUCKETS[group]))
+        elif group in GROUP_COLUMNS:
+            group_sql.append((group, group))
+        else:
+            raise ValueError(f"Ungültige Gruppierung: {group}")
+
+    value_sql = "*" if agg == "count" and not metric else _field_sql(metric)
+    where, params = _where(filters)
+    select = ", ".join([f"{sql} AS \"{name}\"" for name, sql in group_sql] + [f"{AGGREGATES[agg]}({value_sql}) AS value", "COUNT(*) AS n"])
+    group_clause = f"GROUP BY {', '.join(sql for _, sql in group_sql)} ORDER BY {', '.join(sql for _, sql in group_sql)}" if group_sql else ""
+
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT {select} FROM entries {where} {group_clause} LIMIT ?", (*params, int(limit))).fetchall()
+    return [dict(row) for row in rows]
+
+
+def list_runs(client: str = None, topic: str = None, limit: int = 50, offset: int = 0) -> list[dict]:
+    clauses, params = [], []
+    if client:
+        clauses.append("client = ?")
+        params.append(client)
+    if topic:
+        clauses.append("topic = ?")
+        params.append(topic)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT * FROM runs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (*params, max(1, min(int(limit), MAX_PAGE_SIZE)), max(0, int(offset))),
+        ).fetchall()
+
+    runs = []
+    for row in rows:
+        run = dict(row)
+        for key in ("module_report", "mirror_report"):
+            run[key] = json.loads(run[key]) if run[key] else None
+        runs.append(run)
+    return runs
@@ -1,95 +1,203 @@
 # services/analyzer.py
+import asyncio
+from typing import AsyncIterator, Callable, Iterator
 from services.domain_config import get_modules_for_industry
 from modules.registry import ANALYSIS_MODULES, TOPIC_AWARE_MODULES
-from modules.mirror.mirror import run_mirror
+from services.cost_model import ModuleTimer
+from services.profiler import module_marker
+from modules.mirror.mirror import run_mirror, merge_mirror_reports
+from modules.insights.insight_generator import compute_insight_stats, merge_insight_stats, build_insights
+from preprocess_entries import preprocess_entries
 
 """
 Analyzer Pipeline – orchestriert die komplette HTIF-Analyse.
 ------------------------------------------------------------
 1️⃣ Lädt die für die Branche relevanten Module
+   (optional: Batch-Bereinigung der Texte als erste Stufe)
 2️⃣ Führt alle Module sequentiell aus (inkl. topic-aware logic)
 3️⃣ Integriert abschließend den 🪞 Mirror Layer (Reflexions- & Audit-Schicht)
 4️⃣ Gibt ein Gesamtresultat zurück, das direkt im Dashboard nutzbar ist
 """
 
+# Chunk-Größe für die gestreamte Verarbeitung (iter_analysis_pipeline)
+STREAM_CHUNK_SIZE = 256
+
+# Maximal gepufferte Seiten zwischen Fetcher und Analyse (run_pipeline_from_pages)
+PAGE_BUFFER_SIZE = 8
+
+# progress_callback(fraction, message): fraction in [0, 1], Meldung für Fortschrittsbalken
+ProgressCallback = Callable[[float, str], None]
+
+
+def _run_modules(
+    entries: list[dict],
+    modules: list,
+    topic: str,
+    module_report: dict,
+    on_module: Callable[[int, str], None] = None,
+    module_options: dict = None,
+    profile: str = None
+) -> list[dict]:
+    """
+    Führt die übergebenen Module nacheinander auf den Einträgen aus
+    und dokumentiert den Status jedes Moduls im module_report.
+    on_module(index, name) wird vor jedem Modul aufgerufen (Fortschritt).
+    module_options werden als **kwargs an jedes Modul durchgereicht
+    (z. B. {"windowed": False} beim Downgrade durch die Admission Control);
+    Module in module_options["skip_modules"] werden übersprungen.
+    Laufzeiten werden pro Modul für das Kostenmodell und /metrics
+    aufgezeichnet (profile = Branchenprofil als Metrik-Label).
+    """
+    options = dict(module_options or {})
+    skipped = set(options.pop("skip_modules", None) or ())
+    for index, name in enumerate(modules):
+        if on_module:
+            on_module(index, name)
+
+        if name in skipped:
+            module_report[name] = "Übersprungen (Admission-Downgrade)"
+            continue
+
+        func = ANALYSIS_MODULES.get(name)
+        if not func:
+            module_report[name] = "Modul nicht gefunden"
+            continue
+
+        try:
+            print(f"▶️  Running module: {name}")
+
+            with module_marker(name), ModuleTimer(name, entries, options, profile):
+                # Topic-aware Module
+                if name in TOPIC_AWARE_MODULES:
+                    entries = func(entries, topic=topic, module_report=module_report, **options)
+
+                # Sonderfall: insights liefert mehrere Rückgabewerte
+                elif name == "insights":
+                    result = func(entries, module_report=module_report, **options)
+                    if isinstance(result, tuple):
+                        entries = result[0]
+                        if len(result) > 1 and isinstance(result[1], dict):
+                            module_report.update(result[1])
+                    else:
+                        entries = result
+
+                # Standardmodule
+                else:
+                    entries = func(entries, module_report=module_report, **options)
+
+            if name not in module_report:
+                module_report[name] = "Erfolgreich"
+
+        except Exception as e:
+            module_report[name] = f"⚠Fehler: {str(e)}"
+            print(f"Fehler in Modul '{name}': {e}")
+
+    # === Insights sicherstellen ===
+    if "insights" not in module_report:
+        module_report["insights"] = {}
+
+    return entries
+
+
+def _module_progress(
+    progress_callback: ProgressCallback,
+    modules: list,
+    chunk_index: int = 0,
+    chunk_count: int = 1,
+    chunk_label: str = ""
+) -> Callable[[int, str], None] | None:
+    """Übersetzt on_module(index, name) in progress_callback(fraction, message)."""
+    if not progress_callback:
+        return None
+    module_count = max(1, len(modules))
+
+    def on_module(index: int, name: str) -> None:
+        fraction = (chunk_index + index / module_count) / chunk_count
+        progress_callback(fraction, f"{chunk_label}Modul {index + 1}/{module_count}: {name}")
+
+    return on_module
+
+
+def _run_mirror_safe(entries: list[dict]) -> dict:
+    """
+    Führt den Mirror aus; Fehler werden als Report zurückgegeben statt geworfen.
+    """
+    try:
+        with module_marker("run_mirror"):
+            return run_mirror(entries)
+    except Exception as e:
+        print(f"Mirror Error: {e}")
+        return {
+            "status": "error",
+            "error": str(e),
+            "reflections": ["Mirror-Modul konnte nicht ausgeführt werden."]
+        }
+
+
 def run_analysis_pipeline(
     entries: list[dict],
     industry: str,
     topic: str = "klima",
-    mode: str = "auto"
+    mode: str = "auto",
+    preprocess: bool = False,
+    modules: list = None,
+    progress_callback: ProgressCallback = None,
+    module_options: dict = None
 ) -> dict:
     """
     Führt alle aktiven Analyse-Module für eine Branche aus
     und integriert am Ende automatisch den Mirror-Check.
+    Mit preprocess=True werden die Texte vorab gebatcht bereinigt
+    (preprocess_entries, abhängig von mode 'auto'/'manual').
+    modules überschreibt die Modulliste des Branchenprofils;
+    progress_callback(fraction, message) meldet den Fortschritt pro Modul;
+    module_options werden an alle Module durchgereicht (siehe _run_modules).
 
     Rückgabeformat:
     {
         "data": [...],
         "module_report": {...},
-        "mirror_report": {...}
+        "mirror_report": {...},
+        "preprocessing": {...}   # nur mit preprocess=True
     }
     """
 
+    # === Optionale Vorstufe: Textbereinigung ===
+    preprocessing = None
+    if preprocess and entries:
+        entries, preprocessing = preprocess_entries(entries, mode=mode)
+
     # === Validierung ===
     if not entries:
-        return {
+        result = {
             "data": [],
             "module_report": {"error": "Keine Einträge vorhanden"},
             "mirror_report": {"status": "skipped", "reflections": ["No data to mirror."]}
         }
+        if preprocessing is not None:
+            result["preprocessing"] = preprocessing
+        return result
 
-    modules = get_modules_for_industry(industry)
+    modules = list(modules) if modules is not None else get_modules_for_industry(industry)
     module_report = {}
 
     print(f"\nStarte HTIF-Analysepipeline für '{industry}' – {len(modules)} Module geladen ...\n")
 
     # === HAUPTANALYSE ===
-    for name in modules:
-        func = ANALYSIS_MODULES.get(name)
-        if not func:
-            module_report[name] = "Modul nicht gefunden"
-            continue
-
-        try:
-            print(f"▶️  Running module: {name}")
-
-            # Topic-aware Module
-            if name in TOPIC_AWARE_MODULES:
-                entries = func(entries, topic=topic, module_report=module_report)
-
-            # Sonderfall: insights liefert mehrere Rückgabewerte
-            elif name == "insights":
-                result = func(entries, module_report=module_report)
-                if isinstance(result, tuple):
-                    entries = result[0]
-                    if len(result) > 1 and isinstance(result[1], dict):
-                        module_report.update(result[1])
-                else:
-                    entries = result
-
-            # Standardmodule
-            else:
-                entries = func(entries, module_report=module_report)
-
-            if name not in module_report:
-                module_report[name] = "Erfolgreich"
-
-        except Exception as e:
-            module_report[name] = f"⚠Fehler: {str(e)}"
-            print(f"Fehler in Modul '{name}': {e}")
-
-    # === Insights sicherstellen ===
-    if "insights" not in module_report:
-        module_report["insights"] = {}
+    entries = _run_modules(
+        entries, modules, topic, module_report, _module_progress(progress_callback, modules), module_options, industry
+    )
 
     print("\n>>>Pipeline Module Report:", module_report)
 
     # === MIRROR INTEGRATION ===
     print("\nRunning Mirror self-check ...")
-    try:
-        mirror_report = run_mirror(entries)
+    mirror_report = _run_mirror_safe(entries)
+    if progress_callback:
+        progress_callback(1.0, f"{len(entries)} Einträge analysiert")
 
-        # Spiegel-Metadaten extrahieren
+    # Spiegel-Metadaten extrahieren
+    if mirror_report.get("status") != "error":
         status = mirror_report.get("status", "ok")
         confidence = mirror_report.get("confidence_level", 1.0)
         anomalies = len(mirror_report.get("anomalies", []))
@@ -99,23 +207,203 @@ def run_analysis_pipeline(
         if reflections:
             print(f"→ {reflections[0] if reflections else ''}")
 
-    except Exception as e:
-        mirror_report = {
-            "status": "error",
-            "error": str(e),
-            "reflections": ["Mirror-Modul konnte nicht ausgeführt werden."]
-        }
-        print(f"Mirror Error: {e}")
-
     # === GESAMTERGEBNIS ===
     result = {
         "data": entries,
         "module_report": module_report,
         "mirror_report": mirror_report
     }
+    if preprocessing is not None:
+        result["preprocessing"] = preprocessing
 
     print("\nAnalysepipeline abgeschlossen.")
     print(f"Gesamtresultat: {len(entries)} Einträge analysiert, "
           f"Mirror Confidence {mirror_report.get('confidence_level', 1.0)}\n")
 
     return result
+
+
+# ============================================================================
+# CHUNKED / STREAMING PIPELINE
+# ============================================================================
+# Verarbeitet die Einträge in festen Chunks und gibt jeden Chunk sofort zurück.
+# Insights und Mirror werden aus addierbaren Teilstatistiken zusammengeführt,
+# sodass am Ende keine Gesamtliste im Speicher gehalten werden muss.
+# ----------------------------------------------------------------------------
+
+def _merge_module_reports(target: dict, chunk_report: dict) -> None:
+    """
+    Übernimmt Modulstatus eines Chunks; Fehlermeldungen haben Vorrang vor Erfolg.
+    """
+    for name, status in chunk_report.items():
+        if name == "insights":
+            continue
+        if name not in target or (isinstance(status, str) and "Fehler" in status):
+            target[name] = status
+
+
+class ChunkAggregator:
+    """
+    Sammelt die Ergebnisse einzelner Pipeline-Chunks und baut daraus
+    den abschließenden Summary-Record (module_report, insights, mirror_report).
+    """
+
+    def __init__(self):
+        self.record_count = 0
+        self.chunk_count = 0
+        self.module_report: dict = {}
+        self.insight_stats: list[dict] = []
+        self.mirror_reports: list[dict] = []
+
+    def add(self, entries: list[dict], module_report: dict, mirror_report: dict) -> None:
+        self.add_stats(len(entries), module_report, compute_insight_stats(entries), mirror_report)
+
+    def add_stats(self, record_count: int, module_report: dict, insight_stats: dict, mirror_report: dict) -> None:
+        """Wie add, aber mit bereits berechneter Insight-Statistik (z. B. aus Batch-Shards)."""
+        self.record_count += record_count
+        self.chunk_count += 1
+        _merge_module_reports(self.module_report, module_report)
+        self.insight_stats.append(insight_stats)
+        self.mirror_reports.append(mirror_report)
+
+    def summary(self) -> dict:
+        insights = build_insights(merge_insight_stats(self.insight_stats))
+        module_report = {**self.module_report, "insights": insights}
+        return {
+            "type": "summary",
+            "record_count": self.record_count,
+            "chunk_count": self.chunk_count,
+            "module_report": module_report,
+            "insights": insights,
+            "mirror_report": merge_mirror_reports(self.mirror_reports),
+        }
+
+
+def analyze_chunk(
+    entries: list[dict],
+    modules: list,
+    topic: str,
+    on_module: Callable[[int, str], None] = None,
+    module_options: dict = None,
+    profile: str = None
+) -> tuple[list[dict], dict, dict]:
+    """
+    Führt Module + Mirror auf einem einzelnen Chunk aus.
+    Gibt (entries, module_report, mirror_report) zurück.
+    """
+    module_report = {}
+    entries = _run_modules(entries, modules, topic, module_report, on_module, module_options, profile)
+    return entries, module_report, _run_mirror_safe(entries)
+
+
+def iter_analysis_pipeline(
+    entries: list[dict],
+    industry: str,
+    topic: str = "klima",
+    mode: str = "auto",
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    preprocess: bool = False,
+    modules: list = None,
+    progress_callback: ProgressCallback = None,
+    module_options: dict = None
+) -> Iterator[dict]:
+    """
+    Generator-Variante von run_analysis_pipeline.
+
+    Liefert pro fertigem Chunk einen Record
+        {"type": "chunk", "index": i, "data": [...]}
+    und zum Schluss einen Summary-Record
+        {"type": "summary", "record_count", "module_report", "insights", "mirror_report"}.
+
+    Hinweis: Datensatzweite Module (z. B. narrative_clusters) sehen jeweils nur
+    ihren Chunk; der Mirror wird chunkweise berechnet und anschließend gemergt.
+    modules/progress_callback/module_options wie bei run_analysis_pipeline (Fortschritt pro Chunk & Modul).
+    """
+    modules = list(modules) if modules is not None else get_modules_for_industry(industry)
+    aggregator = ChunkAggregator()
+    chunk_size = max(1, int(chunk_size))
+
+    preprocessing = None
+    if preprocess and entries:
+        entries, preprocessing = preprocess_entries(entries, mode=mode)
+
+    print(f"\nStarte gestreamte HTIF-Analyse für '{industry}' – {len(modules)} Module, Chunk-Größe {chunk_size} ...\n")
+
+    chunk_count = max(1, -(-len(entries) // chunk_size))
+    for index, start in enumerate(range(0, len(entries), chunk_size)):
+        on_module = _module_progress(progress_callback, modules, index, chunk_count, f"Chunk {index + 1}/{chunk_count} – ")
+        chunk, module_report, mirror_report = analyze_chunk(
+            entries[start:start + chunk_size], modules, topic, on_module, module_options, industry
+        )
+        aggregator.add(chunk, module_report, mirror_report)
+        if progress_callback:
+            progress_callback((index + 1) / chunk_count, f"{aggregator.record_count} von {len(entries)} Einträgen analysiert")
+        yield {"type": "chunk", "index": index, "data": chunk}
+
+    summary = aggregator.summary()
+    if preprocessing is not None:
+        summary["preprocessing"] = preprocessing
+    yield summary
+
+
+async def run_pipeline_from_pages(
+    pages: AsyncIterator[list[dict]],
+    industry: str,
+    topic: str = "klima",
+    mode: str = "auto",
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    buffer_size: int = PAGE_BUFFER_SIZE,
+    module_options: dict = None
+) -> AsyncIterator[dict]:
+    """
+    Producer/Consumer-Variante von iter_analysis_pipeline für Seiten-Quellen
+    (z. B. social_api.aiter_comment_pages).
+
+    Ein Producer-Task legt Seiten in eine begrenzte Queue, während der
+    Konsument volle Chunks im Thread-Pool analysiert – Seite N+1 wird also
+    geladen, während Seite N analysiert wird. Ist die Queue voll, wartet
+    der Producer (Back-Pressure). Liefert dieselben Records wie
+    iter_analysis_pipeline (Chunks, danach Summary).
+    """
+    modules = get_modules_for_industry(industry)
+    aggregator = ChunkAggregator()
+    chunk_size = max(1, int(chunk_size))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+    done = object()
+
+    async def produce():
+        try:
+            async for page in pages:
+                await queue.put(page)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    print(f"\nStarte überlappende HTIF-Analyse für '{industry}' – {len(modules)} Module, Chunk-Größe {chunk_size} ...\n")
+
+    producer = asyncio.create_task(produce())
+    buffer: list[dict] = []
+    index = 0
+    try:
+        finished = False
+        while not finished:
+            item = await queue.get()
+            if item is done:
+                finished = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                buffer.extend(e for e in item if e.get("text"))
+
+            while buffer and (len(buffer) >= chunk_size or finished):
+                chunk, buffer = buffer[:chunk_size], buffer[chunk_size:]
+                chunk, module_report, mirror_report = await asyncio.to_thread(
+                    analyze_chunk, chunk, modules, topic, None, module_options, industry
+                )
+                aggregator.add(chunk, module_report, mirror_report)
+                yield {"type": "chunk", "index": index, "data": chunk}
+                index += 1
+    finally:
+        producer.cancel()
+
+    yield aggregator.summary()
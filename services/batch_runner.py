@@ -0,0 +1,352 @@
+# services/batch_runner.py
+# ============================================================
+# HTIF Batch Runner
+# ------------------------------------------------------------
+# Fortsetzbare Massenverarbeitung (Backfills) über einen Prozess-Pool:
+# - Eingaben: CSV / JSON / NDJSON-Dateien oder Globs
+# - plan_shards: zerlegt die Eingaben einmalig in Shard-Dateien fester Größe
+# - process_shard: analysiert einen Shard im Worker (Modelle einmal pro Worker)
+#   und schreibt Ergebnis + addierbare Statistiken atomar auf Platte
+# - Manifest (manifest.json) hält den Fortschritt → ein erneuter Lauf
+#   überspringt fertige Shards
+# - merge_shards: finale Exporte + gemeinsamer Mirror-/Insights-Report
+# ============================================================
+
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from services.analyzer import ChunkAggregator, analyze_chunk
+from services.domain_config import get_modules_for_industry
+from services.profiler import flush_worker_profile, start_worker_profiler
+from modules.insights.insight_generator import compute_insight_stats
+
+BATCH_DIR = "output/batches"
+SHARD_SIZE = int(os.getenv("HTIF_BATCH_SHARD_SIZE", "5000"))
+BATCH_WORKERS = int(os.getenv("HTIF_BATCH_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+MANIFEST_NAME = "manifest.json"
+REPORT_NAME = "report.json"
+RESULT_CSV = "htif_results.csv"
+RESULT_NDJSON = "htif_results.ndjson"
+
+CSV_SUFFIXES = (".csv",)
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+WARMUP_TEXT = "Warmup-Kommentar für die Modellinitialisierung."
+
+
+# ------------------------------------------------------------
+# Hilfsfunktionen
+# ------------------------------------------------------------
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """Löst Dateien & Globs auf (sortiert, ohne Duplikate)."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.isfile(pattern) else [])
+        if not matches:
+            raise FileNotFoundError(f"Keine Eingabedatei gefunden: {pattern}")
+        paths.extend(p for p in matches if p not in paths)
+    return paths
+
+
+def _atomic_write_text(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_ndjson(path: str, entries: list[dict]) -> None:
+    _atomic_write_text(path, "".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in entries))
+
+
+def _read_ndjson(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _iter_input_chunks(path: str, size: int):
+    """Liest eine Eingabedatei in Blöcken von size Einträgen (nur Einträge mit Text)."""
+    lower = path.lower()
+    if lower.endswith(CSV_SUFFIXES):
+        for df in pd.read_csv(path, chunksize=size):
+            entries = [e for e in df.to_dict(orient="records") if isinstance(e.get("text"), str) and e["text"]]
+            if entries:
+                yield entries
+        return
+
+    if lower.endswith(NDJSON_SUFFIXES):
+        block = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, dict) and entry.get("text"):
+                    block.append(entry)
+                    if len(block) >= size:
+                        yield block
+                        block = []
+        if block:
+            yield block
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("data", [])
+    entries = [e for e in data if isinstance(e, dict) and e.get("text")]
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+
+def run_id_for(paths: list[str], profile: str, topic: str, shard_size: int) -> str:
+    """Stabile Run-ID aus Eingabedateien (Pfad, Größe, mtime) und Parametern."""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}|{stat.st_size}|{int(stat.st_mtime)}\n".encode())
+    digest.update(f"{profile}|{topic}|{shard_size}".encode())
+    return f"{profile}_{digest.hexdigest()}"
+
+
+def _shard_path(run_dir: str, shard_id: int, kind: str) -> str:
+    return os.path.join(run_dir, f"shard_{shard_id:05d}.{kind}")
+
+
+# ------------------------------------------------------------
+# Manifest
+# ------------------------------------------------------------
+def load_manifest(run_dir: str) -> dict | None:
+    path = os.path.join(run_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(run_dir: str, manifest: dict) -> None:
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    _atomic_write_text(os.path.join(run_dir, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+def plan_shards(paths: list[str], run_dir: str, profile: str, topic: str, shard_size: int = SHARD_SIZE) -> dict:
+    """
+    Zerlegt die Eingaben in Shard-Dateien (shard_XXXXX.input.ndjson) und legt das
+    Manifest an. Existiert bereits ein vollständig geplantes Manifest, wird es
+    unverändert zurückgegeben (Resume).
+    """
+    manifest = load_manifest(run_dir)
+    if manifest and manifest.get("planned"):
+        return manifest
+
+    os.makedirs(run_dir, exist_ok=True)
+    shards = []
+    for path in paths:
+        for entries in _iter_input_chunks(path, shard_size):
+            shard_id = len(shards)
+            _write_ndjson(_shard_path(run_dir, shard_id, "input.ndjson"), entries)
+            shards.append({"id": shard_id, "source": path, "rows": len(entries), "status": "pending"})
+
+    manifest = {
+        "run_id": os.path.basename(run_dir),
+        "inputs": paths,
+        "profile": profile,
+        "topic": topic,
+        "shard_size": shard_size,
+        "created_at": datetime.utcnow().isoformat(),
+        "planned": True,
+        "shards": shards,
+    }
+    save_manifest(run_dir, manifest)
+    print(f"{len(shards)} Shards geplant ({sum(s['rows'] for s in shards)} Einträge) → {run_dir}")
+    return manifest
+
+
+def pending_shards(run_dir: str, manifest: dict) -> list[int]:
+    """Shards ohne Status 'done' oder ohne vorhandene Ergebnisdateien."""
+    return [
+        shard["id"] for shard in manifest["shards"]
+        if shard["status"] != "done"
+        or not os.path.exists(_shard_path(run_dir, shard["id"], "result.ndjson"))
+        or not os.path.exists(_shard_path(run_dir, shard["id"], "stats.json"))
+    ]
+
+
+# ------------------------------------------------------------
+# Worker
+# ------------------------------------------------------------
+_worker_modules: list = []
+_worker_profile: str = None
+
+
+def init_worker(profile: str, topic: str, workers: int) -> None:
+    """
+    Läuft einmal pro Worker-Prozess: Module auflösen, Torch-Threads auf den
+    Anteil des Workers begrenzen und die Modelle mit einem Warmup-Eintrag laden.
+    Die Modelle bleiben für alle weiteren Shards dieses Workers im Speicher.
+    """
+    global _worker_modules, _worker_profile
+    _worker_modules = get_modules_for_industry(profile)
+    _worker_profile = profile
+
+    # main.py --profile-out: jeder Worker-Prozess sampelt sich selbst
+    start_worker_profiler()
+
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    except ImportError:
+        pass
+
+    try:
+        analyze_chunk([{"text": WARMUP_TEXT}], _worker_modules, topic)
+    except Exception as e:
+        print(f"Warmup fehlgeschlagen (PID {os.getpid()}): {e}")
+
+
+def process_shard(run_dir: str, shard_id: int, topic: str) -> dict:
+    """
+    Analysiert einen Shard und schreibt:
+    - shard_XXXXX.result.ndjson (annotierte Einträge)
+    - shard_XXXXX.stats.json (Modulstatus, Mirror-Report, Insight-Summen, Spalten)
+    Beide Dateien werden atomar geschrieben; stats.json zuletzt.
+    """
+    started = time.time()
+    entries = _read_ndjson(_shard_path(run_dir, shard_id, "input.ndjson"))
+    entries, module_report, mirror_report = analyze_chunk(entries, _worker_modules, topic, profile=_worker_profile)
+
+    columns: dict[str, None] = {}
+    for entry in entries:
+        for key in entry:
+            columns.setdefault(key, None)
+
+    _write_ndjson(_shard_path(run_dir, shard_id, "result.ndjson"), entries)
+    stats = {
+        "rows": len(entries),
+        "columns": list(columns),
+        "module_report": {k: v for k, v in module_report.items() if k != "insights"},
+        "mirror_report": mirror_report,
+        "insight_stats": compute_insight_stats(entries),
+    }
+    _atomic_write_text(_shard_path(run_dir, shard_id, "stats.json"), json.dumps(stats, ensure_ascii=False, default=str))
+    flush_worker_profile()
+    return {"id": shard_id, "rows": len(entries), "seconds": round(time.time() - started, 2), "pid": os.getpid()}
+
+
+# ------------------------------------------------------------
+# Merge
+# ------------------------------------------------------------
+def merge_shards(run_dir: str, manifest: dict) -> dict:
+    """
+    Führt alle Shards zusammen: NDJSON- & CSV-Export (Spalten-Vereinigung,
+    shardweise geschrieben) und ein gemeinsamer Report aus den Shard-Statistiken.
+    """
+    shard_ids = [shard["id"] for shard in manifest["shards"]]
+    aggregator = ChunkAggregator()
+    columns: dict[str, None] = {}
+    stats_by_shard = {}
+
+    for shard_id in shard_ids:
+        with open(_shard_path(run_dir, shard_id, "stats.json"), "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        stats_by_shard[shard_id] = stats
+        for column in stats["columns"]:
+            columns.setdefault(column, None)
+        aggregator.add_stats(stats["rows"], stats["module_report"], stats["insight_stats"], stats["mirror_report"])
+
+    ndjson_path = os.path.join(run_dir, RESULT_NDJSON)
+    csv_path = os.path.join(run_dir, RESULT_CSV)
+    with open(ndjson_path + ".tmp", "w", encoding="utf-8") as ndjson_out, \
+            open(csv_path + ".tmp", "w", encoding="utf-8", newline="") as csv_out:
+        for position, shard_id in enumerate(shard_ids):
+            result_path = _shard_path(run_dir, shard_id, "result.ndjson")
+            with open(result_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    ndjson_out.write(line)
+            entries = _read_ndjson(result_path)
+            pd.DataFrame(entries, columns=list(columns)).to_csv(csv_out, index=False, header=position == 0)
+    os.replace(ndjson_path + ".tmp", ndjson_path)
+    os.replace(csv_path + ".tmp", csv_path)
+
+    summary = aggregator.summary()
+    report = {
+        "run_id": manifest["run_id"],
+        "profile": manifest["profile"],
+        "topic": manifest["topic"],
+        "inputs": manifest["inputs"],
+        "record_count": summary["record_count"],
+        "shard_count": summary["chunk_count"],
+        "module_report": summary["module_report"],
+        "insights": summary["insights"],
+        "mirror_report": summary["mirror_report"],
+        "exports": {"csv": csv_path, "ndjson": ndjson_path},
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+    _atomic_write_text(os.path.join(run_dir, REPORT_NAME), json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    return report
+
+
+# ------------------------------------------------------------
+# Orchestrierung
+# ------------------------------------------------------------
+def run_batch(
+    inputs: list[str],
+    profile: str,
+    topic: str = None,
+    shard_size: int = SHARD_SIZE,
+    workers: int = BATCH_WORKERS,
+    run_id: str = None,
+    output_dir: str = BATCH_DIR
+) -> dict:
+    """
+    Fortsetzbarer Batch-Lauf. Gibt den gemeinsamen Report zurück
+    bzw. einen Status mit den fehlgeschlagenen Shards.
+    """
+    topic = topic or profile
+    paths = expand_inputs(inputs)
+    run_id = run_id or run_id_for(paths, profile, topic, shard_size)
+    run_dir = os.path.join(output_dir, run_id)
+
+    manifest = plan_shards(paths, run_dir, profile, topic, shard_size)
+    todo = pending_shards(run_dir, manifest)
+    shards = {shard["id"]: shard for shard in manifest["shards"]}
+    done_count = len(shards) - len(todo)
+
+    if done_count:
+        print(f"Resume: {done_count}/{len(shards)} Shards bereits fertig.")
+
+    if todo:
+        workers = max(1, min(workers, len(todo)))
+        print(f"Starte {len(todo)} Shards auf {workers} Worker-Prozessen ...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(profile, topic, workers)) as pool:
+            futures = {pool.submit(process_shard, run_dir, shard_id, topic): shard_id for shard_id in todo}
+            for future in as_completed(futures):
+                shard = shards[futures[future]]
+                try:
+                    result = future.result()
+                    shard.update(status="done", seconds=result["seconds"], rows=result["rows"], error=None)
+                    done_count += 1
+                    print(f"Shard {shard['id']:05d} fertig ({result['rows']} Einträge, {result['seconds']}s) – {done_count}/{len(shards)}")
+                except Exception as e:
+                    shard.update(status="failed", error=str(e))
+                    print(f"Shard {shard['id']:05d} fehlgeschlagen: {e}")
+                save_manifest(run_dir, manifest)
+
+    failed = [shard["id"] for shard in manifest["shards"] if shard["status"] != "done"]
+    if failed:
+        print(f"{len(failed)} Shards nicht abgeschlossen – erneuter Aufruf setzt dort fort.")
+        return {"run_id": run_id, "status": "incomplete", "failed_shards": failed, "run_dir": run_dir}
+
+    report = merge_shards(run_dir, manifest)
+    manifest["merged_at"] = report["finished_at"]
+    save_manifest(run_dir, manifest)
+    print(f"Batch abgeschlossen: {report['record_count']} Einträge → {run_dir}")
+    return {**report, "status": "done", "run_dir": run_dir}
@@ -0,0 +1,231 @@
+# services/comment_sync.py
+# ============================================================
+# HTIF Comment Sync
+# ------------------------------------------------------------
+# Inkrementelle Synchronisation von Kommentar-Threads:
+# - Checkpoint pro (Client, Branche, Topic, platform, post_id): Cursor,
+#   neuester Zeitstempel, bereits gesehene Kommentar-IDs – zwei Kunden
+#   (oder Profile) teilen sich nie Stand oder Annotationen desselben Posts;
+#   andere Leser (z. B. Stream Worker) führen eigene Checkpoints in einem Namespace
+# - Folgeläufe holen & analysieren nur neue Kommentare
+# - Annotationen werden lokal angehängt und mit dem Bestand gemergt;
+#   Insights & Mirror werden über den Gesamtbestand neu berechnet
+# ============================================================
+
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from services.analyzer import run_analysis_pipeline
+from social_api import COMMENT_PAGE_ITERATORS
+from modules.mirror.mirror import run_mirror
+from modules.insights.insight_generator import compute_insight_stats, build_insights
+
+CHECKPOINT_DIR = "output/checkpoints"
+
+# Plattformen, deren Kommentarliste chronologisch wächst → Fortsetzen am gespeicherten Cursor.
+# Alle anderen werden neueste-zuerst gelesen, bis eine Seite nur Bekanntes enthält.
+CURSOR_RESUME_PLATFORMS = {"tiktok"}
+
+# Query-Parameter, die nie mit einem URL-Cursor gespeichert werden (Kunden-Token)
+CURSOR_SECRET_PARAMS = {"access_token"}
+
+_post_locks: dict[tuple, threading.Lock] = defaultdict(threading.Lock)
+
+
+# ------------------------------------------------------------
+# Checkpoint Store
+# ------------------------------------------------------------
+def _safe(part) -> str:
+    return re.sub(r"[^\w.-]", "_", str(part))
+
+
+def _base_path(platform: str, post_id: str, namespace: str = None, scope: tuple = ()) -> str:
+    """scope: (client, industry, topic) – eigener Unterordner pro Kunde & Profil."""
+    parts = ([namespace] if namespace else []) + [_safe(part) for part in scope]
+    directory = os.path.join(CHECKPOINT_DIR, *parts, platform.lower())
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, _safe(post_id))
+
+
+def load_checkpoint(platform: str, post_id: str, namespace: str = None, scope: tuple = ()) -> dict:
+    path = _base_path(platform, post_id, namespace, scope) + ".json"
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {
+        "platform": platform.lower(),
+        "post_id": post_id,
+        "scope": list(scope),
+        "cursor": None,
+        "newest_timestamp": None,
+        "seen_ids": [],
+        "updated_at": None,
+    }
+
+
+def save_checkpoint(checkpoint: dict, namespace: str = None) -> None:
+    path = _base_path(checkpoint["platform"], checkpoint["post_id"], namespace, tuple(checkpoint.get("scope", ()))) + ".json"
+    checkpoint = {**checkpoint, "updated_at": datetime.utcnow().isoformat()}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_annotations(platform: str, post_id: str, scope: tuple = ()) -> list[dict]:
+    path = _base_path(platform, post_id, scope=scope) + ".annotations.jsonl"
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_annotations(platform: str, post_id: str, entries: list[dict], scope: tuple = ()) -> None:
+    path = _base_path(platform, post_id, scope=scope) + ".annotations.jsonl"
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+# ------------------------------------------------------------
+# Delta-Fetch
+# ------------------------------------------------------------
+def _storable_cursor(platform: str, cursor):
+    """
+    Cursor für den Checkpoint: nur bei Plattformen, die daran fortsetzen;
+    URL-Cursor (z. B. Instagram paging.next) ohne access_token.
+    """
+    if platform not in CURSOR_RESUME_PLATFORMS:
+        return None
+    if isinstance(cursor, str) and cursor.startswith(("http://", "https://")):
+        parts = urlsplit(cursor)
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in CURSOR_SECRET_PARAMS]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+    return cursor
+
+
+def _newest(current, candidates: list):
+    values = [v for v in candidates if v is not None]
+    if current is not None:
+        values.append(current)
+    try:
+        return max(values) if values else None
+    except TypeError:
+        # Gemischte Typen (z. B. ISO-String & Epoch) → als String vergleichen
+        return max(values, key=str)
+
+
+def fetch_new_comments(platform: str, post_id: str, api_key: str, checkpoint: dict, limit=100) -> tuple[list[dict], dict]:
+    """
+    Holt nur Kommentare, die seit dem Checkpoint neu sind.
+    Gibt (neue Kommentare, aktualisierter Checkpoint) zurück; der übergebene
+    Checkpoint bleibt unverändert, bis der Aufrufer speichert.
+    """
+    platform = platform.lower()
+    page_iterator = COMMENT_PAGE_ITERATORS[platform]
+    seen = set(checkpoint.get("seen_ids", []))
+    resume = platform in CURSOR_RESUME_PLATFORMS and checkpoint.get("cursor") is not None
+    cursor = checkpoint.get("cursor")
+
+    new_comments = []
+    for page in page_iterator(post_id, api_key, limit=limit, start_cursor=cursor if resume else None):
+        fresh = [c for c in page if c.get("id") not in seen]
+        new_comments.extend(fresh)
+        seen.update(c.get("id") for c in fresh)
+        if page.next_cursor is not None:
+            cursor = page.next_cursor
+        # Neueste zuerst: eine Seite ohne neue Kommentare heißt "aufgeholt"
+        if not resume and page and not fresh:
+            break
+
+    updated = {
+        **checkpoint,
+        "cursor": _storable_cursor(platform, cursor),
+        "newest_timestamp": _newest(checkpoint.get("newest_timestamp"), [c.get("timestamp") for c in new_comments]),
+        "seen_ids": list(seen),
+    }
+    return new_comments, updated
+
+
+# ------------------------------------------------------------
+# Sync + Analyse
+# ------------------------------------------------------------
+def sync_post_comments(
+    platform: str,
+    post_id: str,
+    api_key: str,
+    client: str,
+    industry: str,
+    topic: str = "klima",
+    mode: str = "auto",
+    limit: int = 100,
+    module_options: dict = None
+) -> dict:
+    """
+    Holt neue Kommentare eines Posts, analysiert nur diese und hängt die
+    Annotationen an den lokalen Bestand an. Der Checkpoint wird erst nach
+    erfolgreicher Analyse gespeichert. module_options gehen an alle Module
+    (z. B. schnelle Optionen nach einem Admission-Downgrade).
+    Stand & Annotationen gehören dem Client und dem Profil (industry, topic).
+    """
+    scope = (client, industry, topic)
+    with _post_locks[(*scope, platform.lower(), post_id)]:
+        checkpoint = load_checkpoint(platform, post_id, scope=scope)
+        new_comments, updated = fetch_new_comments(platform, post_id, api_key, checkpoint, limit=limit)
+        new_comments = [{**c, "post_id": post_id} for c in new_comments if c.get("text")]
+
+        module_report = {}
+        if new_comments:
+            result = run_analysis_pipeline(
+                new_comments, industry=industry, topic=topic, mode=mode, module_options=module_options
+            )
+            new_comments = result["data"]
+            module_report = result["module_report"]
+            append_annotations(platform, post_id, new_comments, scope)
+
+        save_checkpoint(updated)
+
+    return {"new_entries": new_comments, "module_report": module_report}
+
+
+def sync_posts(
+    platform: str,
+    post_ids: list[str],
+    api_key: str,
+    client: str,
+    industry: str,
+    topic: str = "klima",
+    mode: str = "auto",
+    limit: int = 100,
+    module_options: dict = None
+) -> dict:
+    """
+    Synchronisiert mehrere Posts und liefert den gemergten Gesamtbestand
+    im Format von run_analysis_pipeline (plus new_record_count und new_data,
+    den in diesem Lauf neu analysierten Einträgen).
+    Insights & Mirror werden über alle gespeicherten Annotationen neu berechnet.
+    """
+    module_report, new_entries = {}, []
+    for post_id in post_ids:
+        synced = sync_post_comments(
+            platform, post_id, api_key, client, industry, topic=topic, mode=mode, limit=limit, module_options=module_options
+        )
+        new_entries.extend(synced["new_entries"])
+        module_report.update({k: v for k, v in synced["module_report"].items() if k != "insights"})
+
+    scope = (client, industry, topic)
+    entries = [e for post_id in post_ids for e in load_annotations(platform, post_id, scope)]
+    module_report["insights"] = build_insights(compute_insight_stats(entries))
+
+    return {
+        "data": entries,
+        "module_report": module_report,
+        "mirror_report": run_mirror(entries),
+        "new_record_count": len(new_entries),
+        "new_data": new_entries,
+    }
@@ -0,0 +1,409 @@
+# services/cost_model.py
+# ============================================================
+# HTIF Cost Model
+# ------------------------------------------------------------
+# Kostenschätzung & Admission Control für /analyze:
+# - _run_modules zeichnet pro Modulaufruf Wall- & CPU-Zeit und die
+#   Arbeitsmenge (geschätzte Tokens, inkl. Fensterung) auf
+# - pro Modul wird seconds = fix + per_token * tokens per Least Squares
+#   über die letzten Messungen kalibriert (ohne Messungen: Prior-Werte)
+# - estimate_cost: Wall-/CPU-Sekunden für Einträge + Branchenprofil
+# - admit: accept / downgrade (schnelle Optionen, Sampling) / queue (Bulk-Lane) /
+#   reject gegen ein konfiguriertes Zeitbudget
+# ============================================================
+
+import atexit
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from services.analysis_store import ANALYSIS_DB_PATH
+from services.domain_config import get_modules_for_industry
+from services.metrics import record_module
+from modules.text_windows import LONG_TEXT_WINDOWS, MAX_TOKENS, MAX_WINDOWS, WINDOW_STRIDE
+
+# Grobe Token-Schätzung ohne Tokenizer
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKENS_PER_ENTRY = 40   # wenn keine Texte vorliegen (Social-Abruf)
+
+# Module mit token-basierter Fensterung (modules/text_windows.py)
+WINDOWED_MODULES = {"irony_detect", "verbal_aggression_detect", "stance_detection"}
+
+# Prior-Kosten (Sekunden pro 1000 Tokens, CPU) bis genügend Messungen vorliegen
+PRIOR_SECONDS_PER_1K_TOKENS = {
+    "emotion_analysis": 0.5,
+    "irony_detect": 0.5,
+    "stance_detection": 1.5,      # Zero-Shot NLI: ein Durchlauf pro Hypothese
+    "verbal_aggression_detect": 0.5,
+    "narrative_clusters": 0.5,
+    "narrative_clusters_online": 0.3,
+    "narrative_clusters_assign": 0.05,   # assign_existing: nur Embedding + Centroid-Vergleich
+    "moral_detect": 0.05,
+    "framing_detect": 0.02,
+    "identity_analysis": 0.02,
+    "narrative_roles": 0.05,
+    "quote_extraction": 0.02,
+    "kpi_calculate": 0.01,
+    "insights": 0.001,
+}
+DEFAULT_PRIOR_SECONDS_PER_1K_TOKENS = 0.5
+
+CALIBRATION_SAMPLES = 200   # jüngste Messungen pro Modul
+CALIBRATION_MIN_SAMPLES = 5
+CALIBRATION_TTL = 60        # Sekunden, bis die Kalibrierung neu gelesen wird
+
+RECORD_TIMINGS = os.getenv("HTIF_RECORD_TIMINGS", "true").lower() in ("1", "true", "yes")
+# Messungen werden gepuffert und gesammelt geschrieben (nicht ein INSERT pro Modulaufruf)
+TIMING_FLUSH_SIZE = int(os.getenv("HTIF_TIMING_FLUSH_SIZE", "64"))
+TIMING_FLUSH_SECONDS = float(os.getenv("HTIF_TIMING_FLUSH_SECONDS", "30"))
+
+# Admission Control
+ANALYZE_BUDGET_SECONDS = float(os.getenv("HTIF_ANALYZE_BUDGET_SECONDS", "300"))
+ADMISSION_POLICY = os.getenv("HTIF_ADMISSION_POLICY", "downgrade")   # downgrade | queue | reject
+MIN_SAMPLE_FRACTION = float(os.getenv("HTIF_MIN_SAMPLE_FRACTION", "0.1"))
+SAMPLE_SEED = 42
+
+# Schnelle Modul-Optionen beim Downgrade (an die Module durchgereicht):
+# - windowed=False:        lange Texte nur einmal (gekürzt) statt fensterweise durch die Modelle
+# - assign_existing=True:  narrative_clusters ordnet bestehenden Narrativen zu statt BERTopic zu fitten
+# - skip_modules:          modellbasierte Zusatzmodule entfallen ganz (_run_modules überspringt sie)
+FAST_SKIP_MODULES = [
+    name.strip()
+    for name in os.getenv("HTIF_FAST_SKIP_MODULES", "irony_detect,verbal_aggression_detect").split(",")
+    if name.strip()
+]
+FAST_MODULE_OPTIONS = {"windowed": False, "assign_existing": True, "skip_modules": FAST_SKIP_MODULES}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS module_timings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    module TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    tokens REAL NOT NULL,
+    wall_seconds REAL NOT NULL,
+    cpu_seconds REAL NOT NULL,
+    recorded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_module_timings_module ON module_timings (module, id);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()
+_calibration: dict = {"loaded_at": 0.0, "modules": {}}
+_timing_lock = threading.Lock()
+_timing_buffer: dict = {"rows": [], "flushed_at": time.time()}
+
+
+@contextmanager
+def _connect(db_path: str = None):
+    db_path = db_path or ANALYSIS_DB_PATH
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                conn = sqlite3.connect(db_path)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                conn.close()
+                _initialized.add(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# ------------------------------------------------------------
+# Arbeitsmenge
+# ------------------------------------------------------------
+def estimate_tokens(texts: list) -> np.ndarray:
+    lengths = np.fromiter((len(t) if isinstance(t, str) else 0 for t in texts), dtype=float, count=len(texts))
+    return np.maximum(1.0, np.ceil(lengths / CHARS_PER_TOKEN))
+
+
+def work_units(module: str, tokens: np.ndarray, windowed: bool = LONG_TEXT_WINDOWS) -> float:
+    """Tokens, die ein Modul tatsächlich verarbeitet (Fensterung & Kürzung berücksichtigt)."""
+    if module not in WINDOWED_MODULES or not len(tokens):
+        return float(tokens.sum())
+    if not windowed:
+        return float(np.minimum(tokens, MAX_TOKENS).sum())
+    step = max(1, MAX_TOKENS - WINDOW_STRIDE)
+    windows = np.minimum(MAX_WINDOWS, 1 + np.ceil(np.maximum(0.0, tokens - MAX_TOKENS) / step))
+    return float(np.minimum(tokens + (windows - 1) * WINDOW_STRIDE, windows * MAX_TOKENS).sum())
+
+
+def cost_key(module: str, module_options: dict = None) -> str:
+    """Schlüssel für Messung & Kalibrierung – günstigere Modulvarianten werden getrennt kalibriert."""
+    if module == "narrative_clusters" and (module_options or {}).get("assign_existing"):
+        return "narrative_clusters_assign"
+    return module
+
+
+def token_stats(tokens: np.ndarray) -> dict:
+    if not len(tokens):
+        return {"total": 0, "mean": 0, "p50": 0, "p95": 0, "max": 0}
+    return {
+        "total": int(tokens.sum()),
+        "mean": round(float(tokens.mean()), 1),
+        "p50": int(np.percentile(tokens, 50)),
+        "p95": int(np.percentile(tokens, 95)),
+        "max": int(tokens.max()),
+    }
+
+
+# ------------------------------------------------------------
+# Messung
+# ------------------------------------------------------------
+class ModuleTimer:
+    """
+    Misst einen Modulaufruf (Wall- & Prozess-CPU-Zeit), puffert ihn für
+    module_timings und meldet ihn an /metrics (Label: Branchenprofil).
+    Fehler beim Aufzeichnen beeinflussen die Pipeline nie.
+    """
+
+    def __init__(self, module: str, entries: list[dict], module_options: dict = None, profile: str = None):
+        self.module = module
+        self.key = cost_key(module, module_options)
+        self.profile = profile
+        self.entries = len(entries)
+        tokens = estimate_tokens([e.get("text") for e in entries])
+        self.tokens = work_units(module, tokens, (module_options or {}).get("windowed", LONG_TEXT_WINDOWS))
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall_seconds = time.perf_counter() - self.wall
+        self.cpu_seconds = time.process_time() - self.cpu
+        record_module(self.module, self.profile, self.entries, self.tokens, self.wall_seconds, failed=exc_type is not None)
+        if RECORD_TIMINGS and exc_type is None and self.entries:
+            record_timing(self.key, self.entries, self.tokens, self.wall_seconds, self.cpu_seconds)
+        return False
+
+
+def record_timing(module: str, entries: int, tokens: float, wall_seconds: float, cpu_seconds: float) -> None:
+    """Puffert eine Messung; geschrieben wird ab TIMING_FLUSH_SIZE Messungen oder nach TIMING_FLUSH_SECONDS."""
+    with _timing_lock:
+        _timing_buffer["rows"].append((module, entries, tokens, wall_seconds, cpu_seconds, datetime.utcnow().isoformat()))
+        due = (
+            len(_timing_buffer["rows"]) >= TIMING_FLUSH_SIZE
+            or time.time() - _timing_buffer["flushed_at"] >= TIMING_FLUSH_SECONDS
+        )
+    if due:
+        flush_timings()
+
+
+def flush_timings() -> int:
+    """Schreibt alle gepufferten Messungen in einer Transaktion; gibt die Anzahl zurück."""
+    with _timing_lock:
+        rows, _timing_buffer["rows"] = _timing_buffer["rows"], []
+        _timing_buffer["flushed_at"] = time.time()
+    if not rows:
+        return 0
+    try:
+        with _connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO module_timings (module, entries, tokens, wall_seconds, cpu_seconds, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+    except sqlite3.Error as e:
+        print(f"{len(rows)} Timings konnten nicht gespeichert werden: {e}")
+        return 0
+    return len(rows)
+
+
+atexit.register(flush_timings)
+
+
+# ------------------------------------------------------------
+# Kalibrierung
+# ------------------------------------------------------------
+def _fit(samples: list[tuple]) -> dict:
+    """Least Squares seconds = fixed + per_token * tokens (nicht-negativ); CPU als Verhältnis zur Wall-Zeit."""
+    tokens = np.array([s[0] for s in samples], dtype=float)
+    wall = np.array([s[1] for s in samples], dtype=float)
+    cpu = np.array([s[2] for s in samples], dtype=float)
+
+    if len(samples) >= CALIBRATION_MIN_SAMPLES and tokens.std() > 0:
+        per_token, fixed = np.polyfit(tokens, wall, 1)
+    else:
+        per_token, fixed = wall.sum() / max(tokens.sum(), 1.0), 0.0
+    if per_token <= 0:
+        per_token, fixed = wall.sum() / max(tokens.sum(), 1.0), 0.0
+
+    return {
+        "fixed": max(0.0, float(fixed)),
+        "per_token": float(per_token),
+        "cpu_ratio": float(cpu.sum() / wall.sum()) if wall.sum() > 0 else 1.0,
+        "samples": len(samples),
+    }
+
+
+def calibration(refresh: bool = False) -> dict:
+    """Kalibrierte Parameter pro Modul (gecacht für CALIBRATION_TTL Sekunden)."""
+    if not refresh and time.time() - _calibration["loaded_at"] < CALIBRATION_TTL:
+        return _calibration["modules"]
+
+    flush_timings()
+    modules = {}
+    with _connect() as conn:
+        names = [row[0] for row in conn.execute("SELECT DISTINCT module FROM module_timings")]
+        for name in names:
+            rows = conn.execute(
+                "SELECT tokens, wall_seconds, cpu_seconds FROM module_timings WHERE module = ? ORDER BY id DESC LIMIT ?",
+                (name, CALIBRATION_SAMPLES),
+            ).fetchall()
+            if rows:
+                modules[name] = _fit(rows)
+
+    _calibration.update(loaded_at=time.time(), modules=modules)
+    return modules
+
+
+def _module_params(module: str, calibrated: dict) -> dict:
+    if module in calibrated:
+        return {**calibrated[module], "calibrated": True}
+    prior = PRIOR_SECONDS_PER_1K_TOKENS.get(module, DEFAULT_PRIOR_SECONDS_PER_1K_TOKENS)
+    return {"fixed": 0.0, "per_token": prior / 1000, "cpu_ratio": 1.0, "samples": 0, "calibrated": False}
+
+
+# ------------------------------------------------------------
+# Schätzung
+# ------------------------------------------------------------
+def estimate_cost(
+    industry: str,
+    texts: list = None,
+    entry_count: int = None,
+    mean_tokens: float = DEFAULT_TOKENS_PER_ENTRY,
+    module_options: dict = None,
+    modules: list = None
+) -> dict:
+    """
+    Schätzt Wall- und CPU-Sekunden für eine Analyse.
+    Entweder texts (Token-Verteilung wird gemessen) oder entry_count × mean_tokens.
+    module_options wie in _run_modules: skip_modules fallen weg, günstigere
+    Varianten (assign_existing) werden mit ihrer eigenen Kalibrierung geschätzt.
+    """
+    if texts is not None:
+        tokens = estimate_tokens(texts)
+    else:
+        tokens = np.full(int(entry_count or 0), max(1.0, float(mean_tokens)))
+
+    options = module_options or {}
+    windowed = options.get("windowed", LONG_TEXT_WINDOWS)
+    skipped = set(options.get("skip_modules") or ())
+    modules = list(modules) if modules is not None else get_modules_for_industry(industry)
+    calibrated = calibration()
+
+    per_module = []
+    for name in modules:
+        if name in skipped:
+            continue
+        params = _module_params(cost_key(name, options), calibrated)
+        units = work_units(name, tokens, windowed)
+        wall = params["fixed"] + params["per_token"] * units if len(tokens) else 0.0
+        per_module.append({
+            "module": name,
+            "tokens": int(units),
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(wall * params["cpu_ratio"], 3),
+            "calibrated": params["calibrated"],
+            "samples": params["samples"],
+        })
+
+    return {
+        "industry": industry,
+        "entry_count": int(len(tokens)),
+        "tokens": token_stats(tokens),
+        "module_options": module_options or {},
+        "modules": per_module,
+        "wall_seconds": round(sum(m["wall_seconds"] for m in per_module), 3),
+        "cpu_seconds": round(sum(m["cpu_seconds"] for m in per_module), 3),
+    }
+
+
+# ------------------------------------------------------------
+# Admission Control
+# ------------------------------------------------------------
+def admit(
+    industry: str,
+    texts: list = None,
+    entry_count: int = None,
+    mean_tokens: float = DEFAULT_TOKENS_PER_ENTRY,
+    budget: float = ANALYZE_BUDGET_SECONDS,
+    policy: str = ADMISSION_POLICY,
+    allow_downgrade: bool = True
+) -> dict:
+    """
+    Entscheidet über eine Anfrage:
+    - accept:    Schätzung im Budget
+    - downgrade: schnelle Modul-Optionen und ggf. Sampling (sample_size Einträge)
+    - queue:     policy='queue' – ungekürzt, aber in der Bulk-Lane des Schedulers
+    - reject:    auch downgegradet nicht im Budget (oder policy='reject')
+    """
+    full = estimate_cost(industry, texts=texts, entry_count=entry_count, mean_tokens=mean_tokens)
+    decision = {"decision": "accept", "budget_seconds": budget, "estimate": full, "module_options": {}, "sample_size": None}
+    if full["wall_seconds"] <= budget:
+        return decision
+
+    if policy == "queue":
+        return {**decision, "decision": "queue", "reason": "Über dem Budget – läuft ungekürzt in der Bulk-Lane."}
+    if policy == "reject" or not allow_downgrade:
+        return {**decision, "decision": "reject", "reason": "Geschätzte Laufzeit über dem Budget."}
+
+    fast = estimate_cost(industry, texts=texts, entry_count=entry_count, mean_tokens=mean_tokens, module_options=FAST_MODULE_OPTIONS)
+    decision.update(decision="downgrade", module_options={**FAST_MODULE_OPTIONS, "skip_modules": list(FAST_SKIP_MODULES)}, estimate=fast, full_estimate=full)
+    if fast["wall_seconds"] <= budget:
+        return decision
+
+    # Sampling: Fixkosten bleiben, variable Kosten skalieren mit dem Anteil
+    calibrated = calibration()
+    fixed = sum(_module_params(cost_key(m["module"], FAST_MODULE_OPTIONS), calibrated)["fixed"] for m in fast["modules"])
+    variable = max(fast["wall_seconds"] - fixed, 1e-9)
+    fraction = max(0.0, (budget - fixed) / variable)
+    if fraction < MIN_SAMPLE_FRACTION:
+        return {**decision, "decision": "reject", "reason": "Selbst mit Sampling nicht im Budget – Batch-CLI (main.py batch) nutzen."}
+
+    n = fast["entry_count"]
+    decision["sample_size"] = max(1, int(math.floor(n * fraction)))
+    decision["estimate"] = {**fast, "wall_seconds": round(fixed + variable * fraction, 3), "entry_count": decision["sample_size"]}
+    return decision
+
+
+def sample_entries(entries: list, sample_size: int, seed: int = SAMPLE_SEED) -> list:
+    """Reproduzierbare Zufallsstichprobe in Originalreihenfolge."""
+    if not sample_size or sample_size >= len(entries):
+        return entries
+    indices = sorted(random.Random(seed).sample(range(len(entries)), sample_size))
+    return [entries[i] for i in indices]
+
+
+def admission_summary(decision: dict) -> dict:
+    """Kompakte Admission-Metadaten für die API-Antwort."""
+    summary = {
+        "decision": decision["decision"],
+        "budget_seconds": decision["budget_seconds"],
+        "estimated_seconds": decision["estimate"]["wall_seconds"],
+    }
+    if decision.get("full_estimate"):
+        summary["full_estimated_seconds"] = decision["full_estimate"]["wall_seconds"]
+    if decision.get("module_options"):
+        summary["module_options"] = decision["module_options"]
+    if decision.get("sample_size"):
+        summary["sample_size"] = decision["sample_size"]
+    if decision.get("reason"):
+        summary["reason"] = decision["reason"]
+    return summary
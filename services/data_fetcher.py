@@ -8,9 +8,10 @@
 # - Synthetic Discourse Generator
 # ============================================================
 
-import requests
 import random
 
+from services.http_client import request_with_retry
+
 
 # ------------------------------------------------------------
 # API Loader
@@ -21,7 +22,7 @@ def fetch_from_api(api_url: str, api_key: str = None, limit: int = 100) -> list[
     Gibt eine Liste von dicts zurück, z. B. [{"text": "..."}].
     """
     headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
-    resp = requests.get(api_url, headers=headers)
+    resp = request_with_retry("GET", api_url, headers=headers)
     resp.raise_for_status()
     data = resp.json()
 
@@ -0,0 +1,310 @@
+# services/export_store.py
+# ============================================================
+# HTIF Export Store
+# ------------------------------------------------------------
+# Downloads für Analyse-Ergebnisse werden erst beim ersten Abruf
+# von /downloads/{filename} erzeugt und danach im Exportordner gecacht.
+# - /analyze registriert nur das Ergebnis (kompakte JSON-Quelle)
+# - Formate: CSV, JSON, Parquet, Arrow IPC
+# - Dateinamen = Content-Hash → identische Ergebnisse werden dedupliziert
+# - TTL- & Quota-Eviction über einen Hintergrund-Task (run_export_janitor)
+# ============================================================
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.metrics import record_cache
+
+EXPORT_DIR = "output/exports"
+SOURCE_SUFFIX = ".source.json"
+
+# Dateiendung → Content-Type
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Felder mit Listenwerten → in Parquet/Arrow als list<string> typisiert
+LIST_FIELDS = {"framing", "moral_frames", "mirror_flags"}
+
+# Komprimierung für die Spaltenformate
+COLUMNAR_COMPRESSION = "zstd"
+
+# Lebenszyklus des Exportordners
+EXPORT_TTL_SECONDS = int(float(os.getenv("HTIF_EXPORT_TTL_HOURS", "24")) * 3600)
+EXPORT_QUOTA_BYTES = int(float(os.getenv("HTIF_EXPORT_QUOTA_MB", "2048")) * 1024 * 1024)
+EXPORT_JANITOR_INTERVAL = int(os.getenv("HTIF_EXPORT_JANITOR_INTERVAL", "300"))
+
+_FILENAME_PATTERN = re.compile(r"^(htif_result_\w+)\.(" + "|".join(EXPORT_FORMATS) + r")$")
+
+# Ergebnisse, deren Quelle noch nicht auf Platte liegt (ID → kompakte JSON-Bytes)
+_pending: dict[str, bytes] = {}
+_pending_lock = threading.Lock()
+_generation_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+os.makedirs(EXPORT_DIR, exist_ok=True)
+
+
+# ------------------------------------------------------------
+# Registrierung
+# ------------------------------------------------------------
+def register_result(entries: list[dict]) -> str:
+    """
+    Merkt sich ein Analyse-Ergebnis für spätere Downloads.
+    Die Ergebnis-ID (Dateistamm ohne Endung) ist der Hash des Inhalts,
+    identische Ergebnisse teilen sich also Quelle und Exporte.
+    """
+    payload = json.dumps(entries, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    result_id = f"htif_result_{hashlib.sha256(payload).hexdigest()[:32]}"
+
+    if os.path.exists(_source_path(result_id)):
+        _touch(_source_path(result_id))
+        return result_id
+
+    with _pending_lock:
+        _pending.setdefault(result_id, payload)
+    return result_id
+
+
+def persist_source(result_id: str) -> None:
+    """
+    Schreibt die kompakte JSON-Quelle eines registrierten Ergebnisses.
+    Gedacht als FastAPI-BackgroundTask nach dem Versand der Antwort.
+    """
+    with _pending_lock:
+        payload = _pending.get(result_id)
+    if payload is None:
+        return
+
+    source_path = _source_path(result_id)
+    if not os.path.exists(source_path):
+        _atomic_write(source_path, lambda path: _write_bytes(payload, path))
+    with _pending_lock:
+        _pending.pop(result_id, None)
+
+
+def export_urls(result_id: str) -> dict:
+    """
+    Download-URLs aller Exportformate, z. B. {"csv_url": "/downloads/...csv", ...}.
+    """
+    return {f"{fmt}_url": f"/downloads/{result_id}.{fmt}" for fmt in EXPORT_FORMATS}
+
+
+# ------------------------------------------------------------
+# Lazy Export
+# ------------------------------------------------------------
+def is_export_filename(filename: str) -> bool:
+    """Prüft nur das Namensschema (htif_result_<hash>.<format>), nicht die Existenz."""
+    return _FILENAME_PATTERN.match(filename) is not None
+
+
+def export_etag(filename: str) -> str:
+    """
+    Starker ETag: Dateinamen sind inhaltsadressiert, der Name genügt.
+    """
+    return f'"{filename}"'
+
+
+def resolve_export(filename: str) -> str | None:
+    """
+    Liefert den Pfad zur Exportdatei und erzeugt sie bei Bedarf.
+    Gibt None zurück, wenn Dateiname oder Ergebnis unbekannt sind.
+    Jeder Abruf frischt den Zeitstempel für die TTL-Eviction auf.
+    """
+    match = _FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+
+    result_id, fmt = match.groups()
+    path = os.path.join(EXPORT_DIR, filename)
+    if os.path.exists(path):
+        _touch(path)
+        record_cache("exports", hit=True)
+        return path
+
+    with _generation_locks[result_id]:
+        if os.path.exists(path):
+            record_cache("exports", hit=True)
+            return path
+        record_cache("exports", hit=False)
+
+        entries = _load_entries(result_id)
+        if entries is None:
+            return None
+
+        _atomic_write(path, lambda tmp: _write_export(entries, fmt, tmp))
+
+    return path
+
+
+def _load_entries(result_id: str) -> list[dict] | None:
+    with _pending_lock:
+        payload = _pending.get(result_id)
+    if payload is not None:
+        return json.loads(payload)
+
+    source_path = _source_path(result_id)
+    if not os.path.exists(source_path):
+        return None
+    with open(source_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _source_path(result_id: str) -> str:
+    return os.path.join(EXPORT_DIR, result_id + SOURCE_SUFFIX)
+
+
+def _atomic_write(path: str, writer) -> None:
+    """Schreibt über eine temporäre Datei, damit nie halbfertige Exporte ausgeliefert werden."""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_bytes(payload: bytes, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(payload)
+
+
+def _write_export(entries: list[dict], fmt: str, path: str) -> None:
+    if fmt == "csv":
+        pd.DataFrame(entries).to_csv(path, index=False)
+    elif fmt == "json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2, default=str)
+    elif fmt == "parquet":
+        pq.write_table(entries_to_arrow(entries), path, compression=COLUMNAR_COMPRESSION)
+    elif fmt == "arrow":
+        table = entries_to_arrow(entries)
+        options = pa.ipc.IpcWriteOptions(compression=COLUMNAR_COMPRESSION)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unbekanntes Exportformat: {fmt}")
+
+
+# ------------------------------------------------------------
+# Eviction (TTL & Quota)
+# ------------------------------------------------------------
+def evict_exports(ttl_seconds: int = EXPORT_TTL_SECONDS, quota_bytes: int = EXPORT_QUOTA_BYTES) -> dict:
+    """
+    Entfernt Ergebnisse (Quelle + alle Exporte) aus dem Exportordner:
+    1. alles, was länger als ttl_seconds nicht abgerufen wurde
+    2. danach die am längsten ungenutzten, bis quota_bytes eingehalten ist
+    Noch nicht persistierte Ergebnisse werden nie angefasst.
+    """
+    groups: dict[str, dict] = {}
+    for name in os.listdir(EXPORT_DIR):
+        if name.endswith(".tmp") or not name.startswith("htif_result_"):
+            continue
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        result_id = name.split(".", 1)[0]
+        group = groups.setdefault(result_id, {"paths": [], "size": 0, "last_access": 0.0})
+        group["paths"].append(path)
+        group["size"] += stat.st_size
+        group["last_access"] = max(group["last_access"], stat.st_mtime)
+
+    with _pending_lock:
+        for result_id in _pending:
+            groups.pop(result_id, None)
+
+    now = time.time()
+    evicted, freed = 0, 0
+    total = sum(g["size"] for g in groups.values())
+
+    # Älteste zuerst → TTL, dann Quota (LRU)
+    for result_id, group in sorted(groups.items(), key=lambda item: item[1]["last_access"]):
+        expired = now - group["last_access"] > ttl_seconds
+        if not expired and total <= quota_bytes:
+            break
+        with _generation_locks[result_id]:
+            for path in group["paths"]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        _generation_locks.pop(result_id, None)
+        evicted += 1
+        freed += group["size"]
+        total -= group["size"]
+
+    return {"evicted_results": evicted, "freed_bytes": freed, "remaining_bytes": total}
+
+
+async def run_export_janitor(interval: int = EXPORT_JANITOR_INTERVAL) -> None:
+    """
+    Hintergrund-Task für den App-Lifespan: führt evict_exports periodisch aus.
+    """
+    while True:
+        try:
+            stats = await asyncio.to_thread(evict_exports)
+            if stats["evicted_results"]:
+                print(f"Export-Janitor: {stats['evicted_results']} Ergebnisse entfernt, "
+                      f"{stats['freed_bytes'] / 1024 / 1024:.1f} MB freigegeben.")
+        except Exception as e:
+            print(f"Export-Janitor Fehler: {e}")
+        await asyncio.sleep(interval)
+
+
+# ------------------------------------------------------------
+# Arrow-Konvertierung
+# ------------------------------------------------------------
+def _column_array(name: str, values: list) -> pa.Array:
+    if name in LIST_FIELDS:
+        return pa.array(
+            [[str(v) for v in value] if isinstance(value, list) else None for value in values],
+            type=pa.list_(pa.string())
+        )
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Gemischte Typen (z. B. Zahl & Text) → als String ablegen
+        return pa.array(
+            [
+                None if value is None
+                else json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list))
+                else str(value)
+                for value in values
+            ],
+            type=pa.string()
+        )
+
+
+def entries_to_arrow(entries: list[dict]) -> pa.Table:
+    """
+    Baut eine typisierte Arrow-Tabelle aus den annotierten Einträgen.
+    Listenfelder werden als list<string>, verschachtelte Dicts als struct abgelegt.
+    """
+    columns: dict[str, None] = {}
+    for entry in entries:
+        for key in entry:
+            columns.setdefault(key, None)
+
+    return pa.table({name: _column_array(name, [e.get(name) for e in entries]) for name in columns})
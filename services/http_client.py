@@ -0,0 +1,143 @@
+# services/http_client.py
+# ============================================================
+# HTIF HTTP Layer
+# ------------------------------------------------------------
+# Gemeinsamer HTTP-Zugriff für social_api & data_fetcher:
+# - eine Session mit Connection-Pooling & Keep-Alive
+# - Timeouts für jeden Request
+# - Retries mit exponentiellem Backoff + Jitter,
+#   Rate-Limit-Header (Retry-After, X-RateLimit-Reset) werden voll respektiert
+#   (bis RETRY_AFTER_MAX, darüber RateLimitExceeded statt kürzer zu warten)
+# - Concurrency-Limit pro Plattform (PLATFORM_CONCURRENCY, genutzt von
+#   social_api.aiter_comment_pages)
+# ============================================================
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (Connect-Timeout, Read-Timeout) in Sekunden
+DEFAULT_TIMEOUT = (5, 30)
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# Längste vom Server verlangte Wartezeit (Retry-After / X-RateLimit-Reset), die abgewartet wird
+RETRY_AFTER_MAX = float(os.getenv("HTIF_RETRY_AFTER_MAX", "900"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 64
+
+# Maximale parallele Requests pro Plattform
+PLATFORM_CONCURRENCY = {
+    "instagram": 8,
+    "tiktok": 4,
+    "default": 4,
+}
+
+
+
+class RateLimitExceeded(requests.HTTPError):
+    """Der Server verlangt eine längere Wartezeit als RETRY_AFTER_MAX."""
+
+    def __init__(self, url: str, retry_after: float, response: requests.Response = None):
+        self.retry_after = retry_after
+        super().__init__(
+            f"Rate-Limit für {url}: Server verlangt {retry_after:.0f}s Wartezeit "
+            f"(mehr als RETRY_AFTER_MAX={RETRY_AFTER_MAX:.0f}s)",
+            response=response,
+        )
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Liefert die prozessweite Session (lazy erzeugt, Thread-Pool-tauglich).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _rate_limit_delay(response: requests.Response) -> float | None:
+    """
+    Wartezeit aus Rate-Limit-Headern (Sekunden), falls vorhanden.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = response.headers.get("X-RateLimit-Reset")
+    if reset:
+        try:
+            value = float(reset)
+        except ValueError:
+            return None
+        # Epoch-Zeitstempel oder relative Sekunden
+        return max(0.0, value - time.time()) if value > 1e9 else max(0.0, value)
+
+    return None
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponentielles Backoff mit Full Jitter."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def request_with_retry(
+    method: str,
+    url: str,
+    *,
+    params: dict = None,
+    headers: dict = None,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries: int = MAX_RETRIES,
+) -> requests.Response:
+    """
+    Führt einen Request über die gepoolte Session aus.
+    Verbindungsfehler, Timeouts und Status 429/5xx werden wiederholt;
+    andere Antworten werden unverändert zurückgegeben.
+    Eine Retry-After-Vorgabe über RETRY_AFTER_MAX führt zu RateLimitExceeded.
+    """
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.request(method, url, params=params, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= max_retries:
+                raise
+            time.sleep(_backoff_delay(attempt))
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+            return response
+
+        delay = _rate_limit_delay(response)
+        if delay is not None and delay > RETRY_AFTER_MAX:
+            raise RateLimitExceeded(url, delay, response)
+        time.sleep(delay if delay is not None else _backoff_delay(attempt))
+
+    return response
+
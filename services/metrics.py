@@ -0,0 +1,261 @@
+# services/metrics.py
+# ============================================================
+# HTIF Metrics
+# ------------------------------------------------------------
+# Prometheus-Textformat (0.0.4) für GET /metrics, ohne Zusatzpaket:
+# - Counter & Histogramme werden pro Thread in eigene Shards geschrieben
+#   (kein Lock im Hot Path); erst der Scrape summiert alle Shards
+# - HTTP: Latenz & Anzahl pro Route/Methode/Status (metrics_middleware)
+# - Pipeline: Laufzeit, Einträge & Tokens pro Modul und Branchenprofil
+#   (ModuleTimer in services/cost_model.py)
+# - Inferenz: Batchgrößen, Sequenzen, Tokens & Sekunden pro Modell
+#   (Observer in modules/text_windows.py → Tokens/s = rate(tokens)/rate(seconds))
+# - Beim Scrape gelesen: Cache-Treffer (Embedding Store), Queue-Tiefe &
+#   laufende Jobs (Scheduler), RSS des Prozesses, Speicher geladener Modelle
+# ============================================================
+
+import os
+import resource
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from modules.text_windows import INFERENCE_OBSERVERS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# name → (Typ, Hilfetext, Buckets)
+METRICS = {
+    "htif_http_requests_total": ("counter", "HTTP-Anfragen nach Route, Methode und Status.", None),
+    "htif_http_request_duration_seconds": ("histogram", "HTTP-Latenz bis zum Antwort-Header.", LATENCY_BUCKETS),
+    "htif_module_duration_seconds": ("histogram", "Laufzeit eines Modulaufrufs.", LATENCY_BUCKETS),
+    "htif_module_entries_total": ("counter", "Von einem Modul verarbeitete Einträge.", None),
+    "htif_module_tokens_total": ("counter", "Von einem Modul verarbeitete Tokens (geschätzt).", None),
+    "htif_module_errors_total": ("counter", "Fehlgeschlagene Modulaufrufe.", None),
+    "htif_inference_batch_size": ("histogram", "Sequenzen pro Inferenz-Batch.", BATCH_SIZE_BUCKETS),
+    "htif_inference_sequences_total": ("counter", "Inferierte Sequenzen (Fenster).", None),
+    "htif_inference_tokens_total": ("counter", "Inferierte Tokens inkl. Padding.", None),
+    "htif_inference_seconds_total": ("counter", "Reine Inferenzzeit.", None),
+    "htif_cache_requests_total": ("counter", "Cache-Zugriffe nach Ergebnis (hit/miss).", None),
+}
+
+# Modelle, deren Speicher gemeldet wird: Name → (Python-Modul, Attribut).
+# Nur bereits importierte Module werden gelesen – der Scrape lädt kein Modell.
+LOADED_MODELS = {
+    "irony_detect": ("modules.irony.irony_detect", "model"),
+    "verbal_aggression_detect": ("modules.toxicity.toxicity_detect", "_model"),
+    "stance_detection": ("modules.stance.stance_detection", "_stance_pipeline"),
+}
+
+_local = threading.local()
+_shards: list = []
+_shards_lock = threading.Lock()
+
+
+# ------------------------------------------------------------
+# Hot Path: nur der eigene Shard wird geschrieben
+# ------------------------------------------------------------
+def _shard() -> dict:
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = {"counters": defaultdict(float), "histograms": {}}
+        with _shards_lock:
+            _shards.append(shard)
+        _local.shard = shard
+    return shard
+
+
+def inc(name: str, labels: tuple = (), value: float = 1.0) -> None:
+    """Erhöht einen Counter; labels als Tupel von (key, value)-Paaren."""
+    _shard()["counters"][(name, labels)] += value
+
+
+def observe(name: str, value: float, labels: tuple = ()) -> None:
+    histograms = _shard()["histograms"]
+    key = (name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        buckets = METRICS[name][2]
+        histogram = histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+    histogram[0][bisect_left(METRICS[name][2], value)] += 1
+    histogram[1] += value
+    histogram[2] += 1
+
+
+def record_request(method: str, route: str, status: int, seconds: float) -> None:
+    inc("htif_http_requests_total", (("method", method), ("route", route), ("status", str(status))))
+    observe("htif_http_request_duration_seconds", seconds, (("method", method), ("route", route)))
+
+
+def record_module(module: str, profile: str | None, entries: int, tokens: float, seconds: float, failed: bool = False) -> None:
+    labels = (("module", module), ("profile", profile or "unknown"))
+    if failed:
+        inc("htif_module_errors_total", labels)
+        return
+    observe("htif_module_duration_seconds", seconds, labels)
+    inc("htif_module_entries_total", labels, entries)
+    inc("htif_module_tokens_total", labels, tokens)
+
+
+def record_inference(model: str, batch_size: int, tokens: int | None, seconds: float) -> None:
+    labels = (("model", model or "unknown"),)
+    observe("htif_inference_batch_size", batch_size, labels)
+    inc("htif_inference_sequences_total", labels, batch_size)
+    inc("htif_inference_seconds_total", labels, seconds)
+    if tokens:
+        inc("htif_inference_tokens_total", labels, tokens)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    inc("htif_cache_requests_total", (("cache", cache), ("result", "hit" if hit else "miss")))
+
+
+INFERENCE_OBSERVERS.append(record_inference)
+
+
+async def metrics_middleware(request, call_next):
+    """FastAPI-Middleware: Latenz & Status pro Routen-Template (nicht pro konkretem Pfad)."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        record_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - started)
+
+
+# ------------------------------------------------------------
+# Scrape
+# ------------------------------------------------------------
+def _merged() -> tuple[dict, dict]:
+    with _shards_lock:
+        shards = list(_shards)
+    counters, histograms = defaultdict(float), {}
+    for shard in shards:
+        for key, value in shard["counters"].copy().items():
+            counters[key] += value
+        for key, (buckets, total, count) in shard["histograms"].copy().items():
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _model_bytes(model) -> int:
+    if not hasattr(model, "parameters"):
+        model = getattr(model, "model", None)   # transformers.Pipeline → nn.Module
+    if not hasattr(model, "parameters"):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def loaded_models() -> dict:
+    models = {}
+    for name, (module_name, attribute) in LOADED_MODELS.items():
+        module = sys.modules.get(module_name)
+        model = getattr(module, attribute, None) if module else None
+        if model is not None:
+            models[name] = model
+    embedding_store = sys.modules.get("modules.embeddings.embedding_store")
+    if embedding_store:
+        for model_name, model in list(embedding_store._models.items()):
+            models[f"embeddings:{model_name}"] = model
+    return models
+
+
+def resident_memory_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Fallback (macOS u. a.): Spitzenwert statt aktueller RSS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _gauges() -> list[tuple[str, str, list]]:
+    """(name, Hilfetext, [(labels, value)]) – beim Scrape berechnet."""
+    from services.scheduler import scheduler
+
+    status = scheduler.status()
+    gauges = [
+        ("htif_queue_depth", "Wartende Analysen pro Lane.",
+         [((("lane", lane),), values["queued"]) for lane, values in status["lanes"].items()]),
+        ("htif_jobs_in_flight", "Laufende Analysen pro Lane.",
+         [((("lane", lane),), values["running"]) for lane, values in status["lanes"].items()]),
+        ("htif_scheduler_workers", "Analyse-Slots des Schedulers.", [((), status["workers"])]),
+        ("htif_process_resident_memory_bytes", "Resident Set Size des Prozesses.", [((), resident_memory_bytes())]),
+        ("htif_model_memory_bytes", "Parameter- & Buffer-Speicher geladener Modelle.",
+         [((("model", name),), _model_bytes(model)) for name, model in loaded_models().items()]),
+    ]
+
+    embedding_store = sys.modules.get("modules.embeddings.embedding_store")
+    if embedding_store:
+        stores = list(embedding_store._stores.items())
+        gauges.append(("htif_embedding_store_rows", "Zeilen im Embedding Store.",
+                       [((("model", name),), len(store)) for name, store in stores]))
+    return gauges
+
+
+def _pulled_counters(counters: dict) -> None:
+    """Zähler, die Module selbst führen (modules/ importiert services/ nicht)."""
+    embedding_store = sys.modules.get("modules.embeddings.embedding_store")
+    if not embedding_store:
+        return
+    for name, store in list(embedding_store._stores.items()):
+        cache = ("cache", f"embeddings:{name}")
+        counters[("htif_cache_requests_total", (cache, ("result", "hit")))] += store.hits
+        counters[("htif_cache_requests_total", (cache, ("result", "miss")))] += store.misses
+
+
+def render() -> str:
+    """Alle Metriken im Prometheus-Textformat."""
+    counters, histograms = _merged()
+    _pulled_counters(counters)
+    lines = []
+
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    for name, help_text, samples in _gauges():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+
+    return "\n".join(lines) + "\n"
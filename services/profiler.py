@@ -0,0 +1,239 @@
+# services/profiler.py
+# ============================================================
+# HTIF Sampling Profiler
+# ------------------------------------------------------------
+# Statistischer Profiler für laufende Prozesse (ohne Neustart):
+# - ein Hintergrund-Thread liest alle PROFILE_INTERVAL Sekunden die
+#   Stacks aller Threads (sys._current_frames) – Wall-Clock-Sampling,
+#   die Pipeline selbst wird nicht instrumentiert
+# - _run_modules / Mirror setzen pro Thread einen Modul-Marker; jeder
+#   Stack beginnt mit "htif:<modul>" (z. B. htif:stance_detection,
+#   htif:run_mirror), sonst mit "thread:<name>"
+# - Ausgabe im Collapsed-Stack-Format ("a;b;c <anzahl>") für
+#   flamegraph.pl, speedscope oder inferno
+# - profile_for: On-Demand-Profil (Admin-Endpoint /admin/profile)
+# - profile_to: ganzer CLI-Lauf (main.py --profile-out); Worker-Prozesse
+#   (Batch, Task-Queue) profilieren sich selbst und werden am Ende gemergt
+# ============================================================
+
+import glob
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_INTERVAL = float(os.getenv("HTIF_PROFILE_INTERVAL", "0.01"))
+PROFILE_MIN_INTERVAL = 0.001
+PROFILE_MAX_SECONDS = float(os.getenv("HTIF_PROFILE_MAX_SECONDS", "120"))
+MAX_STACK_DEPTH = 200
+
+# Gesetzt von profile_to → Worker-Prozesse schreiben <ausgabe>.worker-<pid>
+PROFILE_OUTPUT_ENV = "HTIF_PROFILE_OUTPUT"
+WORKER_SUFFIX = ".worker-"
+WORKER_FLUSH_SECONDS = 5
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Thread-ID → aktuell laufendes HTIF-Modul
+_active_modules: dict[int, str] = {}
+_labels: dict = {}
+
+_session_lock = threading.Lock()
+_process_sampler = None
+
+
+class ProfilerBusyError(Exception):
+    """Es läuft bereits ein On-Demand-Profil in diesem Prozess."""
+
+
+@contextmanager
+def module_marker(name: str):
+    """Ordnet Samples dieses Threads dem HTIF-Modul name zu (verschachtelbar)."""
+    ident = threading.get_ident()
+    previous = _active_modules.get(ident)
+    _active_modules[ident] = name
+    try:
+        yield
+    finally:
+        if previous is None:
+            _active_modules.pop(ident, None)
+        else:
+            _active_modules[ident] = previous
+
+
+# ------------------------------------------------------------
+# Sampling
+# ------------------------------------------------------------
+def _short_path(path: str) -> str:
+    if path.startswith(PROJECT_ROOT):
+        return os.path.relpath(path, PROJECT_ROOT)
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.basename(path)
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+class Sampler:
+    """Sammelt Stacks aller Threads (außer sich selbst) in einem Hintergrund-Thread."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, output: str = None, flush_seconds: float = None):
+        self.interval = max(PROFILE_MIN_INTERVAL, float(interval))
+        self.output = output
+        self.flush_seconds = flush_seconds
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="htif-profiler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        self.seconds = time.monotonic() - self.started_at
+        if self.output:
+            self.flush()
+        return self.counts
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        next_flush = time.monotonic() + (self.flush_seconds or 0)
+        while not self._stop.wait(self.interval):
+            self.sample(own)
+            if self.output and self.flush_seconds and time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_seconds
+
+    def sample(self, own: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            module = _active_modules.get(ident)
+            root = f"htif:{module}" if module else f"thread:{names.get(ident, ident)}"
+            stacks.append(";".join([root, *reversed(stack)]))
+        with self._lock:
+            self.counts.update(stacks)
+            self.samples += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            text = render_collapsed(self.counts)
+        write_text(self.output, text)
+
+
+# ------------------------------------------------------------
+# Collapsed Stacks
+# ------------------------------------------------------------
+def render_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def parse_collapsed(text: str) -> Counter:
+    counts = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            counts[stack] += int(count)
+    return counts
+
+
+def write_text(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def module_totals(counts: Counter) -> dict:
+    """Samples pro Wurzel (htif:<modul> / thread:<name>), absteigend."""
+    totals = Counter()
+    for stack, count in counts.items():
+        totals[stack.split(";", 1)[0]] += count
+    return dict(totals.most_common())
+
+
+# ------------------------------------------------------------
+# On-Demand (Admin-Endpoint)
+# ------------------------------------------------------------
+def profile_for(seconds: float, interval: float = PROFILE_INTERVAL) -> Counter:
+    """Profiliert den laufenden Prozess für seconds Sekunden (blockiert den Aufrufer)."""
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Es läuft bereits ein Profil.")
+    try:
+        sampler = Sampler(interval).start()
+        time.sleep(min(max(0.0, seconds), PROFILE_MAX_SECONDS))
+        counts = sampler.stop()
+        print(f"Profil: {sampler.samples} Samples in {sampler.seconds:.1f}s – {module_totals(counts)}")
+        return counts
+    finally:
+        _session_lock.release()
+
+
+# ------------------------------------------------------------
+# CLI & Worker-Prozesse
+# ------------------------------------------------------------
+@contextmanager
+def profile_to(path: str, interval: float = PROFILE_INTERVAL):
+    """
+    Profiliert den umschlossenen Block und schreibt path (Collapsed Stacks).
+    Worker-Prozesse erben PROFILE_OUTPUT_ENV, profilieren sich über
+    start_worker_profiler selbst; ihre Dateien werden hier eingemischt.
+    """
+    global _process_sampler
+    for stale in glob.glob(f"{glob.escape(path)}{WORKER_SUFFIX}*"):
+        os.remove(stale)
+    os.environ[PROFILE_OUTPUT_ENV] = path
+    os.environ["HTIF_PROFILE_INTERVAL"] = str(interval)
+    _process_sampler = Sampler(interval).start()
+    try:
+        yield _process_sampler
+    finally:
+        counts = Counter(_process_sampler.stop())
+        for worker_file in glob.glob(f"{glob.escape(path)}{WORKER_SUFFIX}*"):
+            with open(worker_file, "r", encoding="utf-8") as f:
+                counts.update(parse_collapsed(f.read()))
+            os.remove(worker_file)
+        write_text(path, render_collapsed(counts))
+        os.environ.pop(PROFILE_OUTPUT_ENV, None)
+        os.environ.pop("HTIF_PROFILE_INTERVAL", None)
+        _process_sampler = None
+        print(f"\nProfil gespeichert: {path} ({sum(counts.values())} Samples)")
+
+
+def start_worker_profiler() -> None:
+    """In Worker-Prozessen aufrufen: startet einen Sampler, wenn profile_to aktiv ist."""
+    global _process_sampler
+    output = os.getenv(PROFILE_OUTPUT_ENV)
+    if not output or (_process_sampler is not None and _process_sampler.pid == os.getpid()):
+        return
+    interval = float(os.getenv("HTIF_PROFILE_INTERVAL", PROFILE_INTERVAL))
+    _process_sampler = Sampler(
+        interval, output=f"{output}{WORKER_SUFFIX}{os.getpid()}", flush_seconds=WORKER_FLUSH_SECONDS
+    ).start()
+
+
+def flush_worker_profile() -> None:
+    """Schreibt das bisherige Worker-Profil (Worker enden per os._exit ohne atexit)."""
+    if _process_sampler is not None and _process_sampler.output and _process_sampler.pid == os.getpid():
+        _process_sampler.flush()
@@ -0,0 +1,102 @@
+# services/result_views.py
+# ============================================================
+# HTIF Result Views
+# ------------------------------------------------------------
+# Serverseitige Aufbereitung großer Ergebnisse für die Dashboards:
+# - Meaning Map als 2D-Binning (moral_intensity × emotion_score) mit
+#   Anzahl und Ø Ambivalenz/Resonanz pro Bin → Diagrammgröße ~ Bins², nicht n
+# - Drill-down: Rohpunkte nur für einen gewählten Bin (begrenzt)
+# - Top-k per nlargest statt vollständiger Sortierung, Paginierung für Tabellen
+# ============================================================
+
+import math
+
+import numpy as np
+import pandas as pd
+
+MAP_BINS = 20
+MAP_X = "moral_intensity"
+MAP_Y = "emotion_score"
+MAP_VALUES = ("ambivalence_score", "resonance_score")
+DRILLDOWN_LIMIT = 500
+PAGE_SIZE = 50
+
+
+def bin_codes(df: pd.DataFrame, x: str = MAP_X, y: str = MAP_Y, bins: int = MAP_BINS) -> np.ndarray:
+    """Bin-Index (bin_x * bins + bin_y) pro Zeile; Werte außerhalb [0, 1] landen im Randbin."""
+    xs = pd.to_numeric(df[x], errors="coerce").fillna(0).to_numpy(dtype=float)
+    ys = pd.to_numeric(df[y], errors="coerce").fillna(0).to_numpy(dtype=float)
+    bx = np.clip((xs * bins).astype(int), 0, bins - 1)
+    by = np.clip((ys * bins).astype(int), 0, bins - 1)
+    return bx * bins + by
+
+
+def bin_meaning_map(
+    df: pd.DataFrame,
+    x: str = MAP_X,
+    y: str = MAP_Y,
+    bins: int = MAP_BINS,
+    values: tuple = MAP_VALUES,
+    codes: np.ndarray = None
+) -> pd.DataFrame:
+    """
+    Aggregiert die Meaning Map auf ein bins × bins Raster.
+    Eine Zeile pro nicht-leerem Bin: bin_x, bin_y, x0/x1, y0/y1, count, mean_<value>.
+    """
+    codes = bin_codes(df, x, y, bins) if codes is None else codes
+    counts = np.bincount(codes, minlength=bins * bins)
+    occupied = np.nonzero(counts)[0]
+
+    width = 1.0 / bins
+    grid = pd.DataFrame({
+        "bin_x": occupied // bins,
+        "bin_y": occupied % bins,
+        "count": counts[occupied],
+    })
+    grid["x0"] = grid["bin_x"] * width
+    grid["x1"] = grid["x0"] + width
+    grid["y0"] = grid["bin_y"] * width
+    grid["y1"] = grid["y0"] + width
+
+    for column in values:
+        if column not in df.columns:
+            grid[f"mean_{column}"] = 0.0
+            continue
+        weights = pd.to_numeric(df[column], errors="coerce").fillna(0).to_numpy(dtype=float)
+        sums = np.bincount(codes, weights=weights, minlength=bins * bins)
+        grid[f"mean_{column}"] = np.round(sums[occupied] / counts[occupied], 3)
+    return grid
+
+
+def bin_members(
+    df: pd.DataFrame,
+    bin_x: int,
+    bin_y: int,
+    bins: int = MAP_BINS,
+    limit: int = DRILLDOWN_LIMIT,
+    codes: np.ndarray = None,
+    x: str = MAP_X,
+    y: str = MAP_Y
+) -> pd.DataFrame:
+    """Rohpunkte eines Bins (höchstens limit Zeilen)."""
+    codes = bin_codes(df, x, y, bins) if codes is None else codes
+    return df[codes == bin_x * bins + bin_y].head(limit)
+
+
+def top_k(df: pd.DataFrame, column: str, k: int, min_value: float = None, subset: list = None) -> pd.DataFrame:
+    """Die k größten Werte von column (O(n) Auswahl statt vollständiger Sortierung)."""
+    frame = df.dropna(subset=subset or [column])
+    if min_value is not None:
+        frame = frame[frame[column] >= min_value]
+    return frame.nlargest(k, column)
+
+
+def page_count(total: int, page_size: int = PAGE_SIZE) -> int:
+    return max(1, math.ceil(total / page_size))
+
+
+def paginate(df: pd.DataFrame, page: int, page_size: int = PAGE_SIZE) -> pd.DataFrame:
+    """Seite page (1-basiert) von df."""
+    page = min(max(1, page), page_count(len(df), page_size))
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
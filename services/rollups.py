@@ -0,0 +1,303 @@
+# services/rollups.py
+# ============================================================
+# HTIF Rollups
+# ------------------------------------------------------------
+# Inkrementelle Zeitfenster-Aggregate pro (Client, Topic):
+# - Fenster: minute, hour, day (anhand des timestamp-Felds der Einträge)
+# - pro Fenster: Anzahl, Summe/Quadratsumme/Min/Max je Kennzahl,
+#   mergebare Histogramm-Sketches für Quantile,
+#   Verteilungen für emotion & stance, Häufigkeiten für framing & moral_frames
+# - neue Einträge werden in die bestehenden Fenster gemergt (kein Neuberechnen)
+# - Trends & Change Detection lesen nur die Fenster: O(Fenster) statt O(Kommentare)
+# ============================================================
+
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from services.analysis_store import ANALYSIS_DB_PATH, NUMERIC_FIELDS, normalize_timestamp
+
+GRANULARITIES = {
+    "minute": 16,  # Länge des ISO-Präfixes: YYYY-MM-DDTHH:MM
+    "hour": 13,
+    "day": 10,
+}
+
+# Histogramm-Sketch: feste Bins auf [SKETCH_MIN, SKETCH_MAX], Werte außerhalb
+# landen im Randbin (Min/Max bleiben exakt). Bins sind addierbar → mergebar.
+SKETCH_BINS = 50
+SKETCH_MIN = 0.0
+SKETCH_MAX = 1.0
+
+LABEL_DISTRIBUTIONS = ("emotion", "stance")
+FRAME_FIELDS = ("framing", "moral_frames")
+
+# Change Detection: Abweichung des Fenstermittels vom gleitenden Basisfenster
+CHANGE_BASELINE_WINDOWS = 24
+CHANGE_Z_THRESHOLD = 3.0
+CHANGE_MIN_COUNT = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    client TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    window TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (client, topic, granularity, window)
+);
+"""
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+@contextmanager
+def _connect(db_path: str = None):
+    db_path = db_path or ANALYSIS_DB_PATH
+    if db_path not in _initialized:
+        with _init_lock:
+            if db_path not in _initialized:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                conn = sqlite3.connect(db_path)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                conn.close()
+                _initialized.add(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# ------------------------------------------------------------
+# Fenster-Zustand (addierbar)
+# ------------------------------------------------------------
+def empty_state() -> dict:
+    return {
+        "count": 0,
+        "metrics": {},
+        "emotion": {},
+        "stance": {},
+        "frames": {},
+    }
+
+
+def _sketch_bin(value: float) -> int:
+    position = (value - SKETCH_MIN) / (SKETCH_MAX - SKETCH_MIN)
+    return min(SKETCH_BINS - 1, max(0, int(position * SKETCH_BINS)))
+
+
+def add_entry(state: dict, entry: dict) -> None:
+    state["count"] += 1
+
+    for field in NUMERIC_FIELDS:
+        value = entry.get(field)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or math.isnan(value):
+            continue
+        metric = state["metrics"].setdefault(
+            field, {"n": 0, "sum": 0.0, "sumsq": 0.0, "min": value, "max": value, "bins": [0] * SKETCH_BINS}
+        )
+        metric["n"] += 1
+        metric["sum"] += value
+        metric["sumsq"] += value * value
+        metric["min"] = min(metric["min"], value)
+        metric["max"] = max(metric["max"], value)
+        metric["bins"][_sketch_bin(value)] += 1
+
+    for field in LABEL_DISTRIBUTIONS:
+        label = entry.get(field)
+        if label is not None:
+            state[field][str(label)] = state[field].get(str(label), 0) + 1
+
+    for field in FRAME_FIELDS:
+        for frame in entry.get(field) or []:
+            state["frames"][str(frame)] = state["frames"].get(str(frame), 0) + 1
+
+
+def merge_states(target: dict, other: dict) -> dict:
+    """Merged other in target (in place) und gibt target zurück."""
+    target["count"] += other["count"]
+    for field, metric in other["metrics"].items():
+        if field not in target["metrics"]:
+            target["metrics"][field] = {**metric, "bins": list(metric["bins"])}
+            continue
+        merged = target["metrics"][field]
+        merged["n"] += metric["n"]
+        merged["sum"] += metric["sum"]
+        merged["sumsq"] += metric["sumsq"]
+        merged["min"] = min(merged["min"], metric["min"])
+        merged["max"] = max(merged["max"], metric["max"])
+        merged["bins"] = [a + b for a, b in zip(merged["bins"], metric["bins"])]
+    for key in (*LABEL_DISTRIBUTIONS, "frames"):
+        counts = Counter(target[key])
+        counts.update(other[key])
+        target[key] = dict(counts)
+    return target
+
+
+def sketch_quantile(metric: dict, q: float) -> float:
+    """Quantil aus dem Histogramm-Sketch (lineare Interpolation im Bin, begrenzt auf Min/Max)."""
+    target = q * metric["n"]
+    cumulative = 0
+    width = (SKETCH_MAX - SKETCH_MIN) / SKETCH_BINS
+    for i, count in enumerate(metric["bins"]):
+        if count and cumulative + count >= target:
+            value = SKETCH_MIN + (i + (target - cumulative) / count) * width
+            return round(min(metric["max"], max(metric["min"], value)), 4)
+        cumulative += count
+    return round(metric["max"], 4)
+
+
+def summarize_state(state: dict, metric: str = None) -> dict:
+    """Lesbare Kennzahlen eines Fensters (Mittel, Std, p50/p90, Verteilungen)."""
+    summary = {
+        "count": state["count"],
+        "emotion": state["emotion"],
+        "stance": state["stance"],
+        "frames": dict(Counter(state["frames"]).most_common(10)),
+    }
+    fields = [metric] if metric else list(state["metrics"])
+    for field in fields:
+        m = state["metrics"].get(field)
+        if not m or not m["n"]:
+            summary[field] = None
+            continue
+        mean = m["sum"] / m["n"]
+        variance = max(0.0, m["sumsq"] / m["n"] - mean * mean)
+        summary[field] = {
+            "n": m["n"],
+            "mean": round(mean, 4),
+            "std": round(math.sqrt(variance), 4),
+            "min": m["min"],
+            "max": m["max"],
+            "p50": sketch_quantile(m, 0.5),
+            "p90": sketch_quantile(m, 0.9),
+        }
+    return summary
+
+
+# ------------------------------------------------------------
+# Schreiben
+# ------------------------------------------------------------
+def update_rollups(entries: list[dict], topic: str, client: str = "") -> int:
+    """
+    Merged neue Einträge in die Minuten-, Stunden- und Tagesfenster.
+    Einträge ohne (lesbaren) timestamp zählen zum Ingest-Zeitpunkt.
+    Gibt die Anzahl aktualisierter Fenster zurück.
+    """
+    if not entries:
+        return 0
+
+    ingest_time = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    partials: dict[tuple, dict] = {}
+    skipped = 0
+    for entry in entries:
+        # Ein fehlerhafter Eintrag darf das Update der übrigen nicht abbrechen
+        try:
+            timestamp = normalize_timestamp(entry.get("timestamp")) or ingest_time
+            entry_topic = entry.get("topic_tag") or topic
+            for granularity, length in GRANULARITIES.items():
+                key = (entry_topic, granularity, timestamp[:length])
+                add_entry(partials.setdefault(key, empty_state()), entry)
+        except Exception as e:
+            skipped += 1
+            print(f"Rollup: Eintrag übersprungen ({e})")
+    if skipped:
+        print(f"Rollup: {skipped} von {len(entries)} Einträgen übersprungen.")
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for (entry_topic, granularity, window), partial in partials.items():
+                row = conn.execute(
+                    "SELECT state FROM rollups WHERE client = ? AND topic = ? AND granularity = ? AND window = ?",
+                    (client or "", entry_topic, granularity, window),
+                ).fetchone()
+                state = merge_states(json.loads(row[0]), partial) if row else partial
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollups (client, topic, granularity, window, state) VALUES (?, ?, ?, ?, ?)",
+                    (client or "", entry_topic, granularity, window, json.dumps(state)),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return len(partials)
+
+
+# ------------------------------------------------------------
+# Lesen
+# ------------------------------------------------------------
+def get_rollups(topic: str, granularity: str = "hour", client: str = "", since: str = None, until: str = None) -> list[tuple]:
+    """Rohe Fensterzustände [(window, state)] in zeitlicher Reihenfolge."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unbekannte Granularität: {granularity}")
+    length = GRANULARITIES[granularity]
+    clauses = ["client = ?", "topic = ?", "granularity = ?"]
+    params = [client or "", topic, granularity]
+    for name, value, clause in (("since", since, "window >= ?"), ("until", until, "window < ?")):
+        if not value:
+            continue
+        normalized = normalize_timestamp(value)
+        if normalized is None:
+            raise ValueError(f"Ungültiger Zeitpunkt für {name}: {value}")
+        clauses.append(clause)
+        params.append(normalized[:length])
+
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT window, state FROM rollups WHERE {' AND '.join(clauses)} ORDER BY window", params
+        ).fetchall()
+    return [(window, json.loads(state)) for window, state in rows]
+
+
+def get_trend(topic: str, metric: str = None, granularity: str = "hour", client: str = "", since: str = None, until: str = None) -> list[dict]:
+    """Zeitreihe pro Fenster: count, Kennzahl(en), emotion/stance-Verteilung, Top-Frames."""
+    return [
+        {"window": window, **summarize_state(state, metric)}
+        for window, state in get_rollups(topic, granularity, client=client, since=since, until=until)
+    ]
+
+
+def detect_changes(
+    trend: list[dict],
+    metric: str,
+    baseline: int = CHANGE_BASELINE_WINDOWS,
+    z_threshold: float = CHANGE_Z_THRESHOLD,
+    min_count: int = CHANGE_MIN_COUNT
+) -> list[dict]:
+    """
+    Markiert Fenster, deren Mittelwert um mehr als z_threshold Standardabweichungen
+    vom gleitenden Basisfenster (vorherige `baseline` Fenster) abweicht.
+    """
+    changes = []
+    history: list[float] = []
+    for point in trend:
+        stats = point.get(metric)
+        if not stats or stats["n"] < min_count:
+            continue
+        mean = stats["mean"]
+        window = history[-baseline:]
+        if len(window) >= 3:
+            base_mean = sum(window) / len(window)
+            base_std = math.sqrt(sum((v - base_mean) ** 2 for v in window) / len(window))
+            z = (mean - base_mean) / max(base_std, 1e-6)
+            if abs(z) >= z_threshold:
+                changes.append({
+                    "window": point["window"],
+                    "metric": metric,
+                    "value": mean,
+                    "baseline": round(base_mean, 4),
+                    "z_score": round(z, 2),
+                    "direction": "up" if z > 0 else "down",
+                })
+        history.append(mean)
+    return changes
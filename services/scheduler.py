@@ -0,0 +1,243 @@
+# services/scheduler.py
+# ============================================================
+# HTIF Scheduler
+# ------------------------------------------------------------
+# Faire Verteilung der Analyse-Slots von /analyze auf die Clients:
+# - zwei Lanes: interactive (Dashboards, kleine Uploads) und bulk
+#   (Backfills, große Uploads); interactive wird immer zuerst bedient,
+#   bulk belegt höchstens BULK_SLOTS Slots → ein Slot bleibt interaktiv frei
+# - innerhalb einer Lane Weighted Fair Queuing (Start-Time Fair Queuing):
+#   jeder Auftrag bekommt einen virtuellen Finish-Tag
+#   start = max(virtuelle Zeit, letzter Finish-Tag des Clients),
+#   finish = start + Kosten / Gewicht → kleinster Finish-Tag läuft zuerst
+# - pro Client: Gewicht, max. gleichzeitige und max. wartende Aufträge
+#   (config/scheduler.yaml); volle Warteschlange → QueueFullError (429)
+# - Wartezeit & Lane landen als "queue" in den Antwort-Metadaten
+# Läuft vollständig im Event Loop des API-Servers (kein Lock nötig).
+# ============================================================
+
+import asyncio
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+import yaml
+
+SCHEDULER_CONFIG_PATH = "config/scheduler.yaml"
+
+LANES = ("interactive", "bulk")
+
+# Gleichzeitig laufende Analysen (alle Clients & Lanes)
+SCHEDULER_WORKERS = int(os.getenv("HTIF_SCHEDULER_WORKERS", "4"))
+
+# Davon höchstens so viele für die Bulk-Lane
+BULK_SLOTS = int(os.getenv("HTIF_BULK_SLOTS", str(max(1, SCHEDULER_WORKERS - 1))))
+
+# Größere Aufträge laufen automatisch in der Bulk-Lane
+INTERACTIVE_MAX_ENTRIES = int(os.getenv("HTIF_INTERACTIVE_MAX_ENTRIES", "2000"))
+INTERACTIVE_MAX_SECONDS = float(os.getenv("HTIF_INTERACTIVE_MAX_SECONDS", "60"))
+
+DEFAULT_LIMITS = {"weight": 1.0, "max_concurrent": 2, "max_queued": 20}
+MIN_COST = 0.01   # Sekunden; verhindert Null-Kosten bei leeren Schätzungen
+
+
+class QueueFullError(Exception):
+    """Der Client hat bereits max_queued wartende Aufträge."""
+
+    def __init__(self, client: str, limit: int):
+        super().__init__(f"Warteschlange für '{client}' voll ({limit} Aufträge).")
+        self.client = client
+        self.limit = limit
+
+
+def choose_lane(requested: str, entry_count: int, estimated_seconds: float, admission: str = "accept") -> str:
+    """
+    Lane für einen Auftrag: 'bulk' auf Wunsch, bei Admission-Entscheidung 'queue'
+    oder wenn der Auftrag die interaktiven Grenzen übersteigt; sonst 'interactive'.
+    """
+    if requested == "bulk" or admission == "queue":
+        return "bulk"
+    if entry_count > INTERACTIVE_MAX_ENTRIES or estimated_seconds > INTERACTIVE_MAX_SECONDS:
+        return "bulk"
+    return "interactive"
+
+
+class Ticket:
+    """Ein Auftrag in der Warteschlange; future wird beim Dispatch erfüllt."""
+
+    def __init__(self, seq: int, client: str, lane: str, cost: float, start_tag: float, finish_tag: float, queued_ahead: int):
+        self.seq = seq
+        self.client = client
+        self.lane = lane
+        self.cost = cost
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.queued_ahead = queued_ahead
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.future = asyncio.get_running_loop().create_future()
+
+    def metadata(self) -> dict:
+        started = self.started_at if self.started_at is not None else time.monotonic()
+        return {
+            "lane": self.lane,
+            "wait_seconds": round(started - self.enqueued_at, 3),
+            "queued_ahead": self.queued_ahead,
+            "cost_seconds": round(self.cost, 3),
+        }
+
+
+class FairScheduler:
+    def __init__(self, workers: int = SCHEDULER_WORKERS, bulk_slots: int = BULK_SLOTS, config_path: str = SCHEDULER_CONFIG_PATH):
+        self.workers = max(1, workers)
+        self.bulk_slots = max(1, min(bulk_slots, self.workers))
+        self.config_path = config_path
+        self._config = {}
+        self._config_mtime = None
+        self._seq = itertools.count()
+
+        self.queues = {lane: defaultdict(deque) for lane in LANES}
+        self.virtual_time = {lane: 0.0 for lane in LANES}
+        self.last_finish = {lane: {} for lane in LANES}
+        self.running = {lane: 0 for lane in LANES}
+        self.running_by_client = defaultdict(int)
+        self.queued_by_client = defaultdict(int)
+
+    # --------------------------------------------------------
+    # Konfiguration
+    # --------------------------------------------------------
+    def _load_config(self) -> dict:
+        """config/scheduler.yaml, neu gelesen sobald sich die Datei ändert."""
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return {}
+        if mtime != self._config_mtime:
+            with open(self.config_path, "r", encoding="utf-8") as f:
+                self._config = yaml.safe_load(f) or {}
+            self._config_mtime = mtime
+        return self._config
+
+    def limits(self, client: str) -> dict:
+        config = self._load_config()
+        return {
+            **DEFAULT_LIMITS,
+            **(config.get("default") or {}),
+            **((config.get("clients") or {}).get(client) or {}),
+        }
+
+    # --------------------------------------------------------
+    # Warteschlange
+    # --------------------------------------------------------
+    def queued(self, lane: str = None) -> int:
+        lanes = [lane] if lane else LANES
+        return sum(len(q) for name in lanes for q in self.queues[name].values())
+
+    def in_flight(self) -> int:
+        return sum(self.running.values())
+
+    def check_capacity(self, client: str) -> None:
+        limit = int(self.limits(client)["max_queued"])
+        if self.queued_by_client[client] >= limit:
+            raise QueueFullError(client, limit)
+
+    def submit(self, client: str, lane: str, cost: float) -> Ticket:
+        self.check_capacity(client)
+        lane = lane if lane in LANES else "interactive"
+        weight = max(float(self.limits(client)["weight"]), 0.01)
+        cost = max(float(cost or 0.0), MIN_COST)
+
+        start = max(self.virtual_time[lane], self.last_finish[lane].get(client, 0.0))
+        finish = start + cost / weight
+        self.last_finish[lane][client] = finish
+
+        ticket = Ticket(next(self._seq), client, lane, cost, start, finish, self.queued())
+        self.queues[lane][client].append(ticket)
+        self.queued_by_client[client] += 1
+        self._dispatch()
+        return ticket
+
+    def _next(self) -> Ticket | None:
+        for lane in LANES:
+            if lane == "bulk" and self.running["bulk"] >= self.bulk_slots:
+                continue
+            heads = [
+                queue[0] for client, queue in self.queues[lane].items()
+                if queue and self.running_by_client[client] < int(self.limits(client)["max_concurrent"])
+            ]
+            if heads:
+                return min(heads, key=lambda t: (t.finish_tag, t.seq))
+        return None
+
+    def _dispatch(self) -> None:
+        while self.in_flight() < self.workers:
+            ticket = self._next()
+            if ticket is None:
+                return
+            queue = self.queues[ticket.lane][ticket.client]
+            queue.popleft()
+            if not queue:
+                del self.queues[ticket.lane][ticket.client]
+            self.queued_by_client[ticket.client] -= 1
+            self.running[ticket.lane] += 1
+            self.running_by_client[ticket.client] += 1
+            self.virtual_time[ticket.lane] = max(self.virtual_time[ticket.lane], ticket.start_tag)
+            ticket.started_at = time.monotonic()
+            ticket.future.set_result(None)
+
+    def release(self, ticket: Ticket) -> None:
+        self.running[ticket.lane] -= 1
+        self.running_by_client[ticket.client] -= 1
+        self._dispatch()
+
+    def cancel(self, ticket: Ticket) -> None:
+        """Entfernt einen noch wartenden Auftrag (z. B. Client-Abbruch)."""
+        queue = self.queues[ticket.lane].get(ticket.client)
+        if not queue or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self.queued_by_client[ticket.client] -= 1
+        # Nicht ausgeführte Kosten nicht dem Client anrechnen
+        if self.last_finish[ticket.lane].get(ticket.client) == ticket.finish_tag:
+            self.last_finish[ticket.lane][ticket.client] = ticket.start_tag
+        if not queue:
+            del self.queues[ticket.lane][ticket.client]
+
+    @asynccontextmanager
+    async def slot(self, client: str, lane: str, cost: float):
+        """
+        Wartet auf einen Slot und gibt ihn beim Verlassen frei:
+            async with scheduler.slot(client, lane, cost) as ticket: ...
+        """
+        ticket = self.submit(client, lane, cost)
+        try:
+            await ticket.future
+        except BaseException:
+            if ticket.started_at is None:
+                self.cancel(ticket)
+            else:
+                self.release(ticket)
+            raise
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def status(self) -> dict:
+        clients = set(self.queued_by_client) | set(self.running_by_client)
+        return {
+            "workers": self.workers,
+            "bulk_slots": self.bulk_slots,
+            "lanes": {lane: {"queued": self.queued(lane), "running": self.running[lane]} for lane in LANES},
+            "clients": {
+                client: {"queued": self.queued_by_client[client], "running": self.running_by_client[client]}
+                for client in sorted(clients)
+                if self.queued_by_client[client] or self.running_by_client[client]
+            },
+        }
+
+
+# Ein Scheduler pro API-Prozess
+scheduler = FairScheduler()
@@ -0,0 +1,234 @@
+# services/serialization.py
+# ============================================================
+# HTIF Serialization
+# ------------------------------------------------------------
+# Schnelle Antwort-Kodierung für große Ergebnisse:
+# - JSON über orjson (Fallback: json), direkt zu Bytes ohne jsonable_encoder
+# - Content Negotiation: JSON, MessagePack oder Arrow IPC (Stream-Format)
+# - gzip / zstd für große Payloads (Accept-Encoding)
+# - decode_response: Gegenstück für die Streamlit-Clients (app.py, dashboard.py)
+# Optionale Pakete (orjson, msgpack, zstandard, pyarrow) werden nur genutzt,
+# wenn sie installiert sind; JSON + gzip funktionieren immer.
+# ============================================================
+
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    from fastapi.responses import Response
+except ImportError:  # Streamlit-Clients brauchen nur decode_response
+    Response = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Weitere gebräuchliche Bezeichnungen im Accept-Header
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.apache.arrow.file": ARROW_MEDIA_TYPE,
+}
+
+# Arrow: Einträge als Tabelle, alle übrigen Felder als JSON in den Schema-Metadaten
+ARROW_METADATA_KEY = b"htif"
+ARROW_DATA_FIELD = "data"
+
+# Komprimierung erst ab dieser Größe (kleine Antworten: Overhead > Nutzen)
+COMPRESSION_MIN_BYTES = 64 * 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+# ------------------------------------------------------------
+# JSON
+# ------------------------------------------------------------
+def dumps(obj) -> bytes:
+    """JSON als UTF-8-Bytes. NaN wird mit orjson zu null (gültiges JSON)."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads(payload: bytes | str):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+if Response is not None:
+    class FastJSONResponse(Response):
+        """JSONResponse-Ersatz: kodiert den Inhalt in einem Schritt (orjson), ohne jsonable_encoder."""
+
+        media_type = JSON_MEDIA_TYPE
+
+        def render(self, content) -> bytes:
+            return dumps(content)
+
+
+# ------------------------------------------------------------
+# MessagePack & Arrow
+# ------------------------------------------------------------
+def _msgpack_default(obj):
+    if hasattr(obj, "item"):  # numpy-Skalare
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def _encode_msgpack(payload: dict) -> bytes:
+    return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+
+
+def _encode_arrow(payload: dict) -> bytes:
+    from services.export_store import entries_to_arrow
+
+    table = entries_to_arrow(payload.get(ARROW_DATA_FIELD) or [])
+    meta = {k: v for k, v in payload.items() if k != ARROW_DATA_FIELD}
+    table = table.replace_schema_metadata({ARROW_METADATA_KEY: dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def available_media_types() -> list[str]:
+    """Vom Server/Client unterstützte Formate (abhängig von installierten Paketen)."""
+    types = [JSON_MEDIA_TYPE]
+    if msgpack is not None:
+        types.append(MSGPACK_MEDIA_TYPE)
+    if pa is not None:
+        types.append(ARROW_MEDIA_TYPE)
+    return types
+
+
+def _parse_header(header: str | None) -> list[tuple[str, float]]:
+    """'a/b;q=0.5, c/d' → [(a/b, 0.5), (c/d, 1.0)] (ohne q=0)."""
+    items = []
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            items.append((name.strip().lower(), quality))
+    return items
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """Bestes unterstütztes Format laut Accept-Header; ohne Treffer JSON."""
+    supported = available_media_types()
+    best, best_quality = JSON_MEDIA_TYPE, 0.0
+    for name, quality in _parse_header(accept):
+        name = MEDIA_TYPE_ALIASES.get(name, name)
+        if name in supported and quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """zstd vor gzip (bei gleicher Gewichtung); None = unkomprimiert."""
+    offered = dict(_parse_header(accept_encoding))
+    candidates = []
+    if zstandard is not None and "zstd" in offered:
+        candidates.append((offered["zstd"], 1, "zstd"))
+    if "gzip" in offered:
+        candidates.append((offered["gzip"], 0, "gzip"))
+    return max(candidates)[2] if candidates else None
+
+
+def compress(body: bytes, encoding: str | None) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def encode_payload(payload: dict, media_type: str) -> bytes:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return _encode_msgpack(payload)
+    if media_type == ARROW_MEDIA_TYPE:
+        return _encode_arrow(payload)
+    return dumps(payload)
+
+
+def encode_response(payload: dict, accept: str | None = None, accept_encoding: str | None = None) -> "Response":
+    """
+    Kodiert eine Antwort im ausgehandelten Format und komprimiert große Payloads.
+    Die Kodierung läuft genau einmal über die Daten (keine Feld-für-Feld-Umwandlung).
+    """
+    media_type = negotiate_media_type(accept)
+    body = encode_payload(payload, media_type)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= COMPRESSION_MIN_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+# ------------------------------------------------------------
+# Client
+# ------------------------------------------------------------
+def client_accept_header() -> str:
+    """
+    Accept-Header für die Streamlit-Clients: MessagePack bevorzugt, dann JSON.
+    Arrow nur nachrangig – es lohnt sich für tabellarische Konsumenten
+    (table.to_pandas()), nicht für die Rückwandlung in Python-Dicts.
+    """
+    preferences = {MSGPACK_MEDIA_TYPE: "1.0", JSON_MEDIA_TYPE: "0.8", ARROW_MEDIA_TYPE: "0.5"}
+    return ", ".join(f"{media_type};q={preferences[media_type]}" for media_type in available_media_types())
+
+
+def client_accept_encoding() -> str:
+    # requests/urllib3 dekodieren gzip immer, zstd nur mit installiertem zstandard
+    return "zstd, gzip" if zstandard is not None else "gzip"
+
+
+def decode_payload(body: bytes, content_type: str | None) -> dict:
+    """Dekodiert eine (bereits dekomprimierte) Antwort anhand des Content-Type."""
+    media_type = (content_type or JSON_MEDIA_TYPE).split(";")[0].strip().lower()
+    media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.unpackb(body, raw=False)
+    if media_type == ARROW_MEDIA_TYPE:
+        table = pa.ipc.open_stream(body).read_all()
+        meta = (table.schema.metadata or {}).get(ARROW_METADATA_KEY)
+        payload = loads(meta) if meta else {}
+        payload[ARROW_DATA_FIELD] = table.replace_schema_metadata(None).to_pylist()
+        return payload
+    return loads(body)
+
+
+def decode_response(response) -> dict:
+    """Gegenstück zu encode_response für requests.Response."""
+    return decode_payload(response.content, response.headers.get("content-type"))
@@ -0,0 +1,407 @@
+# services/stream_worker.py
+# ============================================================
+# HTIF Stream Worker
+# ------------------------------------------------------------
+# Langlaufender Streaming-Modus:
+# - Quellen: getailte NDJSON-Datei, lokaler TCP-Socket (NDJSON-Zeilen),
+#   Polling neuer Social-Kommentare (eigene Checkpoints im Namespace
+#   "stream", gespeichert erst nachdem der Batch abgelegt ist)
+# - Quellen laufen in Threads und füllen eine begrenzte Queue
+# - Analyse in Micro-Batches (BATCH_SIZE oder spätestens BATCH_MAX_WAIT Sekunden);
+#   narrative_clusters läuft hier als Online-Variante (stabile Cluster-IDs
+#   über alle Batches statt eines neuen BERTopic-Modells pro Batch)
+# - Sliding Window über addierbare Insight-Statistiken & Mirror-Reports
+#   (nur Batch-Statistiken im Speicher, keine Einträge)
+# - Alerts, wenn Insight-Signale (evaluate_signals) oder Mirror-Status kippen
+# ============================================================
+
+import functools
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from services.analyzer import analyze_chunk
+from services.domain_config import get_modules_for_industry
+from services.analysis_store import start_run, append_entries, finish_run
+from services.rollups import update_rollups
+from services.comment_sync import load_checkpoint, save_checkpoint, fetch_new_comments
+from modules.insights.insight_generator import (
+    compute_insight_stats, merge_insight_stats, build_insights, evaluate_signals
+)
+from modules.mirror.mirror import merge_mirror_reports
+
+STREAM_BATCH_SIZE = 64
+STREAM_BATCH_MAX_WAIT = 2.0       # Sekunden bis ein unvollständiger Batch trotzdem läuft
+STREAM_WINDOW_SECONDS = 900       # Sliding Window für Insights & Mirror
+STREAM_QUEUE_SIZE = 10_000        # begrenzt den Speicher, Quellen warten bei voller Queue
+STREAM_POLL_INTERVAL = 30.0
+ALERTS_PATH = "output/alerts.ndjson"
+
+# Fehlgeschlagene Batches: Wiederholungen (mit Backoff), danach Dead-Letter-Datei
+STREAM_BATCH_RETRIES = 2
+STREAM_RETRY_DELAY = 1.0
+DEAD_LETTER_PATH = "output/stream_dead_letter.ndjson"
+
+# So oft rollt der Poller einen Post nach endgültig fehlgeschlagenem Batch zurück
+# (erneutes Holen); danach landen dessen Kommentare im Dead Letter
+STREAM_MAX_REDELIVERIES = 3
+
+# Checkpoint-Namespace des Pollers (getrennt von /analyze?incremental=true)
+STREAM_CHECKPOINT_NAMESPACE = "stream"
+
+# Optionaler Callback an einem Eintrag; wird aufgerufen, sobald der Batch
+# mit diesem Eintrag analysiert und gespeichert ist (z. B. Checkpoint sichern)
+STREAM_ACK_KEY = "_ack"
+
+# Optionaler Callback, wenn der Batch endgültig fehlschlägt: True = die Quelle
+# liefert den Eintrag erneut, False = Eintrag geht in die Dead-Letter-Datei
+STREAM_NACK_KEY = "_nack"
+
+# Module, die im Streaming durch ihre inkrementelle Variante ersetzt werden
+STREAM_MODULE_SUBSTITUTES = {"narrative_clusters": "narrative_clusters_online"}
+
+# Mirror-Status, bei denen im Fenster ein Alert ausgelöst wird
+MIRROR_ALERT_STATUSES = {"low_confidence"}
+
+
+# ------------------------------------------------------------
+# Quellen (jeweils Thread → Queue)
+# ------------------------------------------------------------
+def _parse_line(line: str):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        entry = {"text": line}
+    return entry if isinstance(entry, dict) and entry.get("text") else None
+
+
+def tail_ndjson(path: str, out: queue.Queue, stop: threading.Event, from_start: bool = False, poll: float = 0.5) -> None:
+    """
+    Folgt einer NDJSON-Datei (wie tail -f); unvollständige Zeilen werden gepuffert.
+    Existiert die Datei beim Start noch nicht, wird sie ab Anfang gelesen.
+    """
+    if not os.path.exists(path):
+        from_start = True
+    while not os.path.exists(path) and not stop.is_set():
+        time.sleep(poll)
+    if stop.is_set():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        buffer = ""
+        while not stop.is_set():
+            chunk = f.readline()
+            if not chunk:
+                time.sleep(poll)
+                continue
+            buffer += chunk
+            if not buffer.endswith("\n"):
+                continue
+            entry = _parse_line(buffer)
+            buffer = ""
+            if entry:
+                out.put(entry)
+
+
+def serve_socket(host: str, port: int, out: queue.Queue, stop: threading.Event) -> None:
+    """TCP-Server: jede Verbindung sendet NDJSON-Zeilen (oder Klartext, eine Zeile pro Kommentar)."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                if stop.is_set():
+                    break
+                entry = _parse_line(raw.decode("utf-8", errors="replace"))
+                if entry:
+                    out.put(entry)
+
+    class Server(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    with Server((host, port), Handler) as server:
+        server.timeout = 0.5
+        print(f"Stream-Socket lauscht auf {host}:{port}")
+        while not stop.is_set():
+            server.handle_request()
+
+
+def poll_comments(
+    platform: str,
+    post_ids: list[str],
+    api_key: str,
+    out: queue.Queue,
+    stop: threading.Event,
+    interval: float = STREAM_POLL_INTERVAL,
+    limit: int = 100,
+    scope: tuple = ()
+) -> None:
+    """
+    Fragt die Posts periodisch ab und liefert nur neue Kommentare.
+    Der Stand wird im Speicher fortgeschrieben; auf die Platte geht ein
+    Checkpoint erst über das Ack des letzten Kommentars, d. h. nach dem
+    Speichern seines Batches – nach einem Absturz wird erneut geholt.
+    Schlägt ein Batch endgültig fehl (Nack), springt der Post auf den zuletzt
+    bestätigten Checkpoint zurück; eine neue Generation macht ältere Acks
+    ungültig, die Kommentare werden beim nächsten Poll erneut geholt.
+    scope (client, industry, topic) trennt die Checkpoints mehrerer Worker.
+    """
+    lock = threading.Lock()
+    checkpoints, pending = {}, {}
+    generations, redeliveries = defaultdict(int), defaultdict(int)
+    abandoned = set()
+
+    def acknowledge(post_id: str, generation: int, checkpoint: dict) -> None:
+        with lock:
+            if generations[post_id] != generation:
+                return  # inzwischen zurückgerollt → Kommentare kommen erneut
+            save_checkpoint(checkpoint, STREAM_CHECKPOINT_NAMESPACE)
+            redeliveries[post_id] = 0
+            if pending.get(post_id) is checkpoint:
+                del pending[post_id]
+
+    def reject(post_id: str, generation: int, checkpoint: dict) -> bool:
+        with lock:
+            if (post_id, generation) in abandoned:
+                return False
+            if generations[post_id] != generation:
+                return True   # bereits zurückgerollt
+            generations[post_id] += 1
+            pending.pop(post_id, None)
+            if redeliveries[post_id] >= STREAM_MAX_REDELIVERIES:
+                # Aufgeben: Stand behalten, Kommentare gehen in den Dead Letter
+                abandoned.add((post_id, generation))
+                redeliveries[post_id] = 0
+                save_checkpoint(checkpoint, STREAM_CHECKPOINT_NAMESPACE)
+                return False
+            redeliveries[post_id] += 1
+            checkpoints[post_id] = load_checkpoint(platform, post_id, STREAM_CHECKPOINT_NAMESPACE, scope)
+            print(f"Polling: {platform}/{post_id} zurückgerollt, Kommentare werden erneut geholt")
+            return True
+
+    while not stop.is_set():
+        for post_id in post_ids:
+            try:
+                with lock:
+                    if post_id not in checkpoints:
+                        checkpoints[post_id] = load_checkpoint(platform, post_id, STREAM_CHECKPOINT_NAMESPACE, scope)
+                    checkpoint, generation = checkpoints[post_id], generations[post_id]
+                new_comments, updated = fetch_new_comments(platform, post_id, api_key, checkpoint, limit=limit)
+                comments = [
+                    {**comment, "post_id": post_id, "source": platform}
+                    for comment in new_comments if comment.get("text")
+                ]
+                with lock:
+                    if generations[post_id] != generation:
+                        continue  # während des Abrufs zurückgerollt → Ergebnis verwerfen
+                    checkpoints[post_id] = updated
+                    if not comments:
+                        # Noch nicht gespeicherte Kommentare im Stand → das Ack sichert später
+                        if post_id not in pending:
+                            save_checkpoint(updated, STREAM_CHECKPOINT_NAMESPACE)
+                        continue
+                    pending[post_id] = updated
+                nack = functools.partial(reject, post_id, generation, updated)
+                for comment in comments:
+                    comment[STREAM_NACK_KEY] = nack
+                comments[-1][STREAM_ACK_KEY] = functools.partial(acknowledge, post_id, generation, updated)
+                for comment in comments:
+                    out.put(comment)
+            except Exception as e:
+                print(f"Polling-Fehler ({platform}/{post_id}): {e}")
+        stop.wait(interval)
+
+
+# ------------------------------------------------------------
+# Sliding Window
+# ------------------------------------------------------------
+class SlidingWindow:
+    """
+    Hält pro Micro-Batch (Zeitpunkt, Insight-Statistik, Mirror-Report)
+    und verwirft Batches, die älter als window_seconds sind.
+    """
+
+    def __init__(self, window_seconds: float = STREAM_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.batches: deque = deque()
+
+    def add(self, entries: list[dict], mirror_report: dict, now: float = None) -> None:
+        self.batches.append((now or time.time(), compute_insight_stats(entries), mirror_report))
+        self.expire(now)
+
+    def expire(self, now: float = None) -> int:
+        """Verwirft abgelaufene Batches; gibt deren Anzahl zurück."""
+        cutoff = (now or time.time()) - self.window_seconds
+        expired = 0
+        while self.batches and self.batches[0][0] < cutoff:
+            self.batches.popleft()
+            expired += 1
+        return expired
+
+    def insight_stats(self) -> dict:
+        return merge_insight_stats(stats for _, stats, _ in self.batches)
+
+    def mirror_report(self) -> dict:
+        reports = [report for _, _, report in self.batches if report.get("status") not in ("error", "no_data")]
+        return merge_mirror_reports(reports)
+
+
+# ------------------------------------------------------------
+# Alerts
+# ------------------------------------------------------------
+def _window_signals(window: SlidingWindow) -> dict:
+    signals = {s["signal"]: s for s in evaluate_signals(window.insight_stats())}
+    mirror = window.mirror_report()
+    if mirror.get("status") in MIRROR_ALERT_STATUSES:
+        signals["mirror_" + mirror["status"]] = {
+            "signal": "mirror_" + mirror["status"],
+            "value": mirror.get("confidence_level"),
+            "threshold": None,
+            "action": mirror.get("reflections", [""])[-1],
+        }
+    return signals
+
+
+def write_dead_letter(entries: list[dict], error: Exception, path: str = DEAD_LETTER_PATH) -> None:
+    """Hängt endgültig fehlgeschlagene Einträge samt Fehler an (NDJSON, z. B. zum erneuten Einspielen)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    failed_at = datetime.utcnow().isoformat()
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps({"entry": entry, "error": str(error), "failed_at": failed_at}, ensure_ascii=False, default=str) + "\n")
+
+
+def emit_alert(alert: dict, path: str = ALERTS_PATH) -> None:
+    print(f"🚨 ALERT [{alert['state']}] {alert['signal']}: {alert.get('value')} – {alert.get('action', '')}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(alert, ensure_ascii=False, default=str) + "\n")
+
+
+def update_alerts(window: SlidingWindow, active: dict, topic: str, alerts_path: str = ALERTS_PATH) -> dict:
+    """
+    Flankengesteuert: Alert beim Auslösen und beim Zurückfallen eines Signals.
+    Gibt die jetzt aktiven Signale zurück.
+    """
+    signals = _window_signals(window)
+    now = datetime.utcnow().isoformat()
+    context = {"topic": topic, "time": now, "window_seconds": window.window_seconds}
+    for name, signal in signals.items():
+        if name not in active:
+            emit_alert({**signal, "state": "triggered", **context}, alerts_path)
+    for name, signal in active.items():
+        if name not in signals:
+            emit_alert({**signal, "state": "resolved", **context}, alerts_path)
+    return signals
+
+
+# ------------------------------------------------------------
+# Worker
+# ------------------------------------------------------------
+def _next_batch(source: queue.Queue, batch_size: int, max_wait: float, stop: threading.Event) -> list[dict]:
+    """Sammelt bis zu batch_size Einträge, höchstens max_wait Sekunden ab dem ersten Eintrag."""
+    batch = []
+    try:
+        batch.append(source.get(timeout=0.5))
+    except queue.Empty:
+        return batch
+    deadline = time.monotonic() + max_wait
+    while len(batch) < batch_size and not stop.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(source.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def run_stream(
+    start_source,
+    industry: str,
+    topic: str = "klima",
+    batch_size: int = STREAM_BATCH_SIZE,
+    max_wait: float = STREAM_BATCH_MAX_WAIT,
+    window_seconds: float = STREAM_WINDOW_SECONDS,
+    client: str = "stream",
+    store: bool = True,
+    alerts_path: str = ALERTS_PATH,
+    dead_letter_path: str = DEAD_LETTER_PATH,
+    stop: threading.Event = None
+) -> None:
+    """
+    Streaming-Schleife. start_source(out_queue, stop_event) wird in einem
+    Daemon-Thread gestartet (z. B. functools.partial(tail_ndjson, path)).
+    Ein fehlgeschlagener Batch wird STREAM_BATCH_RETRIES-mal wiederholt;
+    danach gehen seine Einträge zurück an die Quelle (Nack) oder in die
+    Dead-Letter-Datei. Läuft bis stop gesetzt bzw. KeyboardInterrupt.
+    """
+    stop = stop or threading.Event()
+    source: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    threading.Thread(target=start_source, args=(source, stop), daemon=True).start()
+
+    modules = [STREAM_MODULE_SUBSTITUTES.get(name, name) for name in get_modules_for_industry(industry)]
+    window = SlidingWindow(window_seconds)
+    active: dict = {}
+    run_id = start_run(client, topic, industry=industry) if store else None
+    processed = 0
+
+    print(f"\nStarte HTIF-Streaming für '{industry}' – {len(modules)} Module, Batch {batch_size}, Fenster {window_seconds}s ...\n")
+
+    try:
+        while not stop.is_set():
+            batch = _next_batch(source, batch_size, max_wait, stop)
+            if not batch:
+                # Leerlauf: auslaufende Batches können Signale zurückfallen lassen
+                if window.expire():
+                    active = update_alerts(window, active, topic, alerts_path)
+                continue
+
+            acks = [entry.pop(STREAM_ACK_KEY) for entry in batch if STREAM_ACK_KEY in entry]
+            nacks = [entry.pop(STREAM_NACK_KEY, None) for entry in batch]
+            for attempt in range(STREAM_BATCH_RETRIES + 1):
+                try:
+                    # Module ergänzen Einträge in place → jeder Versuch auf frischen Kopien
+                    entries, module_report, mirror_report = analyze_chunk(
+                        [dict(entry) for entry in batch], modules, topic, profile=industry
+                    )
+                    if store:
+                        append_entries(run_id, client, topic, entries)
+                        update_rollups(entries, topic, client=client)
+                    break
+                except Exception as e:
+                    error = e
+                    print(f"Stream-Batch fehlgeschlagen ({len(batch)} Einträge, Versuch {attempt + 1}): {e}")
+                    if attempt < STREAM_BATCH_RETRIES and not stop.is_set():
+                        time.sleep(STREAM_RETRY_DELAY * 2 ** attempt)
+            else:
+                dead = [entry for entry, nack in zip(batch, nacks) if nack is None or not nack()]
+                if dead:
+                    write_dead_letter(dead, error, dead_letter_path)
+                print(f"Stream-Batch verworfen: {len(batch) - len(dead)} erneut angefordert, {len(dead)} im Dead Letter")
+                continue
+
+            window.add(entries, mirror_report)
+            processed += len(entries)
+            for ack in acks:
+                ack()
+            active = update_alerts(window, active, topic, alerts_path)
+
+            print(f"Batch: {len(entries)} Einträge (gesamt {processed}), Fenster: {len(window.batches)} Batches, aktive Signale: {list(active) or '-'}")
+    except KeyboardInterrupt:
+        print("\nStreaming beendet.")
+    finally:
+        stop.set()
+        if store:
+            insights = build_insights(window.insight_stats())
+            finish_run(run_id, {"insights": insights}, window.mirror_report())
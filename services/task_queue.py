@@ -0,0 +1,282 @@
+# services/task_queue.py
+# ============================================================
+# HTIF Task Queue
+# ------------------------------------------------------------
+# Verteilung einer großen Analyse auf mehrere Rechner ohne externen Broker:
+# - Gemeinsames Verzeichnis (z. B. NFS-Mount) mit Shard-Dateien des
+#   Batch Runners und einer SQLite-Datei tasks.db als Queue
+# - coordinate: Eingaben in Shards zerlegen, ein Task pro Shard
+# - work: Worker beanspruchen Tasks per Lease, verlängern sie per Heartbeat
+#   und schreiben Teilergebnisse + addierbare Mirror-/Insight-Statistiken
+# - abgelaufene Leases (abgestürzte Worker) gehen automatisch zurück in die Queue
+# - finalize: führt alle Shards zu Exporten & einem Gesamtreport zusammen
+# ============================================================
+
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from services import batch_runner
+
+QUEUE_DB_NAME = "tasks.db"
+TASK_LEASE_SECONDS = int(os.getenv("HTIF_TASK_LEASE_SECONDS", "300"))
+TASK_MAX_ATTEMPTS = int(os.getenv("HTIF_TASK_MAX_ATTEMPTS", "3"))
+WORKER_POLL_SECONDS = 5.0
+
+# Kein WAL: WAL braucht Shared Memory und funktioniert nicht auf Netzlaufwerken.
+# Schreibzugriffe sind kurz (BEGIN IMMEDIATE), daher reicht das Rollback-Journal.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER,
+    seconds REAL,
+    error TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_until);
+"""
+
+
+@contextmanager
+def _connect(queue_dir: str):
+    conn = sqlite3.connect(os.path.join(queue_dir, QUEUE_DB_NAME), timeout=60, isolation_level=None)
+    try:
+        conn.executescript(SCHEMA)
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ------------------------------------------------------------
+# Koordinator
+# ------------------------------------------------------------
+def create_queue(
+    inputs: list[str],
+    queue_dir: str,
+    profile: str,
+    topic: str = None,
+    shard_size: int = batch_runner.SHARD_SIZE
+) -> dict:
+    """
+    Zerlegt die Eingaben in Shards (batch_runner.plan_shards) und legt pro Shard
+    einen Task an. Mehrfacher Aufruf ist idempotent.
+    """
+    topic = topic or profile
+    paths = batch_runner.expand_inputs(inputs)
+    manifest = batch_runner.plan_shards(paths, queue_dir, profile, topic, shard_size)
+    with _connect(queue_dir) as conn, _transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks (id, rows, updated_at) VALUES (?, ?, ?)",
+            [(shard["id"], shard["rows"], datetime.utcnow().isoformat()) for shard in manifest["shards"]],
+        )
+    return queue_status(queue_dir)
+
+
+def requeue_expired(conn, now: float = None) -> int:
+    """Gibt Tasks mit abgelaufener Lease frei (bzw. markiert sie nach zu vielen Versuchen als failed)."""
+    now = now or time.time()
+    stamp = datetime.utcnow().isoformat()
+    failed = conn.execute(
+        "UPDATE tasks SET status = 'failed', worker = NULL, lease_until = NULL, "
+        "error = COALESCE(error, 'Lease abgelaufen'), updated_at = ? "
+        "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+        (stamp, now, TASK_MAX_ATTEMPTS),
+    ).rowcount
+    requeued = conn.execute(
+        "UPDATE tasks SET status = 'pending', worker = NULL, lease_until = NULL, updated_at = ? "
+        "WHERE status = 'leased' AND lease_until < ?",
+        (stamp, now),
+    ).rowcount
+    return requeued + failed
+
+
+def queue_status(queue_dir: str) -> dict:
+    with _connect(queue_dir) as conn:
+        with _transaction(conn):
+            requeue_expired(conn)
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        errors = conn.execute("SELECT id, error FROM tasks WHERE status = 'failed'").fetchall()
+    return {
+        "total": sum(counts.values()),
+        **{status: counts.get(status, 0) for status in ("pending", "leased", "done", "failed")},
+        "errors": {task_id: error for task_id, error in errors},
+    }
+
+
+def retry_failed(queue_dir: str) -> int:
+    """Setzt fehlgeschlagene Tasks zurück (Versuche werden zurückgesetzt)."""
+    with _connect(queue_dir) as conn, _transaction(conn):
+        return conn.execute(
+            "UPDATE tasks SET status = 'pending', attempts = 0, error = NULL, updated_at = ? WHERE status = 'failed'",
+            (datetime.utcnow().isoformat(),),
+        ).rowcount
+
+
+# ------------------------------------------------------------
+# Leases
+# ------------------------------------------------------------
+def claim_task(queue_dir: str, worker_id: str, lease_seconds: int = TASK_LEASE_SECONDS) -> int | None:
+    """Beansprucht den nächsten offenen Task; gibt die Task-ID oder None zurück."""
+    now = time.time()
+    with _connect(queue_dir) as conn, _transaction(conn):
+        requeue_expired(conn, now)
+        row = conn.execute("SELECT id FROM tasks WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+        if not row:
+            return None
+        conn.execute(
+            "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = ?",
+            (worker_id, now + lease_seconds, datetime.utcnow().isoformat(), row[0]),
+        )
+        return row[0]
+
+
+def heartbeat(queue_dir: str, task_id: int, worker_id: str, lease_seconds: int = TASK_LEASE_SECONDS) -> bool:
+    """Verlängert die Lease; False, wenn der Task diesem Worker nicht mehr gehört."""
+    with _connect(queue_dir) as conn, _transaction(conn):
+        return conn.execute(
+            "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (time.time() + lease_seconds, datetime.utcnow().isoformat(), task_id, worker_id),
+        ).rowcount == 1
+
+
+def complete_task(queue_dir: str, task_id: int, rows: int, seconds: float) -> None:
+    # Ergebnisse sind pro Shard deterministisch und atomar geschrieben →
+    # auch nach verlorener Lease darf der Task als erledigt markiert werden.
+    with _connect(queue_dir) as conn, _transaction(conn):
+        conn.execute(
+            "UPDATE tasks SET status = 'done', worker = NULL, lease_until = NULL, rows = ?, seconds = ?, "
+            "error = NULL, updated_at = ? WHERE id = ?",
+            (rows, seconds, datetime.utcnow().isoformat(), task_id),
+        )
+
+
+def fail_task(queue_dir: str, task_id: int, worker_id: str, error: str) -> None:
+    """Gibt den Task zurück in die Queue bzw. markiert ihn nach TASK_MAX_ATTEMPTS als failed."""
+    with _connect(queue_dir) as conn, _transaction(conn):
+        conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, error = ?, updated_at = ? WHERE id = ? AND worker = ?",
+            (TASK_MAX_ATTEMPTS, error, datetime.utcnow().isoformat(), task_id, worker_id),
+        )
+
+
+# ------------------------------------------------------------
+# Worker
+# ------------------------------------------------------------
+def _keep_alive(queue_dir: str, task_id: int, worker_id: str, lease_seconds: int, done: threading.Event) -> None:
+    while not done.wait(max(1.0, lease_seconds / 3)):
+        if not heartbeat(queue_dir, task_id, worker_id, lease_seconds):
+            print(f"Lease für Task {task_id} verloren ({worker_id}).")
+            return
+
+
+def run_worker(
+    queue_dir: str,
+    worker_id: str = None,
+    lease_seconds: int = TASK_LEASE_SECONDS,
+    poll: float = WORKER_POLL_SECONDS,
+    exit_when_empty: bool = True
+) -> int:
+    """
+    Arbeitet Tasks ab, bis keine mehr offen sind (bzw. dauerhaft mit
+    exit_when_empty=False). Modelle werden einmal pro Worker geladen.
+    Gibt die Anzahl bearbeiteter Tasks zurück.
+    """
+    worker_id = worker_id or default_worker_id()
+    manifest = batch_runner.load_manifest(queue_dir)
+    if not manifest:
+        raise FileNotFoundError(f"Kein Manifest in {queue_dir} – zuerst 'coordinate' ausführen.")
+
+    batch_runner.init_worker(manifest["profile"], manifest["topic"], workers=1)
+    print(f"Worker {worker_id} bereit ({queue_dir}).")
+
+    processed = 0
+    while True:
+        task_id = claim_task(queue_dir, worker_id, lease_seconds)
+        if task_id is None:
+            status = queue_status(queue_dir)
+            if exit_when_empty and not status["leased"]:
+                break
+            # Andere Worker arbeiten noch – deren Leases könnten ablaufen
+            time.sleep(poll)
+            continue
+
+        done = threading.Event()
+        threading.Thread(
+            target=_keep_alive, args=(queue_dir, task_id, worker_id, lease_seconds, done), daemon=True
+        ).start()
+        try:
+            result = batch_runner.process_shard(queue_dir, task_id, manifest["topic"])
+            complete_task(queue_dir, task_id, result["rows"], result["seconds"])
+            processed += 1
+            print(f"[{worker_id}] Task {task_id:05d} fertig ({result['rows']} Einträge, {result['seconds']}s)")
+        except Exception as e:
+            fail_task(queue_dir, task_id, worker_id, str(e))
+            print(f"[{worker_id}] Task {task_id:05d} fehlgeschlagen: {e}")
+        finally:
+            done.set()
+
+    print(f"Worker {worker_id} beendet – {processed} Tasks bearbeitet.")
+    return processed
+
+
+def run_workers(queue_dir: str, processes: int = 1, **kwargs) -> None:
+    """Startet mehrere Worker-Prozesse auf diesem Rechner (z. B. zum Testen auf einem Host)."""
+    if processes <= 1:
+        run_worker(queue_dir, **kwargs)
+        return
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(queue_dir,), kwargs=kwargs)
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+# ------------------------------------------------------------
+# Finalize
+# ------------------------------------------------------------
+def finalize(queue_dir: str) -> dict:
+    """Führt alle Shards zusammen, sobald jeder Task erledigt ist."""
+    status = queue_status(queue_dir)
+    if status["done"] != status["total"]:
+        return {"status": "incomplete", **status}
+
+    manifest = batch_runner.load_manifest(queue_dir)
+    with _connect(queue_dir) as conn:
+        tasks = {task_id: (rows, seconds) for task_id, rows, seconds in conn.execute("SELECT id, rows, seconds FROM tasks")}
+    for shard in manifest["shards"]:
+        rows, seconds = tasks[shard["id"]]
+        shard.update(status="done", rows=rows, seconds=seconds)
+
+    report = batch_runner.merge_shards(queue_dir, manifest)
+    manifest["merged_at"] = report["finished_at"]
+    batch_runner.save_manifest(queue_dir, manifest)
+    return {**report, "status": "done", "run_dir": queue_dir}
@@ -1,9 +1,27 @@
-import requests
+import asyncio
 
-def fetch_instagram_comments(post_id: str, api_key: str, limit=100):
+from services.http_client import request_with_retry, PLATFORM_CONCURRENCY
+
+# Maximal gepufferte Seiten zwischen Fetch-Threads und Konsument
+PAGE_QUEUE_SIZE = 4
+
+
+class CommentPage(list):
     """
-    Kommentare von Instagram über Graph API holen.
+    Eine Seite Kommentare (list) plus Cursor, mit dem die nächste Seite beginnt.
+    """
+
+    def __init__(self, comments, next_cursor=None):
+        super().__init__(comments)
+        self.next_cursor = next_cursor
+
+
+def iter_instagram_comment_pages(post_id: str, api_key: str, limit=100, start_cursor=None):
+    """
+    Kommentare von Instagram über Graph API seitenweise holen (Generator).
     api_key ist der Access Token des Kunden.
+    start_cursor ist optional eine paging.next-URL aus einem früheren Lauf
+    (gespeichert ohne access_token → wird hier wieder ergänzt).
     """
     url = f"https://graph.facebook.com/v16.0/{post_id}/comments"
     params = {
@@ -11,30 +29,35 @@ def fetch_instagram_comments(post_id: str, api_key: str, limit=100):
         "limit": limit,
         "fields": "id,text,timestamp,username"
     }
-    comments = []
-    while url and len(comments) < limit:
-        response = requests.get(url, params=params)
+    if start_cursor:
+        url = start_cursor
+        params = {} if "access_token=" in start_cursor else {"access_token": api_key}
+    fetched = 0
+    while url and fetched < limit:
+        response = request_with_retry("GET", url, params=params)
         if response.status_code != 200:
             raise Exception(f"Instagram API Error: {response.status_code} - {response.text}")
         data = response.json()
-        for comment in data.get("data", []):
-            comments.append({
+        page = [
+            {
                 "id": comment.get("id"),
                 "text": comment.get("text"),
                 "timestamp": comment.get("timestamp"),
                 "username": comment.get("username", "")
-            })
-            if len(comments) >= limit:
-                break
+            }
+            for comment in data.get("data", [])
+        ][:limit - fetched]
+        fetched += len(page)
         url = data.get("paging", {}).get("next")
         params = {}  # Nur initial params beim ersten Request
-
-    return comments[:limit]
+        yield CommentPage(page, next_cursor=url)
 
 
-def fetch_tiktok_comments(video_id: str, api_key: str, limit=100):
+def iter_tiktok_comment_pages(video_id: str, api_key: str, limit=100, start_cursor=None):
     """
-    TikTok Business API Beispiel. api_key muss entsprechend angepasst werden.
+    TikTok Business API Beispiel, seitenweise (Generator).
+    api_key muss entsprechend angepasst werden.
+    start_cursor setzt die Abfrage an einem früher gespeicherten Cursor fort.
     """
     url = f"https://business-api.tiktok.com/open_api/v1.2/comment/list/"
     headers = {
@@ -44,23 +67,88 @@ def fetch_tiktok_comments(video_id: str, api_key: str, limit=100):
     params = {
         "video_id": video_id,
         "page_size": limit,
-        "cursor": 0
+        "cursor": start_cursor or 0
     }
-    comments = []
+    fetched = 0
     while True:
-        response = requests.get(url, headers=headers, params=params)
+        response = request_with_retry("GET", url, headers=headers, params=params)
         if response.status_code != 200:
             raise Exception(f"TikTok API Error: {response.status_code} - {response.text}")
         data = response.json()
-        comment_list = data.get("data", {}).get("comments", [])
-        for comment in comment_list:
-            comments.append({
+        page = [
+            {
                 "id": comment.get("cid"),
                 "text": comment.get("text"),
                 "timestamp": comment.get("create_time"),
                 "username": comment.get("user", {}).get("nickname", "")
-            })
-        if len(comments) >= limit or not data.get("data", {}).get("has_more"):
+            }
+            for comment in data.get("data", {}).get("comments", [])
+        ][:limit - fetched]
+        fetched += len(page)
+        has_more = data.get("data", {}).get("has_more")
+        params["cursor"] = data.get("data", {}).get("cursor", params["cursor"])
+        yield CommentPage(page, next_cursor=params["cursor"])
+        if fetched >= limit or not has_more:
             break
-        params["cursor"] = data.get("data", {}).get("cursor", 0)
-    return comments[:limit]
+
+
+def fetch_instagram_comments(post_id: str, api_key: str, limit=100):
+    """
+    Kommentare von Instagram über Graph API holen.
+    api_key ist der Access Token des Kunden.
+    """
+    return [c for page in iter_instagram_comment_pages(post_id, api_key, limit=limit) for c in page]
+
+
+def fetch_tiktok_comments(video_id: str, api_key: str, limit=100):
+    """
+    TikTok Business API Beispiel. api_key muss entsprechend angepasst werden.
+    """
+    return [c for page in iter_tiktok_comment_pages(video_id, api_key, limit=limit) for c in page]
+
+
+COMMENT_PAGE_ITERATORS = {
+    "instagram": iter_instagram_comment_pages,
+    "tiktok": iter_tiktok_comment_pages,
+}
+
+
+async def aiter_comment_pages(platform: str, post_ids: list[str], api_key: str, limit=100):
+    """
+    Async-Generator über Kommentarseiten mehrerer Posts.
+    Die Posts werden nebenläufig (Concurrency-Limit pro Plattform) in Threads geladen;
+    jede Seite wird geliefert, sobald sie da ist. Die begrenzte Queue bremst die
+    Fetcher, wenn der Konsument (z. B. die Analyse) nicht hinterherkommt.
+    """
+    platform = platform.lower()
+    page_iterator = COMMENT_PAGE_ITERATORS.get(platform)
+    if not page_iterator:
+        raise ValueError(f"Unbekannte Social Plattform: {platform}")
+
+    semaphore = asyncio.Semaphore(PLATFORM_CONCURRENCY.get(platform, PLATFORM_CONCURRENCY["default"]))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+
+    async def pump(post_id):
+        async with semaphore:
+            pages = page_iterator(post_id, api_key, limit=limit)
+            while (page := await asyncio.to_thread(next, pages, None)) is not None:
+                await queue.put([{**c, "post_id": post_id} for c in page])
+
+    async def run_all():
+        try:
+            await asyncio.gather(*(pump(post_id) for post_id in post_ids))
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    runner = asyncio.create_task(run_all())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        runner.cancel()
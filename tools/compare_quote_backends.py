@@ -0,0 +1,53 @@
+import sys
+import os
+import time
+
+# Projekt-Root zum sys.path hinzufügen
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+import pandas as pd
+from modules.quotes.quote_extraction import extract_quotes, get_nltk_tokenizer
+
+# Referenzkorpus: Zitate des regelbasierten Splitters müssen mit NLTK übereinstimmen
+REFERENCE_CORPUS = ["data/htif_klima_demo_50.csv", "data/htif_klima_dummy.csv"]
+
+
+def compare_quote_backends(paths=REFERENCE_CORPUS):
+    texts = []
+    for path in paths:
+        texts += pd.read_csv(os.path.join(ROOT, path))["text"].dropna().astype(str).tolist()
+
+    # Ohne Punkt-Modell ist kein Vergleich möglich (Download scheitert z. B. offline)
+    try:
+        get_nltk_tokenizer()
+    except LookupError:
+        print("NLTK-Ressource 'punkt_tab' fehlt – Vergleich nicht möglich.")
+        print("Installieren mit: python -m nltk.downloader punkt_tab")
+        return None
+
+    timings, results = {}, {}
+    for backend in ("nltk", "rules"):
+        start = time.perf_counter()
+        results[backend] = extract_quotes(texts, backend=backend, processes=1)
+        timings[backend] = time.perf_counter() - start
+
+    mismatches = [
+        (text, nltk_quote, rules_quote)
+        for text, nltk_quote, rules_quote in zip(texts, results["nltk"], results["rules"])
+        if nltk_quote != rules_quote
+    ]
+
+    print(f"{len(texts)} Texte verglichen – nltk {timings['nltk']:.3f}s, rules {timings['rules']:.3f}s")
+    if mismatches:
+        print(f"{len(mismatches)} Abweichungen:")
+        for text, nltk_quote, rules_quote in mismatches:
+            print(f"- Text:  {text}\n  nltk:  {nltk_quote}\n  rules: {rules_quote}")
+    else:
+        print("Alle Zitate stimmen überein.")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    result = compare_quote_backends()
+    sys.exit(2 if result is None else 0 if result else 1)
@@ -0,0 +1,110 @@
+# tools/test_mirror_merge.py
+# Fokussierte Tests für modules/mirror/mirror.py: merge_mirror_reports (gepoolte Chunk-Reports)
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+import copy
+import random
+
+from modules.mirror.mirror import run_mirror, merge_mirror_reports, FIELDS_TO_CHECK
+
+
+def make_entries(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        entry = {"text": f"Kommentar {i}"}
+        for field in FIELDS_TO_CHECK:
+            entry[field] = rng.random()
+        entries.append(entry)
+    # ein paar Scheren-Treffer und Werte außerhalb des Bereichs
+    entries[3].update(emotion_score=0.9, moral_intensity=0.1)
+    entries[n // 2].update(emotion_score=0.95, toxicity_score=0.2)
+    entries[-1]["resonance_score"] = 1.7
+    return entries
+
+
+def chunked_reports(entries: list[dict], sizes: list[int]) -> list[dict]:
+    reports, start = [], 0
+    for size in sizes:
+        reports.append(run_mirror(copy.deepcopy(entries[start:start + size])))
+        start += size
+    return reports
+
+
+def close(a: float, b: float, tol: float = 1e-9) -> bool:
+    return abs(a - b) <= tol
+
+
+def test_pooled_field_stats_are_exact():
+    entries = make_entries(300)
+    whole = run_mirror(copy.deepcopy(entries))
+    merged = merge_mirror_reports(chunked_reports(entries, [100, 50, 150]))
+
+    assert merged["checked"] == whole["checked"] == 300
+    for field in FIELDS_TO_CHECK:
+        m, w = merged["fields"][field], whole["fields"][field]
+        assert m["count"] == w["count"], field
+        for key in ("mean", "std", "min", "max"):
+            assert close(m[key], w[key]), (field, key, m[key], w[key])
+        # Perzentile nur angenähert (count-gewichtetes Mittel der Teil-Perzentile)
+        assert abs(m["p10"] - w["p10"]) < 0.1 and abs(m["p90"] - w["p90"]) < 0.1, field
+        assert m["range_min"] == w["range_min"] and m["range_max"] == w["range_max"]
+
+
+def test_counts_are_summed():
+    entries = make_entries(300)
+    reports = chunked_reports(entries, [100, 100, 100])
+    merged = merge_mirror_reports(reports)
+
+    for key in ("flag_count", "scissor_count", "flagged_rows"):
+        assert merged[key] == sum(r[key] for r in reports), key
+    for field in FIELDS_TO_CHECK:
+        assert merged["fields"][field]["out_of_range"] == sum(r["fields"][field]["out_of_range"] for r in reports)
+    assert merged["scissor_count"] >= 2
+    assert merged["fields"]["resonance_score"]["out_of_range"] == 1
+    assert merged["shear_index"] == round(merged["scissor_count"] / 300, 3)
+
+
+def test_anomaly_indices_are_global():
+    entries = make_entries(60)
+    merged = merge_mirror_reports(chunked_reports(entries, [20, 20, 20]))
+    assert merged["anomalies"], "Testdaten enthalten Anomalien"
+    for anomaly in merged["anomalies"]:
+        assert anomaly["text"] == entries[anomaly["index"]]["text"], anomaly
+    assert any(a["index"] == 59 for a in merged["anomalies"]), "Anomalie im letzten Chunk mit globalem Index"
+
+
+def test_empty_and_single_reports():
+    assert merge_mirror_reports([])["status"] == "no_data"
+    assert merge_mirror_reports([run_mirror([])])["checked"] == 0
+
+    single = run_mirror(make_entries(20))
+    assert merge_mirror_reports([single, run_mirror([])]) is single, "Ein einzelner Report wird unverändert durchgereicht"
+
+
+def test_missing_field_in_one_chunk():
+    first = [{"emotion_score": 0.2}, {"emotion_score": 0.4}]
+    second = [{"emotion_score": 0.6, "toxicity_score": 0.5}, {"emotion_score": 0.8, "toxicity_score": 0.7}]
+    merged = merge_mirror_reports([run_mirror(copy.deepcopy(first)), run_mirror(copy.deepcopy(second))])
+    whole = run_mirror(first + second)
+
+    assert merged["fields"]["emotion_score"]["count"] == 4
+    assert close(merged["fields"]["emotion_score"]["mean"], whole["fields"]["emotion_score"]["mean"])
+    assert close(merged["fields"]["emotion_score"]["std"], whole["fields"]["emotion_score"]["std"])
+    assert merged["fields"]["toxicity_score"]["count"] == 2
+    assert close(merged["fields"]["toxicity_score"]["mean"], 0.6)
+    assert merged["fields"]["moral_intensity"]["count"] == 0
+
+
+if __name__ == "__main__":
+    for test in (
+        test_pooled_field_stats_are_exact,
+        test_counts_are_summed,
+        test_anomaly_indices_are_global,
+        test_empty_and_single_reports,
+        test_missing_field_in_one_chunk,
+    ):
+        test()
+        print(f"✅ {test.__name__}")
+    print("Alle Mirror-Merge-Tests bestanden.")
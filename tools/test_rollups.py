@@ -0,0 +1,140 @@
+# tools/test_rollups.py
+# Fokussierte Tests für services/rollups.py (mergebare Fensterzustände, Sketch-Quantile, Change Detection)
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+import random
+import tempfile
+
+# Eigene Test-Datenbank, bevor analysis_store den Pfad liest
+os.environ["HTIF_ANALYSIS_DB"] = os.path.join(tempfile.mkdtemp(), "test_rollups.db")
+
+from services.rollups import (
+    empty_state, add_entry, merge_states, sketch_quantile, summarize_state, detect_changes,
+    update_rollups, get_rollups, get_trend, SKETCH_BINS, SKETCH_MAX, SKETCH_MIN
+)
+
+BIN_WIDTH = (SKETCH_MAX - SKETCH_MIN) / SKETCH_BINS
+
+
+def make_entries(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "ambivalence_score": rng.random(),
+            "emotion": rng.choice(["anger", "joy", "fear"]),
+            "stance": rng.choice(["pro", "contra"]),
+            "framing": [rng.choice(["Kosten", "Freiheit"])],
+            "moral_frames": ["care"] if i % 3 == 0 else [],
+        }
+        for i in range(n)
+    ]
+
+
+def state_of(entries: list[dict]) -> dict:
+    state = empty_state()
+    for entry in entries:
+        add_entry(state, entry)
+    return state
+
+
+def test_merge_equals_single_pass():
+    entries = make_entries(300)
+    whole = state_of(entries)
+    merged = merge_states(merge_states(state_of(entries[:100]), state_of(entries[100:250])), state_of(entries[250:]))
+
+    assert merged["count"] == whole["count"] == 300
+    for key in ("emotion", "stance", "frames"):
+        assert merged[key] == whole[key], key
+    a, b = merged["metrics"]["ambivalence_score"], whole["metrics"]["ambivalence_score"]
+    assert a["n"] == b["n"] and a["bins"] == b["bins"]
+    assert a["min"] == b["min"] and a["max"] == b["max"]
+    assert abs(a["sum"] - b["sum"]) < 1e-9 and abs(a["sumsq"] - b["sumsq"]) < 1e-9
+
+
+def test_merge_new_metric_is_copied():
+    target = empty_state()
+    other = state_of(make_entries(5))
+    merge_states(target, other)
+    target["metrics"]["ambivalence_score"]["bins"][0] += 100
+    assert other["metrics"]["ambivalence_score"]["bins"][0] < 100, "merge_states darf other nicht verändern"
+
+
+def test_sketch_quantile_accuracy():
+    values = sorted(e["ambivalence_score"] for e in make_entries(2000, seed=1))
+    metric = state_of([{"ambivalence_score": v} for v in values])["metrics"]["ambivalence_score"]
+    for q in (0.1, 0.5, 0.9):
+        exact = values[int(q * len(values)) - 1]
+        approx = sketch_quantile(metric, q)
+        assert abs(approx - exact) <= BIN_WIDTH, (q, exact, approx)
+    # Quantile werden auf 4 Stellen gerundet
+    assert sketch_quantile(metric, 1.0) <= metric["max"] + 1e-4
+    assert sketch_quantile(metric, 0.0) >= metric["min"] - 1e-4
+
+
+def test_sketch_quantile_clamped_to_min_max():
+    metric = state_of([{"ambivalence_score": 0.42}] * 10)["metrics"]["ambivalence_score"]
+    assert sketch_quantile(metric, 0.5) == 0.42
+    assert summarize_state(state_of([{"ambivalence_score": 0.42}] * 10))["ambivalence_score"]["std"] == 0.0
+
+
+def _trend(means: list[float], n: int = 10) -> list[dict]:
+    return [
+        {"window": f"2024-01-01T{i:02d}", "ambivalence_score": {"n": n, "mean": mean}}
+        for i, mean in enumerate(means)
+    ]
+
+
+def test_detect_changes_spike():
+    means = [0.30, 0.31, 0.29, 0.30, 0.32, 0.30, 0.31, 0.80]
+    changes = detect_changes(_trend(means), "ambivalence_score")
+    assert [c["window"] for c in changes] == ["2024-01-01T07"], changes
+    assert changes[0]["direction"] == "up" and changes[0]["z_score"] > 3
+
+
+def test_detect_changes_needs_baseline_and_count():
+    assert detect_changes(_trend([0.3, 0.9]), "ambivalence_score") == [], "Ohne 3 Basisfenster keine Meldung"
+    means = [0.30, 0.31, 0.29, 0.30, 0.90]
+    assert detect_changes(_trend(means, n=2), "ambivalence_score") == [], "Fenster unter min_count werden ignoriert"
+    assert detect_changes(_trend([0.3] * 10), "ambivalence_score") == []
+
+
+def test_update_and_read_rollups():
+    entries = [
+        {**entry, "timestamp": f"2024-03-01T10:{i % 60:02d}:00"}
+        for i, entry in enumerate(make_entries(120))
+    ]
+    update_rollups(entries[:60], "klima", client="a")
+    update_rollups(entries[60:], "klima", client="a")
+    update_rollups(entries[:10], "klima", client="b")
+
+    hours = get_rollups("klima", "hour", client="a")
+    assert [w for w, _ in hours] == ["2024-03-01T10"]
+    assert hours[0][1]["count"] == 120
+    assert get_rollups("klima", "hour", client="b")[0][1]["count"] == 10, "Clients teilen keine Fenster"
+    assert len(get_rollups("klima", "minute", client="a")) == 60
+
+    trend = get_trend("klima", "ambivalence_score", "day", client="a", since="2024-03-01", until="2024-03-02")
+    assert len(trend) == 1 and trend[0]["ambivalence_score"]["n"] == 120
+
+    try:
+        get_rollups("klima", "hour", client="a", since="9" * 25)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError für ungültiges since erwartet")
+
+
+if __name__ == "__main__":
+    for test in (
+        test_merge_equals_single_pass,
+        test_merge_new_metric_is_copied,
+        test_sketch_quantile_accuracy,
+        test_sketch_quantile_clamped_to_min_max,
+        test_detect_changes_spike,
+        test_detect_changes_needs_baseline_and_count,
+        test_update_and_read_rollups,
+    ):
+        test()
+        print(f"✅ {test.__name__}")
+    print("Alle Rollup-Tests bestanden.")
@@ -0,0 +1,139 @@
+# tools/test_scheduler.py
+# Fokussierte Tests für services/scheduler.py (Start-Time Fair Queuing, Lanes, Client-Limits)
+import sys, os
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+import asyncio
+import tempfile
+
+import yaml
+
+from services.scheduler import FairScheduler, QueueFullError, choose_lane, INTERACTIVE_MAX_ENTRIES
+
+
+def make_scheduler(config: dict, workers: int = 1, bulk_slots: int = 1) -> FairScheduler:
+    handle = tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False)
+    yaml.safe_dump(config, handle)
+    handle.close()
+    return FairScheduler(workers=workers, bulk_slots=bulk_slots, config_path=handle.name)
+
+
+def started(tickets) -> list:
+    return [t for t in tickets if t.future.done()]
+
+
+def run_in_order(scheduler: FairScheduler, tickets) -> list:
+    """Gibt jeweils den laufenden Auftrag frei und protokolliert die Startreihenfolge."""
+    order = []
+    while len(order) < len(tickets):
+        running = [t for t in started(tickets) if t not in order]
+        assert running, "Kein Auftrag läuft, obwohl noch welche warten"
+        for ticket in running:
+            order.append(ticket)
+            scheduler.release(ticket)
+    return order
+
+
+async def test_weighted_fair_order():
+    """Client B (Gewicht 2) bekommt doppelt so viele Slots wie A, beide kommen dran."""
+    scheduler = make_scheduler({"clients": {"a": {"weight": 1}, "b": {"weight": 2}}})
+    blocker = scheduler.submit("blocker", "interactive", 1.0)
+    tickets = [scheduler.submit("a", "interactive", 1.0) for _ in range(3)]
+    tickets += [scheduler.submit("b", "interactive", 1.0) for _ in range(3)]
+    assert started(tickets) == [], "Solange blocker läuft, darf nichts starten"
+
+    scheduler.release(blocker)
+    order = [t.client for t in run_in_order(scheduler, tickets)]
+    print("Reihenfolge:", order)
+    # Finish-Tags: b 0.5/1.0/1.5, a 1.0/2.0/3.0 (Gleichstand → früher eingereiht zuerst)
+    assert order == ["b", "a", "b", "b", "a", "a"], order
+
+
+async def test_small_jobs_overtake_large_backfill():
+    """Ein kleiner Auftrag eines anderen Clients überholt die Bulk-Backlog-Kette eines Clients."""
+    scheduler = make_scheduler({})
+    blocker = scheduler.submit("blocker", "interactive", 1.0)
+    backlog = [scheduler.submit("backfill", "interactive", 100.0) for _ in range(3)]
+    small = scheduler.submit("dashboard", "interactive", 1.0)
+    scheduler.release(blocker)
+    order = run_in_order(scheduler, backlog + [small])
+    assert order.index(small) <= 1, [t.client for t in order]
+
+
+async def test_max_concurrent_per_client():
+    scheduler = make_scheduler({"clients": {"a": {"max_concurrent": 1}}}, workers=4, bulk_slots=3)
+    a_tickets = [scheduler.submit("a", "interactive", 1.0) for _ in range(3)]
+    b_tickets = [scheduler.submit("b", "interactive", 1.0) for _ in range(2)]
+    assert len(started(a_tickets)) == 1, "Client a darf nur einen Auftrag gleichzeitig haben"
+    assert len(started(b_tickets)) == 2
+    assert scheduler.status()["clients"]["a"] == {"queued": 2, "running": 1}
+
+    scheduler.release(started(a_tickets)[0])
+    assert len(started(a_tickets)) == 2, "Nach Freigabe startet der nächste Auftrag von a"
+
+
+async def test_max_queued_per_client():
+    scheduler = make_scheduler({"default": {"max_queued": 2}})
+    scheduler.submit("a", "interactive", 1.0)      # läuft
+    scheduler.submit("a", "interactive", 1.0)
+    scheduler.submit("a", "interactive", 1.0)
+    try:
+        scheduler.submit("a", "interactive", 1.0)
+    except QueueFullError as e:
+        assert e.limit == 2
+    else:
+        raise AssertionError("QueueFullError erwartet")
+    scheduler.submit("b", "interactive", 1.0)      # andere Clients sind nicht betroffen
+
+
+async def test_interactive_before_bulk_and_bulk_slots():
+    scheduler = make_scheduler({}, workers=2, bulk_slots=1)
+    bulk = [scheduler.submit(f"bulk{i}", "bulk", 1.0) for i in range(2)]
+    assert len(started(bulk)) == 1, "Bulk belegt höchstens bulk_slots Slots"
+
+    interactive = scheduler.submit("ui", "interactive", 1.0)
+    assert interactive.future.done(), "Der freie Slot bleibt für interactive"
+
+    scheduler.release(started(bulk)[0])
+    assert len(started(bulk)) == 2
+
+
+async def test_cancel_refunds_finish_tag():
+    scheduler = make_scheduler({})
+    blocker = scheduler.submit("blocker", "interactive", 1.0)
+    ticket = scheduler.submit("a", "interactive", 50.0)
+    scheduler.cancel(ticket)
+    assert scheduler.queued() == 0
+    assert scheduler.last_finish["interactive"]["a"] == ticket.start_tag
+    scheduler.release(blocker)
+
+
+async def test_slot_context_releases():
+    scheduler = make_scheduler({}, workers=1)
+    async with scheduler.slot("a", "interactive", 1.0) as ticket:
+        assert scheduler.in_flight() == 1
+        assert ticket.metadata()["lane"] == "interactive"
+    assert scheduler.in_flight() == 0
+
+
+def test_choose_lane():
+    assert choose_lane("interactive", 10, 1.0) == "interactive"
+    assert choose_lane("bulk", 10, 1.0) == "bulk"
+    assert choose_lane("interactive", 10, 1.0, admission="queue") == "bulk"
+    assert choose_lane("interactive", INTERACTIVE_MAX_ENTRIES + 1, 1.0) == "bulk"
+
+
+if __name__ == "__main__":
+    test_choose_lane()
+    for test in (
+        test_weighted_fair_order,
+        test_small_jobs_overtake_large_backfill,
+        test_max_concurrent_per_client,
+        test_max_queued_per_client,
+        test_interactive_before_bulk_and_bulk_slots,
+        test_cancel_refunds_finish_tag,
+        test_slot_context_releases,
+    ):
+        asyncio.run(test())
+        print(f"✅ {test.__name__}")
+    print("Alle Scheduler-Tests bestanden.")